@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+from .pipeline import ConcurrencyLimit
+from .metrics import get_metrics
+
+# Traffic classes, highest priority first
+PLAYBACK, INTERACTIVE, BULK = 'playback', 'interactive', 'bulk'
+
+# Connections kept open to a single host, as browsers do
+DEFAULT_HOST_CONNECTIONS = 6
+
+# Playback priority lapses after this long, in case the player never
+# reports that its buffer is full
+PLAYBACK_PRIORITY_TIMEOUT = 15
+
+# How often waiting consumers look for cancellation
+_POLL_INTERVAL = 0.1
+
+class TokenBucket:
+    """
+    Token bucket holding up to `burst` bytes and refilled at `rate`
+    bytes/s; a rate of 0 means unlimited. `reserve` may overdraw the
+    bucket and returns how long the caller has to wait to pay it back, so
+    large chunks are paced instead of starved.
+    """
+    def __init__(self, rate=0, burst=None, clock=time.monotonic):
+        self._clock = clock
+        self.rate = 0
+        self.burst = 0
+        self._tokens = 0.0
+        self._updated = clock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        self._refill()
+        self.rate = max(0, int(rate or 0))
+        # A quarter second of traffic by default keeps the pacing smooth
+        self.burst = int(burst) if burst else max(64 * 1024, self.rate // 4)
+        self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = self._clock()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        if not self.rate:
+            return 0.0
+        self._refill()
+        self._tokens -= amount
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+class BandwidthManager:
+    """
+    Shares the network between playback, cover art and downloads.
+
+    Downloads (BULK) and cover fetches (INTERACTIVE) report what they
+    receive through `consume`, which blocks long enough to keep their sum
+    under the global `rate` (bytes/s, 0 for no cap). The player's stream
+    cannot be metered, so playback gets strict priority instead: while
+    `set_playback_active(True)` is in effect, because the player is
+    loading or refilling its buffer, BULK consumers stop reading until it
+    is cleared or `timeout` seconds pass. Blocking the reader stalls the
+    TCP connection, so the sender backs off and the link is left to the
+    player.
+
+    `host_slot(url)` caps the connections open to one host at
+    `host_connections`.
+    """
+    def __init__(self, rate=0, host_connections=DEFAULT_HOST_CONNECTIONS, clock=time.monotonic, sleep=time.sleep):
+        self.host_connections = host_connections
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._bucket = TokenBucket(rate, clock=clock)
+        self._playback_until = None
+        self._hosts = {}
+        self._bytes = {INTERACTIVE: 0, BULK: 0}
+        self._waited = {INTERACTIVE: 0.0, BULK: 0.0}
+        get_metrics().set_gauge('bandwidth_limit_bytes', self._bucket.rate)
+
+    @property
+    def rate(self):
+        return self._bucket.rate
+
+    def set_rate(self, rate):
+        with self._cond:
+            self._bucket.set_rate(rate)
+            self._cond.notify_all()
+        get_metrics().set_gauge('bandwidth_limit_bytes', self._bucket.rate)
+        logging.info(f"Bandwidth limit set to {rate // 1024} KB/s" if rate else "Bandwidth limit removed")
+
+    @property
+    def playback_active(self):
+        with self._cond:
+            return self._playback_held()
+
+    def _playback_held(self):
+        # Caller holds self._cond
+        return self._playback_until is not None and self._clock() < self._playback_until
+
+    def set_playback_active(self, active, timeout=PLAYBACK_PRIORITY_TIMEOUT):
+        with self._cond:
+            was_active = self._playback_held()
+            self._playback_until = self._clock() + timeout if active else None
+            self._cond.notify_all()
+        if was_active != bool(active):
+            logging.debug(f"Playback priority {'on' if active else 'off'}")
+
+    def consume(self, amount, priority=BULK, cancelled=None):
+        """
+        Accounts for `amount` bytes received and blocks until the caller may
+        read more. Returns early once `cancelled()` is true. Returns the
+        seconds spent waiting.
+        """
+        started = self._clock()
+        with self._cond:
+            if priority == BULK:
+                while self._playback_held() and not (cancelled and cancelled()):
+                    self._cond.wait(_POLL_INTERVAL)
+            delay = self._bucket.reserve(amount)
+            self._bytes[priority] += amount
+        deadline = self._clock() + delay
+        while delay > 0 and not (cancelled and cancelled()):
+            self._sleep(min(delay, _POLL_INTERVAL))
+            delay = deadline - self._clock()
+        waited = self._clock() - started
+        if waited > 0.001:
+            with self._cond:
+                self._waited[priority] += waited
+            get_metrics().observe('bandwidth_wait', waited, priority=priority)
+        return waited
+
+    def host_slot(self, url):
+        """Context manager holding one of the connections allowed to the host of `url`."""
+        host = (urlparse(url).hostname or '') if url else ''
+        with self._cond:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = ConcurrencyLimit(self.host_connections)
+        return slot
+
+    def stats(self):
+        with self._cond:
+            return {
+                'rate': self._bucket.rate,
+                'playback_active': self._playback_held(),
+                'bytes': dict(self._bytes),
+                'waited_seconds': {k: round(v, 3) for k, v in self._waited.items()},
+            }
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_bandwidth_manager():
+    """Returns the process-wide BandwidthManager shared by the player, downloads and cover fetches."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BandwidthManager()
+        return _manager
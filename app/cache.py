@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from .utils import get_cache_dir
+from .logs import shorten
+from .bandwidth import get_bandwidth_manager, INTERACTIVE
+
+class MetadataCache:
+    """
+    Persistent key/value cache for JSON-serialisable API responses.
+
+    Entries are stored in SQLite so they survive restarts. Each entry is
+    fresh for `ttl` seconds after it was written; after that it is stale and
+    only returned when the caller explicitly accepts stale data. When the
+    cache holds more than `max_entries`, the least recently used entries are
+    evicted.
+
+    path        : SQLite file, or ':memory:' for a non-persistent cache
+    ttl         : Default freshness in seconds
+    max_entries : Upper bound on stored entries
+    """
+    def __init__(self, path=None, ttl=3600, max_entries=1000, clock=time.time):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'metadata.sqlite3')
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not open metadata cache at {path}, using memory: {e}")
+            self.path = ':memory:'
+            self._db = sqlite3.connect(':memory:', check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    @staticmethod
+    def make_key(*parts):
+        return json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, key, allow_stale=False):
+        """
+        Returns (value, is_fresh) for `key`, or None on a miss.
+        Stale entries count as a miss unless `allow_stale` is set.
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            is_fresh = expires_at > now
+            if not is_fresh and not allow_stale:
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            if is_fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return json.loads(value), is_fresh
+
+    def set(self, key, value, ttl=None):
+        now = self._clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, data, expires_at, now)
+            )
+            self._evict()
+
+    def invalidate(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction
+        (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,)
+            )
+            logging.debug(f"Evicted {excess} metadata cache entries")
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'entries': len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class QueryResultCache:
+    """
+    In-memory LRU of recent search results, for search-as-you-type.
+
+    Retyping or backspacing to a query seen in the last `ttl` seconds is
+    answered from here without a worker round trip. For a new query,
+    `prefix_results` filters the results of the longest cached prefix
+    ("beatl" for "beatles") down to rows matching every word, to show
+    while the real search runs. Not thread-safe; used from the GUI thread.
+    """
+    def __init__(self, max_entries=64, ttl=5 * 60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def normalize(query):
+        return ' '.join(query.casefold().split())
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, query):
+        """Returns (rows, continuation) for `query`, or None."""
+        key = self.normalize(query)
+        entry = self._fresh(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, query, rows, continuation=None):
+        key = self.normalize(query)
+        self._entries[key] = (self._clock(), rows, continuation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prefix_results(self, query):
+        """Rows of the longest cached prefix of `query` that match all its words."""
+        key = self.normalize(query)
+        prefixes = [k for k in self._entries if k != key and key.startswith(k)]
+        for prefix in sorted(prefixes, key=len, reverse=True):
+            entry = self._fresh(prefix)
+            if entry is None:
+                continue
+            words = key.split()
+            return [
+                row for row in entry[1]
+                if all(w in f"{row['title']} {row['artists']}".casefold() for w in words)
+            ]
+        return []
+
+    def clear(self):
+        self._entries.clear()
+
+# Concurrent fetches of one URL share a lock from a fixed pool
+URL_LOCK_STRIPES = 64
+
+def _image_ext(data):
+    """Guess the file extension of an image from its magic bytes."""
+    if data.startswith(b'\x89PNG'):
+        return '.png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return '.jpg'
+
+class ImageCache:
+    """
+    Two-tier, content-addressed cache for album art.
+
+    URLs map to the SHA-256 of the image bytes, and the bytes are stored
+    once per hash as `<hash><ext>` on disk, so the same cover reached through
+    different URLs is kept only once. A bounded in-memory LRU sits in front of
+    the disk tier, and the disk tier is trimmed to `max_disk_bytes` by least
+    recent use. Network fetches go through a pooled `requests.Session` and
+    are paced by `bandwidth` (the process-wide BandwidthManager by default).
+    """
+    def __init__(self, directory=None, max_memory_bytes=32 * 1024 * 1024,
+                 max_disk_bytes=256 * 1024 * 1024, session=None, timeout=15, bandwidth=None):
+        if directory is None:
+            directory = os.path.join(get_cache_dir(), 'images')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.timeout = timeout
+        if session is None:
+            # requests is slow to import and only needed once images are fetched
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self.bandwidth = bandwidth if bandwidth is not None else get_bandwidth_manager()
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._url_locks = [threading.Lock() for _ in range(URL_LOCK_STRIPES)]
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY,"
+                " hash TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                " hash TEXT PRIMARY KEY,"
+                " filename TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+
+    def _lock_for(self, url):
+        return self._url_locks[hash(url) % len(self._url_locks)]
+
+    def _remember(self, digest, data):
+        # Caller holds self._lock
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+            return
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[digest] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _lookup(self, url):
+        """Returns (hash, filename) for a known URL whose file still exists."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT o.hash, o.filename FROM urls u JOIN objects o ON o.hash = u.hash WHERE u.url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, filename = row
+            if not os.path.exists(os.path.join(self.directory, filename)):
+                with self._db:
+                    self._db.execute("DELETE FROM objects WHERE hash = ?", (digest,))
+                return None
+            with self._db:
+                self._db.execute("UPDATE objects SET accessed_at = ? WHERE hash = ?", (time.time(), digest))
+            return digest, filename
+
+    def _store(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+        filename = digest + _image_ext(data)
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO objects (hash, filename, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (digest, filename, len(data), time.time())
+                )
+                self._db.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (url, digest))
+                self._evict_disk(keep=digest)
+            self._remember(digest, data)
+        return digest, filename
+
+    def _evict_disk(self, keep):
+        # Caller holds self._lock and an open transaction
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()
+        if total <= self.max_disk_bytes:
+            return
+        for digest, filename, size in self._db.execute(
+            "SELECT hash, filename, size FROM objects ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            if digest == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM objects WHERE hash = ?", (digest,))
+            self._db.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+            total -= size
+            logging.debug(f"Evicted cached image {filename}")
+
+    def _fetch(self, url):
+        """Returns (hash, filename) for `url`, downloading it on a miss."""
+        with self._lock_for(url):
+            found = self._lookup(url)
+            if found:
+                return found, False
+            logging.debug(f"Fetching image: {shorten(url)}")
+            with self.bandwidth.host_slot(url):
+                with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    chunks = []
+                    for chunk in response.iter_content(64 * 1024):
+                        chunks.append(chunk)
+                        self.bandwidth.consume(len(chunk), INTERACTIVE)
+            with self._lock:
+                self.misses += 1
+            return self._store(url, b''.join(chunks)), True
+
+    def get(self, url):
+        """Returns the image bytes for `url`, fetching them only on a miss."""
+        (digest, filename), fetched = self._fetch(url)
+        if fetched:
+            with self._lock:
+                data = self._memory.get(digest)
+            return data if data is not None else self._read(filename)
+        with self._lock:
+            data = self._memory.get(digest)
+            if data is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+                return data
+        data = self._read(filename)
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(digest, data)
+        return data
+
+    def get_path(self, url):
+        """Returns a local file path for the image at `url`, fetching it only on a miss."""
+        (_, filename), fetched = self._fetch(url)
+        if not fetched:
+            with self._lock:
+                self.disk_hits += 1
+        return os.path.join(self.directory, filename)
+
+    def _read(self, filename):
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            return f.read()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_bytes': self._memory_bytes,
+            }
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """Returns the process-wide ImageCache shared by the UI and the downloader."""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
@@ -0,0 +1,325 @@
+"""
+Headless batch downloader.
+
+Reads one album per line from a file or stdin, either a browseId
+(MPREb_...), an album playlist id (OLAK5uy_...) or a search query whose
+first album result is used. Blank lines and lines starting with '#' are
+skipped. Tracks already in the library index in the requested format
+are not downloaded again unless --redownload is given.
+
+Progress is written to stdout as JSON lines, logs go to stderr:
+
+    python -m app albums.txt -o ~/Music -f opus --jobs 2
+    echo "MPREb_..." | python -m app -o ~/Music
+
+Nothing on this path imports PySide6.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Taken before the imports below so startup time includes yt-dlp and ytmusicapi
+_STARTED = time.perf_counter()
+
+from yt_dlp.utils import sanitize_filename, parse_bytes
+
+from .downloader import AlbumDownloader, CancelledError, DEFAULT_CONCURRENT_DOWNLOADS
+from .youtube_api import YouTubeMusicClient, supported_lang
+from .library import get_library
+from .progress import ProgressAggregator
+from .metrics import get_metrics
+from .logs import setup_logging
+from .transcode import TranscodeScheduler, TRANSCODE_PRIORITIES, DEFAULT_TRANSCODE_PRIORITY
+from .bandwidth import get_bandwidth_manager
+
+AUDIO_FORMATS = ['mp3', 'flac', 'wav', 'm4a', 'opus']
+
+def byte_rate(text):
+    """argparse type for rates such as 500K or 2M, in bytes per second."""
+    rate = parse_bytes(text)
+    if rate is None or rate < 0:
+        raise argparse.ArgumentTypeError(f"invalid rate: {text!r} (e.g. 500K, 2M)")
+    return rate
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _mb(size):
+    return round(size / (1024 * 1024), 1) if size is not None else None
+
+class EventWriter:
+    """Writes one JSON object per line, safe to call from any thread."""
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event, **data):
+        data = {'event': event, 'time': round(time.time(), 3), **data}
+        line = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+def read_inputs(source):
+    """Returns the album lines of `source`, a path or '-' for stdin."""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [l.strip() for l in lines if l.strip() and not l.strip().startswith('#')]
+
+def resolve_album(client, text):
+    """Returns (browse_id, album_details) for a browseId, album playlist id or query."""
+    if text.startswith('MPREb_'):
+        browse_id = text
+    elif text.startswith('OLAK5uy_'):
+        browse_id = client.ytmusic.get_album_browse_id(text)
+    else:
+        results = client.search_albums(text) or []
+        browse_id = next((r['browseId'] for r in results if r.get('browseId')), None)
+    if not browse_id:
+        raise LookupError(f"No album found for '{text}'")
+    album_details = client.get_album_details(browse_id)
+    if not album_details:
+        raise LookupError(f"Could not get album details for {browse_id}")
+    if not album_details.get('audioPlaylistId'):
+        raise LookupError(f"Album {browse_id} is not available for download")
+    return browse_id, album_details
+
+def album_folder(album_details):
+    artists = ', '.join(a['name'] for a in album_details.get('artists') or [])
+    title = album_details.get('title') or 'Unknown Album'
+    return sanitize_filename(f"{artists} - {title}" if artists else title)
+
+class BatchRunner:
+    """
+    Resolves and downloads a list of albums, `jobs` albums at a time. All
+    jobs share one TranscodeScheduler, so `transcode_workers` caps the
+    ffmpeg processes of the whole run.
+    """
+    def __init__(self, client, events, output, audio_format, jobs=1,
+                 concurrency=DEFAULT_CONCURRENT_DOWNLOADS, transcode_workers=None, album_folders=False,
+                 library=None, transcode_scheduler=None):
+        self.client = client
+        self.events = events
+        self.output = output
+        self.audio_format = audio_format
+        self.jobs = max(1, jobs)
+        self.concurrency = concurrency
+        self.transcode_scheduler = transcode_scheduler or TranscodeScheduler(transcode_workers)
+        self.album_folders = album_folders
+        self.library = library
+        self._downloaders = set()
+        self._lock = threading.Lock()
+        self._is_cancelled = False
+
+    def cancel(self):
+        self._is_cancelled = True
+        with self._lock:
+            downloaders = list(self._downloaders)
+        for downloader in downloaders:
+            downloader.cancel()
+
+    def _progress_callbacks(self, job):
+        """Returns the (progress_callback, track_callback) pair for one job."""
+        # Progress hooks fire per network chunk; write at most ten lines a
+        # second, plus every change of status
+        aggregator = ProgressAggregator()
+
+        def on_progress(d):
+            aggregator.update(None, d)
+            snapshot = aggregator.take(force=d['status'] != 'downloading')
+            if snapshot is None:
+                return
+            tracks = [{k: v for k, v in t.items() if k != 'album_id'} for t in snapshot['tracks']]
+            self.events.emit('progress', job=job, **snapshot['latest'], tracks=tracks)
+
+        def on_track(index, state, **data):
+            aggregator.set_track_state(None, index, state)
+        return on_progress, on_track
+
+    def run_job(self, job, text):
+        started = time.perf_counter()
+        rss_before = peak_rss_bytes()
+        if self._is_cancelled:
+            raise CancelledError("Download cancelled by user.")
+        browse_id, album_details = resolve_album(self.client, text)
+        tracks = album_details.get('tracks') or []
+        self.events.emit(
+            'resolved', job=job, input=text, browse_id=browse_id,
+            title=album_details.get('title'),
+            artists=[a['name'] for a in album_details.get('artists') or []],
+            tracks=len(tracks),
+            seconds=round(time.perf_counter() - started, 3)
+        )
+
+        save_path = self.output
+        if self.album_folders:
+            save_path = os.path.join(self.output, album_folder(album_details))
+        os.makedirs(save_path, exist_ok=True)
+
+        progress_callback, track_callback = self._progress_callbacks(job)
+        downloader = AlbumDownloader(
+            self.concurrency, self.transcode_scheduler.limit, progress_callback, track_callback,
+            transcode_slots=self.transcode_scheduler,
+            library=self.library
+        )
+        with self._lock:
+            self._downloaders.add(downloader)
+        if self._is_cancelled:
+            downloader.cancel()
+        try:
+            files = downloader.download(
+                album_details['audioPlaylistId'],
+                list(range(1, len(tracks) + 1)),
+                save_path,
+                self.audio_format,
+                album_details
+            )
+        finally:
+            with self._lock:
+                self._downloaders.discard(downloader)
+
+        rss_after = peak_rss_bytes()
+        self.events.emit(
+            'done', job=job, input=text, browse_id=browse_id,
+            files=[str(f) for f in files],
+            seconds=round(time.perf_counter() - started, 3),
+            peak_rss_mb=_mb(rss_after),
+            peak_rss_growth_mb=_mb(rss_after - rss_before) if rss_after is not None else None
+        )
+        return files
+
+    def run(self, inputs):
+        """Returns the number of albums that failed."""
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix='album') as executor:
+            futures = {executor.submit(self.run_job, job, text): (job, text) for job, text in enumerate(inputs, 1)}
+            try:
+                for future in as_completed(futures):
+                    job, text = futures[future]
+                    try:
+                        future.result()
+                    except CancelledError:
+                        failed += 1
+                        self.events.emit('cancelled', job=job, input=text)
+                    except Exception as e:
+                        failed += 1
+                        logging.error(f"Job {job} ({text}) failed: {e}", exc_info=logging.getLogger().isEnabledFor(logging.DEBUG))
+                        self.events.emit('error', job=job, input=text, message=str(e))
+            except KeyboardInterrupt:
+                logging.warning("Interrupted, cancelling downloads...")
+                self.cancel()
+                for future in futures:
+                    future.cancel()
+                raise
+        return failed
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m app',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('input', nargs='?', default='-', help="File with one album per line, or '-' for stdin (default)")
+    parser.add_argument('-o', '--output', default='.', help="Download folder (default: current directory)")
+    parser.add_argument('-f', '--format', default='mp3', choices=AUDIO_FORMATS, help="Audio format (default: mp3)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Albums downloaded at once (default: 1)")
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENT_DOWNLOADS,
+                        help=f"Parallel track downloads per album (default: {DEFAULT_CONCURRENT_DOWNLOADS})")
+    parser.add_argument('--transcode-workers', type=int, default=None, help="Parallel ffmpeg processes (default: physical cores)")
+    parser.add_argument('--ffmpeg-threads', type=int, default=None,
+                        help="Threads per ffmpeg process (default: a share of the CPUs free when it starts)")
+    parser.add_argument('--transcode-priority', choices=TRANSCODE_PRIORITIES, default=DEFAULT_TRANSCODE_PRIORITY,
+                        help=f"CPU and I/O priority of ffmpeg, applied on Linux (default: {DEFAULT_TRANSCODE_PRIORITY})")
+    parser.add_argument('--limit-rate', type=byte_rate, default=0, metavar='RATE',
+                        help="Total download bandwidth in bytes/s, e.g. 500K or 2M (default: no limit)")
+    parser.add_argument('--album-folders', action='store_true', help="Save each album in an 'Artist - Album' folder")
+    parser.add_argument('--redownload', action='store_true', help="Download tracks even if they are already in the library")
+    parser.add_argument('--scan', action='store_true', help="Index the audio files in the output folder before downloading")
+    parser.add_argument('--language', choices=supported_lang, default=None, help="Metadata language (default: system locale)")
+    parser.add_argument('--metrics', metavar='FILE', help="Append a JSON line per timed stage (lookup, download, ffmpeg, tagging...) to FILE")
+    parser.add_argument('--metrics-prom', metavar='FILE', help="Write stage latency histograms in Prometheus text format to FILE on exit")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help="Serve the histograms at http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="Log to stderr, -vv for debug output")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    setup_logging(level, stream=sys.stderr)
+
+    events = EventWriter(sys.stdout)
+    try:
+        inputs = read_inputs(args.input)
+    except OSError as e:
+        events.emit('error', message=str(e))
+        return 2
+
+    output = os.path.abspath(os.path.expanduser(args.output))
+    if args.scan:
+        started = time.perf_counter()
+        added, removed = get_library().scan(output)
+        events.emit('scanned', path=output, added=added, removed=removed, files=len(get_library()),
+                    seconds=round(time.perf_counter() - started, 3))
+
+    metrics = get_metrics()
+    try:
+        metrics.configure(args.metrics, args.metrics_prom, args.metrics_port)
+    except OSError as e:
+        events.emit('error', message=f"Could not set up metrics: {e}")
+        return 2
+
+    if args.limit_rate:
+        get_bandwidth_manager().set_rate(args.limit_rate)
+
+    client = YouTubeMusicClient(language=args.language)
+    events.emit(
+        'startup',
+        seconds=round(time.perf_counter() - _STARTED, 3),
+        peak_rss_mb=_mb(peak_rss_bytes()),
+        qt_loaded='PySide6' in sys.modules,
+        albums=len(inputs)
+    )
+
+    runner = BatchRunner(
+        client, events, output, args.format,
+        jobs=args.jobs,
+        concurrency=args.concurrency,
+        album_folders=args.album_folders,
+        library=None if args.redownload else get_library(),
+        transcode_scheduler=TranscodeScheduler(args.transcode_workers, args.ffmpeg_threads, args.transcode_priority)
+    )
+    started = time.perf_counter()
+    try:
+        failed = runner.run(inputs)
+    except KeyboardInterrupt:
+        events.emit('interrupted')
+        return 130
+    finally:
+        metrics.close()
+    if args.metrics or args.metrics_prom or args.metrics_port is not None:
+        events.emit('metrics', spans=metrics.summary())
+    events.emit(
+        'summary',
+        albums=len(inputs),
+        failed=failed,
+        seconds=round(time.perf_counter() - started, 3),
+        peak_rss_mb=_mb(peak_rss_bytes()),
+        transcodes=runner.transcode_scheduler.stats(),
+        bandwidth=get_bandwidth_manager().stats()
+    )
+    return 1 if failed else 0
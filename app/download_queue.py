@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import traceback
+
+from .utils import get_data_dir
+from .pipeline import ConcurrencyLimit, DEFAULT_CONCURRENT_DOWNLOADS
+from .transcode import TranscodeScheduler
+
+# Mirrors downloader.TRACK_STATES; the downloader itself is imported only when
+# an album starts so creating a queue stays cheap.
+PENDING, DOWNLOADING, TRANSCODING, TAGGED, DONE, FAILED = (
+    'pending', 'downloading', 'transcoding', 'tagged', 'done', 'failed'
+)
+# States a track is left in when the process dies mid-download
+IN_PROGRESS = (DOWNLOADING, TRANSCODING, TAGGED)
+
+DEFAULT_CONCURRENT_ALBUMS = 2
+
+class DownloadJournal:
+    """
+    SQLite record of queued albums and the state of each of their tracks.
+
+    Every state change is committed as it happens, so after a crash the
+    journal shows which tracks finished and which have to be redone.
+
+    path : SQLite file, or ':memory:' for a non-persistent journal
+    """
+    def __init__(self, path=None, clock=time.time):
+        if path is None:
+            path = os.path.join(get_data_dir(), 'queue.sqlite3')
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS albums ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " browse_id TEXT,"
+                " playlist_id TEXT NOT NULL,"
+                " title TEXT,"
+                " save_path TEXT NOT NULL,"
+                " audio_format TEXT NOT NULL,"
+                " details TEXT,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " album_id INTEGER NOT NULL,"
+                " track_index INTEGER NOT NULL,"
+                " video_id TEXT,"
+                " title TEXT,"
+                " state TEXT NOT NULL,"
+                " path TEXT,"
+                " error TEXT,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (album_id, track_index))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tracks_state ON tracks (state, album_id)")
+
+    def add_album(self, playlist_id, track_indices, save_path, audio_format, album_details=None, browse_id=None):
+        """Queues `track_indices` (1-based) of an album and returns its id."""
+        now = self._clock()
+        tracks = (album_details or {}).get('tracks') or []
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO albums (browse_id, playlist_id, title, save_path, audio_format, details, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    browse_id, playlist_id, (album_details or {}).get('title'), save_path, audio_format,
+                    json.dumps(album_details, ensure_ascii=False) if album_details else None, now
+                )
+            )
+            album_id = cursor.lastrowid
+            rows = []
+            for index in track_indices:
+                track = tracks[index - 1] if 0 < index <= len(tracks) else {}
+                rows.append((album_id, index, track.get('videoId'), track.get('title'), PENDING, now))
+            self._db.executemany(
+                "INSERT INTO tracks (album_id, track_index, video_id, title, state, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return album_id
+
+    def album(self, album_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, browse_id, playlist_id, title, save_path, audio_format, details"
+                " FROM albums WHERE id = ?", (album_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'browse_id': row[1],
+            'playlist_id': row[2],
+            'title': row[3],
+            'save_path': row[4],
+            'audio_format': row[5],
+            'album_details': json.loads(row[6]) if row[6] else None,
+        }
+
+    def tracks(self, album_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT track_index, video_id, title, state, path, error FROM tracks"
+                " WHERE album_id = ? ORDER BY track_index", (album_id,)
+            ).fetchall()
+        return [
+            {'index': r[0], 'video_id': r[1], 'title': r[2], 'state': r[3], 'path': r[4], 'error': r[5]}
+            for r in rows
+        ]
+
+    def pending_tracks(self, album_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT track_index FROM tracks WHERE album_id = ? AND state = ? ORDER BY track_index",
+                (album_id, PENDING)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def pending_albums(self):
+        """Ids of albums with pending tracks, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT album_id FROM tracks WHERE state = ? ORDER BY album_id", (PENDING,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def set_track_state(self, album_id, index, state, path=None, error=None):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE tracks SET state = ?, path = COALESCE(?, path), error = ?, updated_at = ?"
+                " WHERE album_id = ? AND track_index = ?",
+                (state, path, error, self._clock(), album_id, index)
+            )
+
+    def _move_tracks(self, from_states, state, album_id=None, error=None):
+        query = (
+            f"UPDATE tracks SET state = ?, error = ?, updated_at = ?"
+            f" WHERE state IN ({', '.join('?' * len(from_states))})"
+        )
+        params = [state, error, self._clock(), *from_states]
+        if album_id is not None:
+            query += " AND album_id = ?"
+            params.append(album_id)
+        with self._lock, self._db:
+            return self._db.execute(query, params).rowcount
+
+    def recover(self, album_id=None):
+        """Puts tracks that were interrupted mid-download back to pending."""
+        return self._move_tracks(IN_PROGRESS, PENDING, album_id)
+
+    def fail_unfinished(self, album_id=None, error=None):
+        """Marks every pending or interrupted track as failed."""
+        return self._move_tracks((PENDING,) + IN_PROGRESS, FAILED, album_id, error)
+
+    def retry_failed(self, album_id=None):
+        return self._move_tracks((FAILED,), PENDING, album_id)
+
+    def remove_album(self, album_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tracks WHERE album_id = ?", (album_id,))
+            self._db.execute("DELETE FROM albums WHERE id = ?", (album_id,))
+
+    def counts(self, album_id=None):
+        """Returns {state: number of tracks}, for one album or the whole queue."""
+        query = "SELECT state, COUNT(*) FROM tracks"
+        params = ()
+        if album_id is not None:
+            query += " WHERE album_id = ?"
+            params = (album_id,)
+        with self._lock:
+            rows = self._db.execute(query + " GROUP BY state", params).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class DownloadQueue:
+    """
+    Downloads queued albums in the background, recording every track in a
+    DownloadJournal so the queue resumes where it stopped after a restart.
+
+    Up to `max_albums` albums run at once. Across all of them, at most
+    `max_concurrent_downloads` tracks download and `max_transcodes` ffmpeg
+    processes run at the same time; pass a TranscodeScheduler as
+    `transcode_scheduler` to also set their threads and priority. A failing track is marked failed and the
+    rest of its album continues. Tracks already in `library` are not
+    downloaded again. `ydl_factory` is passed on to AlbumDownloader.
+
+    Callbacks are called from queue threads:
+
+    progress_callback(album_id, d) : AlbumDownloader progress dicts
+    track_callback(album_id, index, state)
+    album_callback(album_id, status, counts, error) : status is 'finished',
+        'cancelled' or 'failed', counts maps track state to number of tracks
+    """
+    def __init__(self, journal=None, max_concurrent_downloads=DEFAULT_CONCURRENT_DOWNLOADS,
+                 max_transcodes=None, max_albums=DEFAULT_CONCURRENT_ALBUMS,
+                 progress_callback=None, track_callback=None, album_callback=None, library=None,
+                 ydl_factory=None, transcode_scheduler=None):
+        self.journal = journal if journal is not None else DownloadJournal()
+        self.library = library
+        self.ydl_factory = ydl_factory
+        self.download_slots = ConcurrencyLimit(max_concurrent_downloads)
+        self.transcode_slots = transcode_scheduler or TranscodeScheduler(max_transcodes)
+        self.max_albums = max(1, int(max_albums))
+        self.progress_callback = progress_callback
+        self.track_callback = track_callback
+        self.album_callback = album_callback
+        self._cond = threading.Condition()
+        self._running = {}
+        self._threads = {}
+        self._cancelled = set()
+        self._stopping = False
+        self._scheduler = None
+
+    def start(self):
+        """Resumes interrupted tracks and starts scheduling. Returns the number of tracks left."""
+        recovered = self.journal.recover()
+        if recovered:
+            logging.info(f"Resuming {recovered} interrupted track(s) from the download queue")
+        with self._cond:
+            if self._scheduler is None:
+                self._stopping = False
+                self._scheduler = threading.Thread(target=self._schedule, name='download-queue', daemon=True)
+                self._scheduler.start()
+        return self.remaining()
+
+    def remaining(self):
+        counts = self.journal.counts()
+        return sum(counts.get(state, 0) for state in (PENDING,) + IN_PROGRESS)
+
+    def set_max_concurrent_downloads(self, limit):
+        self.download_slots.set_limit(limit)
+
+    def add_album(self, playlist_id, track_indices, save_path, audio_format, album_details=None, browse_id=None):
+        album_id = self.journal.add_album(playlist_id, track_indices, save_path, audio_format, album_details, browse_id)
+        logging.info(f"Queued {len(track_indices)} track(s) of album {album_id} for download to '{save_path}'")
+        with self._cond:
+            self._cond.notify_all()
+        return album_id
+
+    def retry_failed(self, album_id=None):
+        count = self.journal.retry_failed(album_id)
+        with self._cond:
+            self._cond.notify_all()
+        return count
+
+    def cancel_album(self, album_id):
+        """Drops the album's unfinished tracks; they are marked failed and not resumed."""
+        with self._cond:
+            downloader = self._running.get(album_id)
+            if downloader:
+                self._cancelled.add(album_id)
+        self.journal.fail_unfinished(album_id, "Cancelled")
+        if downloader:
+            downloader.cancel()
+
+    def cancel_all(self):
+        with self._cond:
+            running = dict(self._running)
+            self._cancelled.update(running)
+        self.journal.fail_unfinished(error="Cancelled")
+        for downloader in running.values():
+            downloader.cancel()
+
+    def stop(self, timeout=None):
+        """
+        Stops scheduling and interrupts running albums. Their unfinished
+        tracks stay in the journal and are resumed by the next start().
+        """
+        with self._cond:
+            self._stopping = True
+            running = dict(self._running)
+            threads = list(self._threads.values())
+            scheduler = self._scheduler
+            self._scheduler = None
+            self._cond.notify_all()
+        for downloader in running.values():
+            downloader.cancel()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads + ([scheduler] if scheduler else []):
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def _schedule(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    if len(self._running) < self.max_albums:
+                        album_id = next((a for a in self.journal.pending_albums() if a not in self._running), None)
+                        if album_id is not None:
+                            break
+                    self._cond.wait()
+                downloader = self._make_downloader(album_id)
+                self._running[album_id] = downloader
+                thread = threading.Thread(
+                    target=self._run_album, args=(album_id, downloader),
+                    name=f"album-{album_id}", daemon=True
+                )
+                self._threads[album_id] = thread
+            thread.start()
+
+    def _make_downloader(self, album_id):
+        from .downloader import AlbumDownloader
+        return AlbumDownloader(
+            self.download_slots.limit,
+            self.transcode_slots.limit,
+            progress_callback=(lambda d: self.progress_callback(album_id, d)) if self.progress_callback else None,
+            track_callback=lambda index, state, **data: self._on_track(album_id, index, state, **data),
+            keep_going=True,
+            download_slots=self.download_slots,
+            transcode_slots=self.transcode_slots,
+            library=self.library,
+            ydl_factory=self.ydl_factory
+        )
+
+    def _on_track(self, album_id, index, state, path=None, error=None):
+        self.journal.set_track_state(album_id, index, state, path=path, error=error)
+        if self.track_callback:
+            self.track_callback(album_id, index, state)
+
+    def _run_album(self, album_id, downloader):
+        from .downloader import CancelledError
+        status, error = 'finished', None
+        try:
+            album = self.journal.album(album_id)
+            if album is None:
+                raise LookupError(f"Album {album_id} is missing from the journal")
+            track_indices = self.journal.pending_tracks(album_id)
+            if track_indices:
+                os.makedirs(album['save_path'], exist_ok=True)
+                downloader.download(
+                    album['playlist_id'], track_indices, album['save_path'],
+                    album['audio_format'], album['album_details']
+                )
+        except CancelledError:
+            status = 'cancelled'
+        except Exception:
+            status, error = 'failed', traceback.format_exc()
+            logging.error(f"Album {album_id} failed:\n{error}")
+        finally:
+            with self._cond:
+                self._running.pop(album_id, None)
+                self._threads.pop(album_id, None)
+                cancelled_by_user = album_id in self._cancelled
+                self._cancelled.discard(album_id)
+                stopping = self._stopping
+                self._cond.notify_all()
+
+        if status == 'cancelled' and stopping and not cancelled_by_user:
+            # Interrupted by stop(): leave the tracks to be resumed
+            self.journal.recover(album_id)
+        else:
+            # Nothing may stay pending, or the scheduler would pick the album again
+            reasons = {'finished': "Not downloaded", 'cancelled': "Cancelled", 'failed': "Album download failed"}
+            self.journal.fail_unfinished(album_id, reasons[status])
+        if self.album_callback:
+            self.album_callback(album_id, status, self.journal.counts(album_id), error)
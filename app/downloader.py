@@ -0,0 +1,509 @@
+import os
+import sys
+import time
+import logging
+import threading
+import requests
+from pathlib import Path
+from contextlib import nullcontext
+
+import yt_dlp
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
+
+from .tagging import tag_audio, CoverArt
+from .pipeline import StagedPipeline, Stage, CancelledError, default_transcode_workers, DEFAULT_CONCURRENT_DOWNLOADS
+from .cache import get_image_cache
+from .manifest import build_track_manifest, video_url, playlist_url
+from .formats import format_selector, can_remux, TranscodeStats
+from .finalize import staging_directory, finalize_files, collect_audio_files, list_taken_names
+from .metrics import get_metrics, span
+from .logs import YTDLP_LOGGER
+from .bandwidth import get_bandwidth_manager, BULK
+
+TAG_WORKERS = 2
+
+TRACK_STATES = ('pending', 'downloading', 'transcoding', 'tagged', 'done', 'failed')
+
+class TagAudioPP(PostProcessor):
+    def __init__(self, ydl, album_details=None, cover_path=None, manifest=None):
+        super().__init__(ydl)
+        self.album_details = album_details
+        # Read and prepare the album cover once for every file in the batch
+        self.cover = None
+        if cover_path:
+            try:
+                self.cover = CoverArt.from_path(cover_path)
+            except OSError as e:
+                logging.warning(f"Could not read cover art {cover_path}: {e}")
+        if manifest is None:
+            manifest = build_track_manifest(album_details)
+        self._by_video_id = {e['video_id']: e for e in manifest if e['video_id']}
+        self._by_index = {e['index']: e for e in manifest}
+
+    def _find_track(self, info):
+        entry = self._by_video_id.get(info.get('id'))
+        if entry is None and info.get('playlist_index'):
+            entry = self._by_index.get(info['playlist_index'])
+        return entry
+
+    def run(self, info):
+        with span('tag'):
+            return self._tag(info)
+
+    def _tag(self, info):
+        filepath = Path(info['filepath'])
+        logging.debug(f'Checking for tags for {filepath.name}')
+        temp_save_path = filepath.parent
+
+        cover_path = None
+        if not self.cover:
+            # Fall back to a thumbnail written next to the file by yt-dlp
+            for ext in ('.jpg', '.jpeg', '.png', '.webp'):
+                p = temp_save_path / ('cover' + ext)
+                if p.exists():
+                    cover_path = p
+                    break
+
+        tags = {}
+        if self.album_details:
+            track = self._find_track(info)
+            if track:
+                logging.info(f"Found metadata for track #{track['index']}: {track['title']}")
+                tags = dict(track['tags'])
+            else:
+                logging.warning(f"Could not find metadata for {filepath.name} in album details.")
+
+        if self.cover or cover_path or tags:
+            try:
+                logging.debug(f'Applying metadata for {filepath.name}')
+                tag_audio(filepath, tags, cover_path, cover=self.cover)
+            except NotImplementedError:
+                logging.warning(f'Skipping tagging for {filepath.name}: unsupported file type')
+            except Exception as e:
+                logging.error(f'Could not tag {filepath.name}: {e}')
+        else:
+            logging.info('No cover art or metadata found.')
+
+        return [], info
+
+class ExtractAudioPP(FFmpegExtractAudioPP):
+    """FFmpegExtractAudioPP that appends `output_args` to ffmpeg's output options."""
+    output_args = ()
+
+    def _configuration_args(self, exe, keys=None, *args, **kwargs):
+        configured = super()._configuration_args(exe, keys, *args, **kwargs)
+        if keys and '_o' in keys:
+            return configured + list(self.output_args)
+        return configured
+
+class CollectInfoPP(PostProcessor):
+    """Records the info dict of every downloaded file for the next pipeline stage."""
+    def __init__(self, ydl=None):
+        super().__init__(ydl)
+        self.infos = []
+
+    def run(self, info):
+        # yt-dlp strips the dict it passes here once the download is done
+        self.infos.append(dict(info))
+        return [], info
+
+class HostSlotPP(PostProcessor):
+    """Takes a connection slot for the media host just before the transfer starts."""
+    def __init__(self, bandwidth):
+        super().__init__(None)
+        self.bandwidth = bandwidth
+        self._slot = None
+
+    def run(self, info):
+        if self._slot is None:
+            self._slot = self.bandwidth.host_slot(info.get('url'))
+            self._slot.__enter__()
+        return [], info
+
+    def release(self):
+        if self._slot is not None:
+            self._slot.__exit__(None, None, None)
+            self._slot = None
+
+class AlbumDownloader:
+    """
+    Downloads, converts and tags album tracks without any GUI dependency.
+
+    Progress is reported through `progress_callback`, called from worker
+    threads with a dict whose 'status' is one of:
+
+    preparing   : Nothing downloaded yet
+    downloading : A track is downloading ('position', 'total', 'artist',
+                  'track', 'fraction', 'downloaded_bytes', 'total_bytes',
+                  and 'speed' in bytes/s and 'eta' in seconds when known)
+    processing  : A track finished downloading ('position', 'total',
+                  'artist', 'track')
+    finished    : Every file is in place
+
+    Every dict also carries 'percent', the progress of the whole batch, and
+    per-track dicts the track 'index'. The callback runs on every network
+    chunk; see ProgressAggregator for coalescing it.
+
+    `track_callback(index, state, **data)` is called as each track moves
+    through the TRACK_STATES; 'done' carries the final 'path' and 'failed'
+    the 'error'. Each track is moved into `save_path` as soon as it is
+    tagged, so finished tracks survive a later failure or crash.
+
+    Tracks already in `library` (a LibraryIndex) in the requested format are
+    reported done with their existing path and not downloaded again; new
+    files are added to it as they are finalized.
+
+    With `keep_going`, a failing track is reported and skipped instead of
+    stopping the batch. `download_slots` and `transcode_slots` are optional
+    context managers held around each download and transcode, used to share
+    concurrency limits between several downloaders; `transcode_slots` is
+    normally a TranscodeScheduler, whose `ffmpeg_args()` are read inside the
+    slot so each conversion gets the thread cap that fits the running load.
+    `ffmpeg_args` are extra output options for every conversion.
+
+    `ydl_factory(params)` builds the YoutubeDL instances, yt_dlp.YoutubeDL
+    by default; benchmarks use it to register a local extractor.
+
+    Transfers are paced by `bandwidth`, the process-wide BandwidthManager
+    by default, which also holds them while the player is buffering.
+    """
+    def __init__(self, max_concurrent_downloads=DEFAULT_CONCURRENT_DOWNLOADS, max_transcode_workers=None,
+                 progress_callback=None, track_callback=None, keep_going=False,
+                 download_slots=None, transcode_slots=None, library=None, ydl_factory=None,
+                 ffmpeg_args=None, bandwidth=None):
+        self.max_concurrent_downloads = max(1, int(max_concurrent_downloads))
+        self.max_transcode_workers = max(1, int(max_transcode_workers or default_transcode_workers()))
+        self.progress_callback = progress_callback
+        self.track_callback = track_callback
+        self.keep_going = keep_going
+        self.library = library
+        self.ydl_factory = ydl_factory or yt_dlp.YoutubeDL
+        self.download_slots = download_slots or nullcontext()
+        self.transcode_slots = transcode_slots or nullcontext()
+        self.ffmpeg_args = list(ffmpeg_args or [])
+        self.bandwidth = bandwidth if bandwidth is not None else get_bandwidth_manager()
+        self._is_cancelled = False
+        self._pipeline = None
+
+    @property
+    def cancelled(self):
+        return self._is_cancelled
+
+    def cancel(self):
+        self._is_cancelled = True
+        pipeline = self._pipeline
+        if pipeline:
+            pipeline.cancel()
+
+    def _report(self, status, percent, **data):
+        if self.progress_callback:
+            data['status'] = status
+            data['percent'] = percent
+            self.progress_callback(data)
+
+    def _report_track(self, index, state, **data):
+        if self.track_callback:
+            self.track_callback(index, state, **data)
+
+    def _check_cancelled(self):
+        if self._is_cancelled:
+            raise CancelledError("Download cancelled by user.")
+
+    def _base_ydl_opts(self, audio_format, write_thumbnail=True):
+        ydl_opts = {
+            'format': format_selector(audio_format),
+            'writethumbnail': write_thumbnail,
+            # Route yt-dlp's output, including per-chunk progress lines, through logging
+            'logger': logging.getLogger(YTDLP_LOGGER),
+        }
+        if self.ffmpeg_args:
+            ydl_opts['postprocessor_args'] = {'extractaudio+ffmpeg_o': self.ffmpeg_args}
+
+        if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+            if sys.platform.startswith('win'):
+                ffmpeg_name = 'ffmpeg.exe'
+            else: # linux, darwin (macOS)
+                ffmpeg_name = 'ffmpeg'
+
+            # set bundled ffmpeg location
+            ydl_opts['ffmpeg_location'] = os.path.join(sys._MEIPASS, ffmpeg_name)
+            logging.debug(f"Set ffmpeg location to: {ydl_opts['ffmpeg_location']}")
+
+        return ydl_opts
+
+    def _cached_cover_path(self, album_details):
+        if not album_details or not album_details.get('thumbnails'):
+            return None
+        try:
+            return get_image_cache().get_path(album_details['thumbnails'][-1]['url'])
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.warning(f"Failed to load album art from cache: {e}")
+            return None
+
+    def _build_manifest(self, album_details, track_indices):
+        manifest = build_track_manifest(album_details, track_indices)
+        known = {e['index'] for e in manifest}
+        # Tracks missing from the album details still download through the
+        # playlist, just without metadata.
+        for index in track_indices:
+            if index not in known:
+                manifest.append({'index': index, 'video_id': None, 'title': None, 'tags': {}})
+        return manifest
+
+    def _skip_existing(self, manifest, audio_format):
+        """Splits off tracks the library already has. Returns (to_download, existing_paths)."""
+        if self.library is None:
+            return manifest, []
+        try:
+            existing = self.library.find([e['video_id'] for e in manifest], audio_format)
+        except Exception as e:
+            logging.warning(f"Library lookup failed, downloading every track: {e}")
+            return manifest, []
+        remaining, skipped = [], []
+        for entry in manifest:
+            path = existing.get(entry['video_id'])
+            if path:
+                logging.info(f"Skipping track #{entry['index']}, already downloaded: {path}")
+                self._report_track(entry['index'], 'done', path=path)
+                skipped.append(Path(path))
+            else:
+                remaining.append(entry)
+        return remaining, skipped
+
+    def download(self, playlist_id, track_indices, save_path, audio_format, album_details=None):
+        """
+        Downloads `track_indices` (1-based) of an album into `save_path`.
+        Returns the final file paths. Raises CancelledError if cancelled.
+        """
+        logging.info(f"Starting download for playlist_id={playlist_id}, track_indices={track_indices}, save_path={save_path}, audio_format={audio_format}")
+
+        manifest = self._build_manifest(album_details, track_indices)
+        manifest, skipped = self._skip_existing(manifest, audio_format)
+        if not manifest:
+            self._report('finished', 100)
+            return skipped
+
+        total_tracks = len(manifest)
+        metrics = get_metrics()
+        downloaded_count = 0
+        # Per-track download fraction of every track currently in flight
+        in_flight = {}
+        progress_lock = threading.Lock()
+
+        def batch_percent():
+            # Caller holds progress_lock
+            total_fraction = (downloaded_count + sum(in_flight.values())) / total_tracks
+            return int(total_fraction * 95)
+
+        def make_progress_hook(track_index):
+            received = 0
+
+            def progress_hook(d):
+                self._check_cancelled()
+
+                nonlocal downloaded_count, received
+                if d['status'] == 'downloading':
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                    downloaded = d.get('downloaded_bytes')
+                    if downloaded:
+                        # Hooks run between chunks, so blocking here paces the transfer
+                        self.bandwidth.consume(max(0, downloaded - received), BULK, cancelled=lambda: self._is_cancelled)
+                        received = downloaded
+                        self._check_cancelled()
+
+                    if total and downloaded:
+                        file_fraction = min(downloaded / total, 1.0)
+                        with progress_lock:
+                            in_flight[track_index] = file_fraction
+                            percent = batch_percent()
+                            position = downloaded_count + 1
+                        info = d.get('info_dict', {})
+                        self._report(
+                            'downloading', percent,
+                            index=track_index,
+                            position=position,
+                            total=total_tracks,
+                            artist=info.get('artist'),
+                            track=info.get('track') or info.get('title'),
+                            fraction=file_fraction,
+                            downloaded_bytes=downloaded,
+                            total_bytes=total,
+                            speed=d.get('speed'),
+                            eta=d.get('eta')
+                        )
+                elif d['status'] == 'finished':
+                    with progress_lock:
+                        in_flight.pop(track_index, None)
+                        downloaded_count += 1
+                        percent = batch_percent()
+                        position = downloaded_count
+                    info = d.get('info_dict', {})
+                    self._report(
+                        'processing', percent,
+                        index=track_index,
+                        position=position,
+                        total=total_tracks,
+                        artist=info.get('artist'),
+                        track=info.get('track') or info.get('title')
+                    )
+            return progress_hook
+
+        def track_step(func, state=None):
+            # Stage items are (entry, info) pairs; None is a track that failed
+            # earlier and is passed through so the other tracks keep going.
+            def step(item):
+                if item is None:
+                    return None
+                self._check_cancelled()
+                entry = item[0]
+                if state:
+                    self._report_track(entry['index'], state)
+                try:
+                    return func(*item)
+                except CancelledError:
+                    raise
+                except Exception as e:
+                    if self._is_cancelled:
+                        raise CancelledError("Download cancelled by user.") from e
+                    self._report_track(entry['index'], 'failed', error=str(e))
+                    if not self.keep_going:
+                        raise
+                    logging.error(f"Track #{entry['index']} failed, continuing with the rest: {e}")
+                    return None
+            return step
+
+        def download_track(entry, _):
+            track_index = entry['index']
+            # Each track gets its own directory so concurrent downloads never
+            # race on the shared thumbnail or on output names.
+            track_dir = os.path.join(temp_save_path, f"{track_index:04d}")
+            os.makedirs(track_dir, exist_ok=True)
+            ydl_opts = dict(base_opts)
+            ydl_opts['outtmpl'] = {
+                'default': os.path.join(track_dir, '%(artist)s - %(track)s.%(ext)s'),
+                'pl_thumbnail': os.path.join(track_dir, 'cover'),
+                'thumbnail': ''
+            }
+            if entry['video_id']:
+                # Resolve the track directly; no playlist page is fetched
+                url = video_url(entry['video_id'])
+                ydl_opts['outtmpl']['thumbnail'] = os.path.join(track_dir, 'cover')
+            else:
+                url = playlist_url(playlist_id)
+                ydl_opts['playlist_items'] = str(track_index)
+            # yt-dlp extracts and downloads in one call; the first progress
+            # hook marks where extraction ends
+            transfer_started = []
+            def mark_transfer(d):
+                if not transfer_started:
+                    transfer_started.append(time.perf_counter())
+            ydl_opts['progress_hooks'] = [mark_transfer, make_progress_hook(track_index)]
+
+            collector = CollectInfoPP()
+            host_slot = HostSlotPP(self.bandwidth)
+            with self.download_slots, self.ydl_factory(ydl_opts) as ydl:
+                ydl.add_post_processor(collector, when='post_process')
+                ydl.add_post_processor(host_slot, when='before_dl')
+                logging.info(f"Starting yt-dlp download for track #{track_index}: {url}")
+                started = time.perf_counter()
+                try:
+                    ydl.download([url])
+                finally:
+                    host_slot.release()
+                    finished = time.perf_counter()
+                    split = transfer_started[0] if transfer_started else finished
+                    metrics.observe('extract', split - started)
+                    if transfer_started:
+                        metrics.observe('download', finished - split)
+                logging.info(f"Finished yt-dlp download for track #{track_index}")
+            if not collector.infos:
+                raise yt_dlp.utils.DownloadError(f"Track #{track_index} was not downloaded.")
+            return entry, collector.infos[0]
+
+        def transcode_track(entry, info):
+            extractor = ExtractAudioPP(
+                processing_ydl,
+                preferredcodec=audio_format,
+                preferredquality='0',
+                nopostoverwrites=False
+            )
+            source_codec = info.get('acodec')
+            name = Path(info['filepath']).stem
+            with self.transcode_slots as slot:
+                if hasattr(slot, 'ffmpeg_args'):
+                    extractor.output_args = slot.ffmpeg_args()
+                started = time.perf_counter()
+                files_to_delete, info = extractor.run(info)
+                elapsed = time.perf_counter() - started
+            metrics.observe('transcode', elapsed, source=source_codec, target=audio_format)
+            transcode_stats.record(
+                name, source_codec, audio_format,
+                copied=can_remux(source_codec, audio_format),
+                elapsed=elapsed,
+                duration=info.get('duration')
+            )
+            for path in files_to_delete:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"Could not remove intermediate file {path}: {e}")
+            return entry, info
+
+        def tag_track(entry, info):
+            _, info = tag_pp.run(info)
+            self._report_track(entry['index'], 'tagged')
+            return entry, info
+
+        taken_names = None
+
+        def finalize_track(entry, info):
+            nonlocal taken_names
+            track_dir = Path(info['filepath']).parent
+            with span('finalize'):
+                # The finalize stage has one worker, so the set needs no lock
+                if taken_names is None:
+                    taken_names = list_taken_names(save_path)
+                moved = finalize_files(collect_audio_files(track_dir), save_path, taken_names)
+            for path in moved:
+                if self.library is not None:
+                    try:
+                        self.library.add_file(path, video_id=entry['video_id'], playlist_id=playlist_id)
+                    except Exception as e:
+                        logging.warning(f"Could not add {path} to the library index: {e}")
+                self._report_track(entry['index'], 'done', path=str(path))
+            return moved
+
+        with staging_directory(save_path) as temp_save_path, span('album', format=audio_format):
+            transcode_stats = TranscodeStats()
+            cover_path = self._cached_cover_path(album_details)
+            # Only let yt-dlp fetch the playlist thumbnail when the shared
+            # image cache could not provide the album cover.
+            base_opts = self._base_ydl_opts(audio_format, write_thumbnail=cover_path is None)
+            logging.debug(f"yt-dlp format: {base_opts['format']}, writethumbnail: {base_opts['writethumbnail']}")
+
+            self._report('preparing', 0)
+            download_workers = min(self.max_concurrent_downloads, total_tracks) or 1
+            transcode_workers = min(self.max_transcode_workers, total_tracks) or 1
+            logging.info(f"Downloading {total_tracks} track(s) with {download_workers} download and {transcode_workers} transcode worker(s)")
+            with self.ydl_factory(base_opts) as processing_ydl:
+                tag_pp = TagAudioPP(processing_ydl, album_details, cover_path, manifest)
+                self._pipeline = StagedPipeline([
+                    Stage('download', track_step(download_track, 'downloading'), download_workers),
+                    Stage('transcode', track_step(transcode_track, 'transcoding'), transcode_workers),
+                    Stage('tag', track_step(tag_track), TAG_WORKERS),
+                    Stage('finalize', track_step(finalize_track), 1),
+                ])
+                try:
+                    results = self._pipeline.run((entry, None) for entry in manifest)
+                except BaseException:
+                    # Running siblings stop at their next progress hook
+                    self._is_cancelled = True
+                    raise
+                finally:
+                    self._pipeline = None
+            logging.info(f"Audio extraction: {transcode_stats.summary()}")
+            self._check_cancelled()
+
+            self._report('finished', 100)
+            return skipped + [path for moved in results if moved for path in moved]
@@ -0,0 +1,173 @@
+import os
+import sys
+import errno
+import time
+import shutil
+import logging
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+AUDIO_EXTENSIONS = {'.mp3', '.flac', '.m4a', '.opus', '.wav'}
+
+STAGING_PREFIX = '.ytmd-staging-'
+
+# Staging directories untouched for this long were left by a crash or kill
+STALE_STAGING_AGE = 6 * 60 * 60
+
+def _hide(path):
+    # The leading dot only hides the directory outside Windows
+    if sys.platform == 'win32':
+        import ctypes
+        FILE_ATTRIBUTE_HIDDEN = 0x02
+        ctypes.windll.kernel32.SetFileAttributesW(str(path), FILE_ATTRIBUTE_HIDDEN)
+
+def _last_modified(path):
+    latest = os.stat(path).st_mtime
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                latest = max(latest, entry.stat(follow_symlinks=False).st_mtime)
+            except OSError:
+                pass
+    return latest
+
+def sweep_stale_staging(save_path, max_age=STALE_STAGING_AGE, now=None):
+    """
+    Removes staging directories in `save_path` that nothing has written to
+    for `max_age` seconds, with the partial files a crashed run left in
+    them. Returns the number removed.
+    """
+    now = time.time() if now is None else now
+    removed = 0
+    try:
+        entries = [e for e in os.scandir(save_path) if e.name.startswith(STAGING_PREFIX) and e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if now - _last_modified(entry.path) < max_age:
+                continue
+            shutil.rmtree(entry.path)
+            removed += 1
+        except OSError as e:
+            logging.warning(f"Could not remove stale staging directory {entry.path}: {e}")
+    if removed:
+        logging.info(f"Removed {removed} stale staging director{'y' if removed == 1 else 'ies'} from {save_path}")
+    return removed
+
+def staging_directory(save_path):
+    """
+    Returns a TemporaryDirectory on the same filesystem as `save_path`, so
+    finished files can be renamed into place instead of copied. Falls back to
+    the system temp directory if `save_path` is not writable. Staging
+    directories a crashed run left in `save_path` are removed first.
+    """
+    sweep_stale_staging(save_path)
+    try:
+        staging = TemporaryDirectory(prefix=STAGING_PREFIX, dir=save_path)
+    except OSError as e:
+        logging.warning(f"Could not stage in {save_path}, using system temp directory: {e}")
+        return TemporaryDirectory()
+    _hide(staging.name)
+    return staging
+
+def _name_key(name):
+    # Windows and macOS filesystems are usually case-insensitive
+    return name.casefold() if sys.platform in ('win32', 'darwin') else name
+
+def _unique_name(name, taken):
+    """Picks `name` or `stem (n).ext` that is not in `taken`, without touching the disk."""
+    if _name_key(name) not in taken:
+        return name
+    stem, suffix = os.path.splitext(name)
+    counter = 1
+    while True:
+        candidate = f"{stem} ({counter}){suffix}"
+        if _name_key(candidate) not in taken:
+            return candidate
+        counter += 1
+
+def _reflink(src, dst):
+    """Clones `src` to `dst` with a copy-on-write reflink. Raises OSError if unsupported."""
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src, 'rb') as s, open(dst, 'xb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+def _move(src, dst):
+    """Moves `src` to `dst`, which must not exist. Returns how it was moved."""
+    try:
+        # Hard link + unlink is an atomic rename that refuses to overwrite
+        os.link(src, dst)
+        os.unlink(src)
+        return 'rename'
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            try:
+                _reflink(src, dst)
+                os.unlink(src)
+                return 'reflink'
+            except FileExistsError:
+                raise
+            except OSError:
+                with open(dst, 'xb'):
+                    pass
+                shutil.copyfile(src, dst)
+                os.unlink(src)
+                return 'copy'
+    # Filesystems without hard links (FAT, some network shares)
+    if os.path.exists(dst):
+        raise FileExistsError(errno.EEXIST, "Destination exists", dst)
+    os.replace(src, dst)
+    return 'rename'
+
+def list_taken_names(dest_dir):
+    """Returns the names in `dest_dir` in the form finalize_files compares them."""
+    with os.scandir(dest_dir) as entries:
+        return {_name_key(e.name) for e in entries}
+
+def finalize_files(files, dest_dir, taken=None):
+    """
+    Moves finished files into `dest_dir`, renaming to `name (n).ext` on
+    collisions. The destination is listed once; collisions with files created
+    concurrently are still caught because the move refuses to overwrite.
+    Returns the list of final paths.
+
+    `taken` is a set from list_taken_names to reuse across calls into the same
+    directory; the names moved in are added to it.
+    """
+    dest_dir = Path(dest_dir)
+    if taken is None:
+        taken = list_taken_names(dest_dir)
+
+    moved = []
+    for src in files:
+        src = Path(src)
+        while True:
+            name = _unique_name(src.name, taken)
+            taken.add(_name_key(name))
+            dest_path = dest_dir / name
+            try:
+                method = _move(src, dest_path)
+                break
+            except FileExistsError:
+                continue
+        logging.info(f"Moved {src} to {dest_path} ({method})")
+        moved.append(dest_path)
+    return moved
+
+def collect_audio_files(directory):
+    """Returns finished audio files under `directory` in a stable order."""
+    return sorted(
+        p for p in Path(directory).rglob('*')
+        if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS
+    )
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+# yt-dlp `acodec` prefixes that FFmpegExtractAudioPP can stream-copy into
+# each target format without re-encoding.
+REMUXABLE_CODECS = {
+    'm4a': ('mp4a', 'aac'),
+    'opus': ('opus',),
+    'mp3': ('mp3',),
+    'flac': ('flac',),
+    'wav': (),
+}
+
+# Encoder cost used until a real transcode has been timed, in CPU seconds
+# per second of audio.
+DEFAULT_TRANSCODE_COST = 0.03
+
+def format_selector(audio_format):
+    """
+    Returns a yt-dlp format string that prefers a source stream which can be
+    remuxed into `audio_format`, falling back to the best audio otherwise.
+    """
+    codecs = REMUXABLE_CODECS.get(audio_format, ())
+    preferred = [f'bestaudio[acodec^={codec}]' for codec in codecs]
+    return '/'.join(preferred + ['bestaudio/best'])
+
+def can_remux(acodec, audio_format):
+    """True if a stream with yt-dlp codec `acodec` only needs a stream copy."""
+    codecs = REMUXABLE_CODECS.get(audio_format)
+    if not acodec or not codecs:
+        return False
+    return acodec.lower().startswith(codecs)
+
+class TranscodeStats:
+    """
+    Tracks, per batch, which files were copied and which were re-encoded.
+
+    ffmpeg audio encoding runs on a single core, so wall time of a transcode
+    is used as its CPU time. The cost per second of audio seen on real
+    transcodes in the batch estimates what each stream copy saved.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.copied = 0
+        self.transcoded = 0
+        self.saved_seconds = 0.0
+        self._transcode_seconds = 0.0
+        self._transcode_audio_seconds = 0.0
+
+    def cost_per_audio_second(self):
+        if self._transcode_audio_seconds > 0:
+            return self._transcode_seconds / self._transcode_audio_seconds
+        return DEFAULT_TRANSCODE_COST
+
+    def record(self, name, source_codec, audio_format, copied, elapsed, duration=None):
+        with self._lock:
+            if copied:
+                self.copied += 1
+                saved = max(0.0, (duration or 0) * self.cost_per_audio_second() - elapsed)
+                self.saved_seconds += saved
+                logging.info(f"Copied {name} ({source_codec} -> {audio_format}) in {elapsed:.2f}s, saved ~{saved:.1f} CPU s")
+            else:
+                self.transcoded += 1
+                if duration:
+                    self._transcode_seconds += elapsed
+                    self._transcode_audio_seconds += duration
+                logging.info(f"Transcoded {name} ({source_codec} -> {audio_format}) in {elapsed:.2f}s")
+
+    def summary(self):
+        return f"{self.copied} copied, {self.transcoded} transcoded, ~{self.saved_seconds:.1f} CPU s saved"
@@ -0,0 +1,242 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from .utils import get_data_dir
+from .finalize import AUDIO_EXTENSIONS
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+def file_hash(path):
+    """SHA-256 of a file's contents, as hex."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class LibraryIndex:
+    """
+    Index of downloaded audio files, keyed by path.
+
+    Each file is recorded with its YouTube videoId, format (the file
+    extension), quality (bitrate in kbps), size, mtime, SHA-256, basic tags
+    and, when known, the album playlist it was downloaded from. Files are
+    added as the downloader finalizes them, and `scan` brings a folder up
+    to date by reading the tags of new or changed files only. Lookups by videoId and format go through an index, so they stay
+    fast with hundreds of thousands of files.
+
+    path : SQLite file, or ':memory:' for a non-persistent index
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(get_data_dir(), 'library.sqlite3')
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY,"
+                " directory TEXT NOT NULL,"
+                " video_id TEXT,"
+                " audio_format TEXT NOT NULL,"
+                " quality INTEGER,"
+                " size INTEGER NOT NULL,"
+                " mtime REAL NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " title TEXT,"
+                " artist TEXT,"
+                " album TEXT,"
+                " track_number INTEGER,"
+                " indexed_at REAL NOT NULL,"
+                " playlist_id TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_video ON files (video_id, audio_format)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_playlist ON files (playlist_id, track_number)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_directory ON files (directory)")
+
+    def _read_file(self, path, stat, video_id=None, playlist_id=None):
+        import mutagen
+        from .tagging import read_tags
+        tags, quality = {}, None
+        try:
+            audio = mutagen.File(path, easy=False)
+            tags = read_tags(audio)
+            bitrate = getattr(getattr(audio, 'info', None), 'bitrate', None)
+            quality = round(bitrate / 1000) if bitrate else None
+        except Exception as e:
+            logging.debug(f"Could not read tags of {path}: {e}")
+        track_number = tags.get('track_number')
+        return (
+            str(path), str(Path(path).parent), video_id or tags.get('video_id'),
+            Path(path).suffix.lower().lstrip('.'), quality, stat.st_size, stat.st_mtime,
+            file_hash(path), tags.get('title'), tags.get('artist'), tags.get('album'),
+            int(track_number) if track_number and track_number.isdigit() else None,
+            time.time(), playlist_id
+        )
+
+    def _upsert(self, rows):
+        with self._lock, self._db:
+            # A rescan knows no playlist, so it keeps the one recorded at download time
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (path, directory, video_id, audio_format, quality, size, mtime,"
+                " hash, title, artist, album, track_number, indexed_at, playlist_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,"
+                " COALESCE(?14, (SELECT playlist_id FROM files WHERE path = ?1)))",
+                rows
+            )
+
+    def add_file(self, path, video_id=None, playlist_id=None):
+        """
+        Indexes one file. `video_id` overrides the one read from its tags;
+        `playlist_id` is the album playlist the file was downloaded from.
+        """
+        path = os.path.abspath(path)
+        self._upsert([self._read_file(path, os.stat(path), video_id, playlist_id)])
+
+    def remove(self, paths):
+        paths = [str(p) for p in paths]
+        with self._lock, self._db:
+            for i in range(0, len(paths), _QUERY_CHUNK):
+                chunk = paths[i:i + _QUERY_CHUNK]
+                self._db.execute(
+                    f"DELETE FROM files WHERE path IN ({', '.join('?' * len(chunk))})", chunk
+                )
+
+    def find(self, video_ids, audio_format):
+        """
+        Returns {video_id: path} for the given videoIds that are already in
+        the library as `audio_format`, preferring the highest quality.
+        Entries whose file is gone are dropped from the index.
+        """
+        video_ids = list({v for v in video_ids if v})
+        rows = []
+        with self._lock:
+            for i in range(0, len(video_ids), _QUERY_CHUNK):
+                chunk = video_ids[i:i + _QUERY_CHUNK]
+                rows += self._db.execute(
+                    f"SELECT video_id, path, size FROM files"
+                    f" WHERE audio_format = ? AND video_id IN ({', '.join('?' * len(chunk))})"
+                    f" ORDER BY quality DESC",
+                    [audio_format, *chunk]
+                ).fetchall()
+
+        found, missing = {}, []
+        for video_id, path, size in rows:
+            if video_id in found:
+                continue
+            try:
+                if os.stat(path).st_size == size:
+                    found[video_id] = path
+                    continue
+            except OSError:
+                pass
+            missing.append(path)
+        if missing:
+            logging.info(f"Dropping {len(missing)} missing or changed file(s) from the library index")
+            self.remove(missing)
+        return found
+
+    def find_track(self, video_id=None, playlist_id=None, track_number=None):
+        """
+        Returns the path of any downloaded copy of a track, or None. Tracks
+        are looked up by videoId, or, for tracks without one, by the album
+        playlist they were downloaded from and their track number.
+        """
+        with self._lock:
+            if video_id:
+                rows = self._db.execute(
+                    "SELECT path FROM files WHERE video_id = ? ORDER BY quality DESC", (video_id,)
+                ).fetchall()
+            elif playlist_id and track_number:
+                rows = self._db.execute(
+                    "SELECT path FROM files WHERE playlist_id = ? AND track_number = ? ORDER BY quality DESC",
+                    (playlist_id, int(track_number))
+                ).fetchall()
+            else:
+                rows = []
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def directories(self):
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT directory FROM files").fetchall()]
+
+    def scan(self, directory, recursive=True):
+        """
+        Brings the index up to date with the audio files in `directory`.
+        Only new files and files whose size or mtime changed are read.
+        Returns (added_or_updated, removed).
+        """
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            # Keep the entries of an unmounted drive until it comes back
+            logging.info(f"Library scan skipped, {directory} is not available")
+            return 0, 0
+        with self._lock:
+            if recursive:
+                prefix = os.path.join(directory, '')
+                known = self._db.execute(
+                    "SELECT path, size, mtime FROM files WHERE directory = ? OR substr(directory, 1, ?) = ?",
+                    (directory, len(prefix), prefix)
+                ).fetchall()
+            else:
+                known = self._db.execute(
+                    "SELECT path, size, mtime FROM files WHERE directory = ?", (directory,)
+                ).fetchall()
+        known = {path: (size, mtime) for path, size, mtime in known}
+
+        files = Path(directory).rglob('*') if recursive else Path(directory).glob('*')
+        seen, rows = set(), []
+        for p in files:
+            if p.suffix.lower() not in AUDIO_EXTENSIONS:
+                continue
+            # Hidden files and folders, including leftover staging directories
+            if any(part.startswith('.') for part in p.relative_to(directory).parts):
+                continue
+            try:
+                stat = p.stat()
+                if not p.is_file():
+                    continue
+                path = str(p)
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime):
+                    continue
+                rows.append(self._read_file(path, stat))
+            except OSError as e:
+                logging.debug(f"Skipping {p}: {e}")
+        if rows:
+            self._upsert(rows)
+        removed = [path for path in known if path not in seen]
+        if removed:
+            self.remove(removed)
+        logging.info(f"Library scan of {directory}: {len(rows)} added or updated, {len(removed)} removed")
+        return len(rows), len(removed)
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_library = None
+_library_lock = threading.Lock()
+
+def get_library():
+    """Returns the process-wide LibraryIndex shared by the UI, the queue and the CLI."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = LibraryIndex()
+        return _library
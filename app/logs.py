@@ -0,0 +1,178 @@
+import os
+import re
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from .utils import get_data_dir
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Rotating log of the frozen build: 3 files of 2 MB
+LOG_FILE_MAX_BYTES = 2 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# yt-dlp logs a '[download]  42.0% of ...' line per network chunk
+YTDLP_LOGGER = 'yt_dlp'
+SAMPLED_MESSAGES = {YTDLP_LOGGER: re.compile(r'\[download\]\s+[\d.]+% ')}
+SAMPLE_INTERVAL = 1.0
+
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_lock = threading.Lock()
+
+def shorten(text, limit=96):
+    """Cuts long values such as googlevideo URLs down for log messages."""
+    text = str(text)
+    return text if len(text) <= limit else f"{text[:limit - 3]}..."
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object: ts, level, logger, thread and
+    message, plus any fields passed with `extra` and the traceback as exc.
+    """
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets at most one record per `interval` seconds through for each sampled
+    stream and drops the rest; other records pass untouched. A record is
+    sampled if it was logged with `extra={'sample': key}`, or if its
+    message matches the pattern listed for its logger in `patterns`. The
+    number of records dropped since the last one is added to it as
+    `sampled_out`.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL, patterns=SAMPLED_MESSAGES, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.patterns = patterns
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last = {}
+        self._dropped = {}
+
+    def _key(self, record):
+        key = getattr(record, 'sample', None)
+        if key is not None:
+            return key
+        pattern = self.patterns.get(record.name)
+        if pattern and isinstance(record.msg, str) and pattern.match(record.msg):
+            return (record.name, record.threadName)
+        return None
+
+    def filter(self, record):
+        key = self._key(record)
+        if key is None:
+            return True
+        now = self._clock()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._dropped[key] = self._dropped.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            dropped = self._dropped.pop(key, 0)
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the arguments and render the traceback on the logging thread,
+        # but leave the formatting to the listener's handlers
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def default_log_file():
+    directory = os.path.join(get_data_dir(), 'logs')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, 'yt-music-downloader.log')
+
+def setup_logging(level=None, stream=None, log_file=None):
+    """
+    Routes all logging through a QueueHandler, so threads only enqueue
+    records and a single listener thread does the formatting and I/O.
+
+    Running from source, records go to `stream` (stdout by default) as
+    text at DEBUG. The PyInstaller build has no console, so it writes INFO
+    and above to a rotating file of JSON records in the data directory.
+    yt-dlp's per-chunk progress lines are sampled to one a second.
+    """
+    global _listener
+    # PyInstaller sets sys.frozen to True
+    is_frozen = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
+    if level is None:
+        level = logging.INFO if is_frozen else logging.DEBUG
+    if stream is None and not is_frozen:
+        stream = sys.stdout
+
+    handlers = []
+    if stream is not None:
+        console = logging.StreamHandler(stream)
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console)
+    if log_file is None and is_frozen:
+        try:
+            log_file = default_log_file()
+        except OSError:
+            pass
+    if log_file:
+        try:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError:
+            pass
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(level)
+        queue_handler = _QueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(SamplingFilter())
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+def shutdown_logging():
+    """Writes out queued records and stops the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+atexit.register(shutdown_logging)
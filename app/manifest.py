@@ -0,0 +1,56 @@
+def _join_artists(artists):
+    return ', '.join([a['name'] for a in artists]) if artists else None
+
+def track_tags(album_details, track, index):
+    """Builds the tag dictionary used by tag_audio for one album track."""
+    tags = {'title': track.get('title')}
+    artist = _join_artists(track.get('artists'))
+    if artist:
+        tags['artist'] = artist
+    tags['album'] = album_details.get('title')
+    album_artist = _join_artists(album_details.get('artists'))
+    if album_artist:
+        tags['album_artist'] = album_artist
+    tags['track_number'] = index
+    if album_details.get('trackCount'):
+        tags['total_tracks'] = album_details.get('trackCount')
+    if album_details.get('year'):
+        tags['year'] = album_details.get('year')
+    if track.get('videoId'):
+        tags['video_id'] = track['videoId']
+    return tags
+
+def build_track_manifest(album_details, track_indices=None):
+    """
+    Returns one entry per album track, or only for `track_indices` (1-based)
+    if given. Each entry is a dict with:
+
+    index    : 1-based position in the album
+    video_id : YouTube videoId, or None if the track has none
+    title    : Track title
+    tags     : Tags for tag_audio
+    """
+    if not album_details or not album_details.get('tracks'):
+        return []
+    tracks = album_details['tracks']
+    if track_indices is None:
+        track_indices = range(1, len(tracks) + 1)
+
+    manifest = []
+    for index in track_indices:
+        if not 0 < index <= len(tracks):
+            continue
+        track = tracks[index - 1]
+        manifest.append({
+            'index': index,
+            'video_id': track.get('videoId'),
+            'title': track.get('title'),
+            'tags': track_tags(album_details, track, index),
+        })
+    return manifest
+
+def video_url(video_id):
+    return f"https://music.youtube.com/watch?v={video_id}"
+
+def playlist_url(playlist_id):
+    return f"https://youtube.com/playlist?list={playlist_id}"
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+
+# Upper bounds in seconds, from a cache hit to a long transcode
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histogram:
+    """Bucketed durations of one series, as in a Prometheus histogram."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimates the q-quantile by interpolating inside its bucket. None if empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                return lower + max(0.0, upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+class Span:
+    """Times a `with` block. Labels can still be added inside the block."""
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels['status'] = 'error'
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """
+    Timing histograms keyed by span name and labels.
+
+    `span` times a block and `observe` records a duration measured
+    elsewhere; `set_gauge` keeps the current value of a level such as a
+    queue depth. Recording only updates a histogram, so spans are cheap
+    enough for every track and lookup. For graphing, every observation
+    can be appended to a JSON lines file (`open_jsonl`), the histograms
+    rendered in the Prometheus text format (`prometheus_text`), written to
+    a file on `close` (`prom_path`) or served at
+    http://127.0.0.1:<port>/metrics (`serve`).
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.prom_path = None
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._gauges = {}
+        self._jsonl = None
+        self._server = None
+
+    def span(self, name, **labels):
+        return Span(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        labels = {k: str(v) for k, v in labels.items() if v is not None}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if self._jsonl is not None:
+                record = {'ts': round(time.time(), 3), 'span': name, 'seconds': round(seconds, 6), 'labels': labels}
+                try:
+                    self._jsonl.write(json.dumps(record) + '\n')
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Could not write metrics, disabling the JSON lines log: {e}")
+                    self._jsonl = None
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        with self._lock:
+            self._gauges[key] = value
+
+    def gauges(self):
+        """Returns {name: value} for the gauges set without labels."""
+        with self._lock:
+            return {name: value for (name, labels), value in self._gauges.items() if not labels}
+
+    def summary(self):
+        """Returns one dict per series with count, sum, p50, p99 and max in seconds."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            return [{
+                'span': name,
+                'labels': dict(labels),
+                'count': h.count,
+                'sum': round(h.sum, 6),
+                'p50': round(h.quantile(0.5), 6),
+                'p99': round(h.quantile(0.99), 6),
+                'max': round(h.max, 6),
+            } for (name, labels), h in items]
+
+    def prometheus_text(self):
+        lines = [
+            '# HELP ytmd_span_seconds Duration of timed stages.',
+            '# TYPE ytmd_span_seconds histogram',
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (name, labels), h in items:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in (('span', name),) + labels)
+                cumulative = 0
+                for bound, n in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += n
+                    lines.append(f'ytmd_span_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'ytmd_span_seconds_sum{{{label_text}}} {h.sum:.6f}')
+                lines.append(f'ytmd_span_seconds_count{{{label_text}}} {h.count}')
+            gauges = sorted(self._gauges.items())
+        for name in sorted({name for (name, _), _ in gauges}):
+            lines.append(f'# TYPE ytmd_{name} gauge')
+            for (gauge, labels), value in gauges:
+                if gauge == name:
+                    label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f'ytmd_{name}{{{label_text}}} {value}' if label_text else f'ytmd_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Writes `prometheus_text` atomically, e.g. for node_exporter's textfile collector."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def open_jsonl(self, path):
+        """Appends every following observation to `path`, one JSON object per line."""
+        f = open(path, 'a', encoding='utf-8', buffering=1)
+        with self._lock:
+            previous, self._jsonl = self._jsonl, f
+        if previous is not None:
+            previous.close()
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves `prometheus_text` at /metrics on a background thread. Returns the bound port."""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, args=(0.1,), name='metrics-server', daemon=True).start()
+        self._server = server
+        logging.info(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+        return server.server_address[1]
+
+    def configure(self, jsonl_path=None, prom_path=None, port=None):
+        if jsonl_path:
+            self.open_jsonl(jsonl_path)
+        if prom_path:
+            self.prom_path = prom_path
+        if port is not None:
+            self.serve(port)
+
+    def close(self):
+        """Writes the Prometheus file if one is configured and stops exporting."""
+        if self.prom_path:
+            try:
+                self.write_prometheus(self.prom_path)
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {self.prom_path}: {e}")
+        with self._lock:
+            jsonl, self._jsonl = self._jsonl, None
+        if jsonl is not None:
+            jsonl.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+_metrics = Metrics()
+
+def get_metrics():
+    """Returns the process-wide Metrics."""
+    return _metrics
+
+def span(name, **labels):
+    """Times a `with` block in the process-wide Metrics."""
+    return _metrics.span(name, **labels)
+
+def configure_from_env(environ=os.environ):
+    """
+    Sets up exports for the GUI from YTMD_METRICS_JSONL (file of spans),
+    YTMD_METRICS_PROM (Prometheus file written on exit) and
+    YTMD_METRICS_PORT (local /metrics endpoint).
+    """
+    port = environ.get('YTMD_METRICS_PORT')
+    try:
+        _metrics.configure(
+            jsonl_path=environ.get('YTMD_METRICS_JSONL'),
+            prom_path=environ.get('YTMD_METRICS_PROM'),
+            port=int(port) if port else None
+        )
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not set up metrics export: {e}")
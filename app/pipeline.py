@@ -0,0 +1,237 @@
+import os
+import sys
+import queue
+import functools
+import logging
+import threading
+import subprocess
+
+_SENTINEL = object()
+
+DEFAULT_CONCURRENT_DOWNLOADS = 4
+
+class CancelledError(Exception):
+    pass
+
+def usable_cpus():
+    """Logical CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+def _linux_physical_cores():
+    cores = set()
+    physical_id = core_id = None
+    with open('/proc/cpuinfo', encoding='utf-8') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            key = key.strip()
+            if key == 'physical id':
+                physical_id = value.strip()
+            elif key == 'core id':
+                core_id = value.strip()
+            elif not key and core_id is not None:
+                cores.add((physical_id, core_id))
+                physical_id = core_id = None
+    if core_id is not None:
+        cores.add((physical_id, core_id))
+    return len(cores)
+
+def _windows_physical_cores():
+    import ctypes
+    from ctypes import wintypes
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    relation_processor_core = 0
+    length = wintypes.DWORD(0)
+    kernel32.GetLogicalProcessorInformationEx(relation_processor_core, None, ctypes.byref(length))
+    buffer = ctypes.create_string_buffer(length.value)
+    if not kernel32.GetLogicalProcessorInformationEx(relation_processor_core, buffer, ctypes.byref(length)):
+        return 0
+    # One variable-size record per core; each starts with its Relationship and Size
+    count = offset = 0
+    while offset < length.value:
+        size = int.from_bytes(buffer.raw[offset + 4:offset + 8], 'little')
+        if not size:
+            break
+        count += 1
+        offset += size
+    return count
+
+@functools.lru_cache(maxsize=None)
+def physical_cores():
+    """Physical CPU cores, capped by the CPUs this process may use. Falls back to logical CPUs."""
+    cores = 0
+    try:
+        if sys.platform.startswith('linux'):
+            cores = _linux_physical_cores()
+        elif sys.platform.startswith('win'):
+            cores = _windows_physical_cores()
+        elif sys.platform == 'darwin':
+            cores = int(subprocess.run(
+                ['sysctl', '-n', 'hw.physicalcpu'], capture_output=True, text=True, timeout=2
+            ).stdout.strip() or 0)
+    except (OSError, ValueError, AttributeError, subprocess.SubprocessError) as e:
+        logging.debug(f"Could not count physical cores: {e}")
+    return max(1, min(cores, usable_cpus()) if cores else usable_cpus())
+
+def default_transcode_workers():
+    """Number of concurrent ffmpeg processes, one per physical core."""
+    return physical_cores()
+
+class ConcurrencyLimit:
+    """
+    Context manager that lets at most `limit` threads inside at once. Unlike
+    a semaphore, the limit can be changed while slots are held; lowering it
+    only holds back new entries.
+    """
+    def __init__(self, limit):
+        self._cond = threading.Condition()
+        self._limit = max(1, int(limit))
+        self._in_use = 0
+        self._waiting = 0
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    @property
+    def waiting(self):
+        """Threads blocked waiting for a slot."""
+        return self._waiting
+
+    def set_limit(self, limit):
+        with self._cond:
+            self._limit = max(1, int(limit))
+            self._cond.notify_all()
+
+    def __enter__(self):
+        with self._cond:
+            if self._in_use >= self._limit:
+                self._waiting += 1
+                try:
+                    while self._in_use >= self._limit:
+                        self._cond.wait()
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify_all()
+
+class Stage:
+    """
+    A single pipeline stage.
+
+    name    : Used for logging and thread names
+    func    : Callable taking one item and returning the item for the next stage
+    workers : Number of threads running `func` concurrently
+    """
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+class StagedPipeline:
+    """
+    Runs items through a chain of stages, each with its own worker threads,
+    connected by bounded queues. A full queue blocks the upstream stage so a
+    fast stage cannot run arbitrarily far ahead of a slow one.
+
+    The first exception raised by any stage stops the pipeline: items still
+    queued are drained without being processed and `run` re-raises it.
+    After `cancel`, items are drained the same way and `run` raises
+    CancelledError instead of returning partial results.
+    """
+    def __init__(self, stages, queue_size=None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _fail(self, exc):
+        with self._lock:
+            self._errors.append(exc)
+        self._stop.set()
+
+    def _work(self, stage, in_queue, out_queue, results):
+        while True:
+            item = in_queue.get()
+            if item is _SENTINEL:
+                break
+            if self._stop.is_set():
+                continue # Drain so upstream never blocks on a full queue
+            try:
+                out = stage.func(item)
+            except BaseException as e:
+                logging.debug(f"Stage '{stage.name}' failed: {e!r}")
+                self._fail(e)
+                continue
+            if out_queue is not None:
+                out_queue.put(out)
+            else:
+                with self._lock:
+                    results.append(out)
+
+    def run(self, items):
+        """Processes every item through all stages and returns the final results."""
+        items = list(items)
+        results = []
+
+        queues = [queue.Queue()]
+        for stage in self.stages[1:]:
+            maxsize = self.queue_size if self.queue_size is not None else stage.workers * 2
+            queues.append(queue.Queue(maxsize=maxsize))
+        for item in items:
+            queues[0].put(item)
+
+        stage_threads = []
+        for i, stage in enumerate(self.stages):
+            out_queue = queues[i + 1] if i + 1 < len(queues) else None
+            threads = [
+                threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], out_queue, results),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                for n in range(stage.workers)
+            ]
+            for t in threads:
+                t.start()
+            stage_threads.append(threads)
+
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_SENTINEL)
+
+        # Shut stages down in order: once every worker of a stage has exited
+        # nothing more can reach the next queue, so it is safe to close it.
+        for i, threads in enumerate(stage_threads):
+            for t in threads:
+                t.join()
+            if i + 1 < len(self.stages):
+                for _ in range(self.stages[i + 1].workers):
+                    queues[i + 1].put(_SENTINEL)
+
+        if self._errors:
+            raise self._errors[0]
+        if self._stop.is_set():
+            raise CancelledError("Pipeline cancelled.")
+        return results
@@ -1,11 +1,33 @@
-import yt_dlp
+import math
+import time
 import logging
-from PySide6.QtWidgets import QWidget, QHBoxLayout, QLabel, QPushButton, QSlider
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QLabel, QPushButton, QSlider, QSpinBox
 from PySide6.QtGui import QFont
 from PySide6.QtCore import Qt, QUrl, QTimer
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
 
+from .stream import StreamResolver, LocalTrackFinder
+from .metrics import get_metrics
+from .bandwidth import get_bandwidth_manager
+
+# The next track is loaded into the standby player this long before the
+# current one ends
+PRELOAD_AHEAD_MS = 30 * 1000
+MAX_CROSSFADE_SECONDS = 10
+CROSSFADE_STEP_MS = 50
+
 class MusicPlayer(QWidget):
+    """
+    Player bar with two QMediaPlayers. While a track plays, the next one is
+    loaded into the standby player, and the two are swapped when the
+    track ends (or crossfaded over its last seconds), so album tracks
+    follow each other without waiting for a new source to load. The time
+    from the end of a track to audio from the next is recorded as the
+    `track_transition` metric.
+
+    Tracks already in the library are played from their files; the
+    library lookup runs off the GUI thread and streaming is the fallback.
+    """
     def __init__(self, main_window, parent=None):
         super().__init__(parent)
         logging.info("Initializing music player")
@@ -16,10 +38,40 @@ class MusicPlayer(QWidget):
         self.player = QMediaPlayer()
         self._audio_output = QAudioOutput()
         self.player.setAudioOutput(self._audio_output)
+        # Created on the first preload
+        self._standby = None
+        self._standby_output = None
+        # (key, row, track_info) of the track loaded or loading in the standby player
+        self._standby_track = None
+        self._standby_url = None
+        self._standby_streaming = False
+        self._standby_ready = False
+        # Row whose preload failed; it is left to the normal path
+        self._preload_failed_row = None
+
+        self.crossfade_ms = 0
+        self._fade_started = None
+        self._fade_timer = QTimer(self)
+        self._fade_timer.setInterval(CROSSFADE_STEP_MS)
+        self._fade_timer.timeout.connect(self._fade_step)
+        # (perf_counter, mode) from the end of a track until the next one is heard
+        self._transition = None
+
+        self.resolver = StreamResolver(self)
+        self.local_tracks = LocalTrackFinder(self)
+        # Downloads hold off while the player fills its buffer
+        self.bandwidth = get_bandwidth_manager()
 
         self.currently_playing_track = None
         self.current_track_row = -1
         self.current_track_retries = 0
+        # (key, row, track_info) of the track waiting for its stream URL
+        self._pending_track = None
+        self.current_stream_url = None
+        # Position to seek to once a reloaded source is ready
+        self._resume_position = None
+        # (perf_counter, stream source) of the last play request, until it buffers
+        self._play_requested = None
 
         self.volume_before_mute = 100
 
@@ -59,6 +111,11 @@ class MusicPlayer(QWidget):
         self.volume_icon_label.setFont(emoji_font)
         self.volume_icon_label.setFixedSize(32, 32)
         self.volume_icon_label.setStyleSheet("border: none;")
+        self.crossfade_selector = QSpinBox()
+        self.crossfade_selector.setRange(0, MAX_CROSSFADE_SECONDS)
+        self.crossfade_selector.setSuffix(" s")
+        self.crossfade_selector.setSpecialValueText(self.tr("Gapless"))
+        self.crossfade_selector.setToolTip(self.tr("Crossfade between tracks"))
 
         layout.addWidget(self.current_track_label, 2)
         layout.addWidget(self.prev_button)
@@ -70,6 +127,30 @@ class MusicPlayer(QWidget):
         layout.addWidget(self.total_time_label)
         layout.addWidget(self.volume_icon_label)
         layout.addWidget(self.volume_slider)
+        layout.addWidget(self.crossfade_selector)
+
+    def _player_slots(self, player):
+        return [
+            (player.playingChanged, self.update_play_pause_button),
+            (player.errorOccurred, self.handle_player_error),
+            (player.durationChanged, self.update_slider_range),
+            (player.positionChanged, self.update_slider_position),
+            (player.mediaStatusChanged, self.handle_media_status_changed),
+        ]
+
+    def _standby_slots(self, player):
+        return [
+            (player.mediaStatusChanged, self._on_standby_status_changed),
+            (player.errorOccurred, self._on_standby_error),
+        ]
+
+    @staticmethod
+    def _connect_all(slots, connect=True):
+        for signal, slot in slots:
+            if connect:
+                signal.connect(slot)
+            else:
+                signal.disconnect(slot)
 
     def _connect_signals(self):
         self.play_pause_button.clicked.connect(self.toggle_playback)
@@ -79,12 +160,13 @@ class MusicPlayer(QWidget):
         self.volume_slider.valueChanged.connect(self.set_player_volume)
         self.timeline_slider.sliderMoved.connect(self.set_player_position)
         self.volume_icon_label.clicked.connect(self.toggle_mute)
+        self.crossfade_selector.valueChanged.connect(self.set_crossfade)
 
-        self.player.playingChanged.connect(self.update_play_pause_button)
-        self.player.errorOccurred.connect(self.handle_player_error)
-        self.player.durationChanged.connect(self.update_slider_range)
-        self.player.positionChanged.connect(self.update_slider_position)
-        self.player.mediaStatusChanged.connect(self.handle_media_status_changed)
+        self._connect_all(self._player_slots(self.player))
+
+        self.resolver.resolved.connect(self._on_stream_resolved)
+        self.local_tracks.found.connect(self._on_local_track_found)
+        self.resolver.failed.connect(self._on_stream_failed)
 
     def format_time(self, ms):
         seconds = int((ms/1000)%60)
@@ -94,13 +176,19 @@ class MusicPlayer(QWidget):
     def set_player_volume(self, value):
         logging.debug(f"Setting player volume to {value}")
         volume_float = value / 100.0
-        self._audio_output.setVolume(volume_float)
+        # A running crossfade sets both volumes on its next step
+        if not self._fade_timer.isActive():
+            self._audio_output.setVolume(volume_float)
         if value == 0:
             self.volume_icon_label.setText("🔇")
         else:
             self.volume_icon_label.setText("🔊")
             self.volume_before_mute = value
 
+    def set_crossfade(self, seconds):
+        logging.debug(f"Setting crossfade to {seconds} s")
+        self.crossfade_ms = int(seconds * 1000)
+
     def toggle_mute(self):
         logging.debug("Toggling mute")
         if self.volume_slider.value() > 0:
@@ -134,10 +222,13 @@ class MusicPlayer(QWidget):
     def toggle_playback(self):
         if self.player.playbackState() == QMediaPlayer.PlayingState:
             logging.info("Pausing playback")
+            if self._fade_timer.isActive():
+                self._finish_crossfade()
             self.player.pause()
         elif self.player.playbackState() == QMediaPlayer.PausedState:
             logging.info("Resuming playback")
-            self.player.play()
+            if not self._reload_if_expired():
+                self.player.play()
         else: # Stopped or no media
             logging.info("No media, attempting to play from selection")
             selected_items = self.main_window.tracklist_table.selectedItems()
@@ -147,6 +238,8 @@ class MusicPlayer(QWidget):
     def stop_playback(self):
         logging.info("Stopping playback")
         self.player.stop()
+        self._reset_standby()
+        self._transition = None
         self.current_track_label.setText(self.tr("No music selected"))
         self.timeline_slider.setValue(0)
         self.current_time_label.setText("00:00")
@@ -154,6 +247,28 @@ class MusicPlayer(QWidget):
         self.currently_playing_track = None
         self.current_track_row = -1
         self.current_track_retries = 0
+        self._pending_track = None
+        self.current_stream_url = None
+        self._resume_position = None
+        self._play_requested = None
+        self.bandwidth.set_playback_active(False)
+        self.resolver.pin([])
+
+    def shutdown(self):
+        """Stops playback and the background lookups when the window closes."""
+        self.stop_playback()
+        self._fade_timer.stop()
+        self.resolver.shutdown()
+        self.local_tracks.shutdown()
+
+    def _stream_key(self, row):
+        manifest = self.main_window.current_track_manifest
+        if 0 <= row < len(manifest) and manifest[row]['video_id']:
+            return ('video', manifest[row]['video_id'])
+        playlist_id = self.main_window.current_album_playlist_id
+        if not playlist_id:
+            return None
+        return ('playlist', playlist_id, row + 1)
 
     def play_track(self, row, is_retry=False):
         if not is_retry and self.current_track_row == row and self.player.playbackState() != QMediaPlayer.StoppedState:
@@ -162,6 +277,7 @@ class MusicPlayer(QWidget):
 
         if self.current_track_row != row:
             self.current_track_retries = 0
+        self._transition = None
 
         playlist_id = self.main_window.current_album_playlist_id
         if not playlist_id:
@@ -175,42 +291,283 @@ class MusicPlayer(QWidget):
             self.main_window.statusBar().showMessage(self.tr("Could not find track info."), 3000)
             return
 
-        track_index = str(row + 1)
-        logging.info(f"Fetching stream URL for track: {track_info['title']} (index: {track_index})")
-        self.main_window.statusBar().showMessage(self.tr("Fetching stream URL..."))
-        
-        try:
-            ydl_opts = {
-                'quiet': True,
-                'format': 'bestaudio[ext=m4a]/bestaudio/best',
-                'playlist_items': track_index,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(f"https://www.youtube.com/playlist?list={playlist_id}", download=False)
-
-            if 'entries' in info and info['entries']:
-                video_info = info['entries'][0]
-                stream_url = video_info['url']
-                logging.debug(f"Found stream URL: {stream_url}")
+        key = self._stream_key(row)
+        if not is_retry:
+            self._resume_position = None
+
+        self._pending_track = (key, row, track_info)
+        local_path = self._find_local(row, key)
+        if local_path:
+            self._play_local(row, track_info, local_path)
+        elif local_path == '':
+            self._play_stream(key, row, track_info, is_retry)
+        # Otherwise _on_local_track_found picks the source
+
+    @staticmethod
+    def _is_local(url):
+        return bool(url) and url.startswith('file:')
+
+    def _find_local(self, row, key):
+        """Returns the library path of `row`, '' if it is not downloaded, or None while looking it up."""
+        if key[0] == 'video':
+            return self.local_tracks.find(key, video_id=key[1])
+        _, playlist_id, track_number = key
+        return self.local_tracks.find(key, playlist_id=playlist_id, track_number=track_number)
+
+    def _on_local_track_found(self, key, path):
+        if self._standby_track and self._standby_track[0] == key and not self._standby_url:
+            if path:
+                self._load_standby(QUrl.fromLocalFile(path).toString())
             else:
-                raise yt_dlp.utils.DownloadError("Track not found in playlist.")
+                self._resolve_standby(key)
+        if self._pending_track and self._pending_track[0] == key:
+            _, row, track_info = self._pending_track
+            if path:
+                self._play_local(row, track_info, path)
+            else:
+                self._play_stream(key, row, track_info)
+        elif not path and key == self._stream_key(self.current_track_row + 1):
+            self.resolver.resolve(key, prefetch=True)
+            self._pin_streams()
+
+    def _play_local(self, row, track_info, path):
+        logging.info(f"Playing downloaded file for track: {track_info['title']}")
+        self._play_requested = (time.perf_counter(), 'local')
+        self._start_playback(row, track_info, QUrl.fromLocalFile(path).toString())
+
+    def _play_stream(self, key, row, track_info, is_retry=False):
+        self.bandwidth.set_playback_active(True)
+        stream_url = self.resolver.resolve(key)
+        self._play_requested = (time.perf_counter(), 'reload' if is_retry else 'cached' if stream_url else 'resolved')
+        if stream_url:
+            logging.info(f"Using cached stream URL for track: {track_info['title']}")
+            self._start_playback(row, track_info, stream_url)
+        else:
+            logging.info(f"Fetching stream URL for track: {track_info['title']} (index: {row + 1})")
+            self.main_window.statusBar().showMessage(self.tr("Fetching stream URL..."))
 
-        except Exception as e:
-            logging.error(f"Error getting stream URL: {e}")
-            self.main_window.statusBar().showMessage(f"{self.tr('Error getting stream URL')}: {e}", 5000)
-            self.handle_player_error()
+    def _on_stream_resolved(self, key, stream_url):
+        if self._standby_track and self._standby_track[0] == key and self._standby_streaming and not self._standby_url:
+            self._load_standby(stream_url)
+        if not self._pending_track or self._pending_track[0] != key:
             return
+        _, row, track_info = self._pending_track
+        logging.debug(f"Found stream URL for {key}")
+        self._start_playback(row, track_info, stream_url)
 
-        self.currently_playing_track = track_info
+    def _on_stream_failed(self, key, message):
+        if not self._pending_track or self._pending_track[0] != key:
+            return
+        _, row, _ = self._pending_track
+        self._pending_track = None
+        self._play_requested = None
+        self.bandwidth.set_playback_active(False)
+        self.main_window.statusBar().showMessage(f"{self.tr('Error getting stream URL')}: {message}", 5000)
+        if row != self.current_track_row:
+            self.current_stream_url = None
+            self._resume_position = None
         self.current_track_row = row
-        self.current_track_label.setText(f"<b>{track_info['title']}</b><br>{track_info['artists']}")
+        self.handle_player_error()
+
+    def _start_playback(self, row, track_info, stream_url):
+        self._pending_track = None
+        self._reset_standby()
+        self._set_current_track(row, track_info, stream_url)
         self.player.setSource(QUrl(stream_url))
         self.player.play()
         logging.info(f"Playing track: {track_info['title']}")
         self.main_window.statusBar().showMessage(self.tr("Playing..."), 3000)
 
+    def _set_current_track(self, row, track_info, stream_url):
+        self.currently_playing_track = track_info
+        self.current_track_row = row
+        self.current_stream_url = stream_url
+        self._preload_failed_row = None
+        self.current_track_label.setText(f"<b>{track_info['title']}</b><br>{track_info['artists']}")
+        self._prefetch(row + 1)
+        self._pin_streams()
+
+    def _pin_streams(self):
+        """Keeps the stream URLs of the current and next track fresh, unless they play from disk."""
+        row = self.current_track_row
+        keys = []
+        if row != -1 and self.current_stream_url and not self._is_local(self.current_stream_url):
+            keys.append(self._stream_key(row))
+        if 0 <= row + 1 < self.main_window.tracklist_table.rowCount():
+            key = self._stream_key(row + 1)
+            if key and self._find_local(row + 1, key) == '':
+                keys.append(key)
+        self.resolver.pin(keys)
+
+    def _preload(self, row):
+        """Starts loading `row` into the standby player, resolving its URL first if needed."""
+        if self._standby_track or self._fade_timer.isActive() or row == self._preload_failed_row:
+            return
+        if not 0 <= row < self.main_window.tracklist_table.rowCount():
+            return
+        key = self._stream_key(row)
+        track_info = self.get_track_info(row)
+        if not key or not track_info:
+            return
+        if self._standby is None:
+            self._standby = QMediaPlayer()
+            self._standby_output = QAudioOutput()
+            self._standby.setAudioOutput(self._standby_output)
+            self._connect_all(self._standby_slots(self._standby))
+        logging.debug(f"Preloading next track: {track_info['title']}")
+        self._standby_track = (key, row, track_info)
+        local_path = self._find_local(row, key)
+        if local_path:
+            self._load_standby(QUrl.fromLocalFile(local_path).toString())
+        elif local_path == '':
+            self._resolve_standby(key)
+
+    def _resolve_standby(self, key):
+        self._standby_streaming = True
+        stream_url = self.resolver.resolve(key, prefetch=True)
+        if stream_url:
+            self._load_standby(stream_url)
+
+    def _load_standby(self, stream_url):
+        self._standby_url = stream_url
+        self._standby_ready = False
+        self._standby.setSource(QUrl(stream_url))
+
+    def _on_standby_status_changed(self, status):
+        if not self._standby_track:
+            return
+        if status in (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia):
+            self._standby_ready = True
+        elif status == QMediaPlayer.MediaStatus.InvalidMedia:
+            self._on_standby_error()
+
+    def _on_standby_error(self):
+        if not self._standby_track:
+            return
+        logging.warning(f"Could not preload the next track: {self._standby.errorString()}")
+        key, row, _ = self._standby_track
+        self._preload_failed_row = row
+        if self._is_local(self._standby_url):
+            self.local_tracks.mark_missing(key)
+        elif self._standby_url:
+            self.resolver.invalidate(key, self._standby_url)
+        self._reset_standby()
+
+    def _standby_usable(self, row):
+        """True if the standby player holds `row` of the current album and can start at once."""
+        if not self._standby_track or not self._standby_ready:
+            return False
+        key, standby_row, _ = self._standby_track
+        if standby_row != row or self._stream_key(row) != key:
+            return False
+        return not self.resolver.is_expired(self._standby_url)
+
+    def _reset_standby(self):
+        """Unloads the standby player and ends a running crossfade."""
+        if self._fade_timer.isActive():
+            self._finish_crossfade()
+        self._standby_track = None
+        self._standby_url = None
+        self._standby_streaming = False
+        self._standby_ready = False
+        if self._standby is not None:
+            self._standby.stop()
+            self._standby.setSource(QUrl())
+
+    def _swap_players(self):
+        """Makes the standby player the current one and updates the player bar for its track."""
+        _, row, track_info = self._standby_track
+        stream_url = self._standby_url
+        self._standby_track = None
+        self._standby_url = None
+        self._standby_streaming = False
+        self._standby_ready = False
+
+        self._connect_all(self._player_slots(self.player), connect=False)
+        self._connect_all(self._standby_slots(self._standby), connect=False)
+        self.player, self._standby = self._standby, self.player
+        self._audio_output, self._standby_output = self._standby_output, self._audio_output
+        self._connect_all(self._player_slots(self.player))
+        self._connect_all(self._standby_slots(self._standby))
+
+        self.current_track_retries = 0
+        self._resume_position = None
+        self._play_requested = None
+        self._set_current_track(row, track_info, stream_url)
+        self.update_slider_range(self.player.duration())
+        self.update_play_pause_button(True)
+        logging.info(f"Playing track: {track_info['title']}")
+
+    def _play_standby(self):
+        """Switches to the preloaded next track without waiting for it to load."""
+        self._standby_output.setVolume(self.volume_slider.value() / 100.0)
+        self._standby.play()
+        previous = self.player
+        self._swap_players()
+        previous.stop()
+        previous.setSource(QUrl())
+
+    def _start_crossfade(self):
+        self._transition = (time.perf_counter(), 'crossfade')
+        self._standby_output.setVolume(0)
+        self._standby.play()
+        # The previous player fades out as the standby one
+        self._swap_players()
+        self._fade_started = time.perf_counter()
+        self._fade_timer.start()
+
+    def _fade_step(self):
+        progress = min(1.0, (time.perf_counter() - self._fade_started) * 1000 / max(1, self.crossfade_ms))
+        volume = self.volume_slider.value() / 100.0
+        # Equal-power curves keep the loudness steady through the fade
+        self._audio_output.setVolume(volume * math.sin(progress * math.pi / 2))
+        self._standby_output.setVolume(volume * math.cos(progress * math.pi / 2))
+        if progress >= 1.0:
+            self._finish_crossfade()
+
+    def _finish_crossfade(self):
+        self._fade_timer.stop()
+        self._fade_started = None
+        self._standby.stop()
+        self._standby.setSource(QUrl())
+        self._audio_output.setVolume(self.volume_slider.value() / 100.0)
+
+    def _reload_if_expired(self, position=None):
+        """
+        Swaps in a fresh URL for the current track if its URL has expired,
+        keeping the playback position. Returns True if a reload was started.
+        """
+        if self.current_track_row == -1 or not self.current_stream_url:
+            return False
+        if not self.resolver.is_expired(self.current_stream_url):
+            return False
+        self._resume_position = self.player.position() if position is None else position
+        key = self._stream_key(self.current_track_row)
+        self.resolver.invalidate(key, self.current_stream_url)
+        logging.info("Stream URL expired, reloading current track")
+        self.play_track(self.current_track_row, is_retry=True)
+        return True
+
+    def _prefetch(self, row):
+        if 0 <= row < self.main_window.tracklist_table.rowCount():
+            key = self._stream_key(row)
+            # Streams are only prefetched for tracks that are not downloaded
+            if key and self._find_local(row, key) == '':
+                self.resolver.resolve(key, prefetch=True)
+
     def handle_player_error(self):
         logging.error(f"Player error occurred. State: {self.player.error()}, String: {self.player.errorString()}")
+        if self.current_track_row != -1 and self.current_stream_url:
+            key = self._stream_key(self.current_track_row)
+            if self._is_local(self.current_stream_url):
+                # The file is gone or unreadable: stream the track instead
+                self.local_tracks.mark_missing(key)
+            else:
+                # Most failures are an expired or rejected (403) URL: drop just
+                # that entry and resume where playback stopped.
+                self.resolver.invalidate(key, self.current_stream_url)
+            if self._resume_position is None:
+                self._resume_position = self.player.position()
         if self.current_track_row != -1 and self.current_track_retries < 3:
             self.current_track_retries += 1
             logging.info(f"Retrying playback... ({self.current_track_retries}/3)")
@@ -236,21 +593,58 @@ class MusicPlayer(QWidget):
         self.timeline_slider.setValue(position)
         self.timeline_slider.blockSignals(False)
         self.current_time_label.setText(self.format_time(position))
+        if self._transition and position > 0:
+            started, mode = self._transition
+            self._transition = None
+            latency = time.perf_counter() - started
+            get_metrics().observe('track_transition', latency, mode=mode)
+            logging.debug(f"Track transition ({mode}) took {latency * 1000:.0f} ms")
+
+        remaining = self.player.duration() - position
+        if self.current_track_row == -1 or remaining <= 0 or self._fade_timer.isActive():
+            return
+        next_row = self.current_track_row + 1
+        if remaining <= max(PRELOAD_AHEAD_MS, self.crossfade_ms * 2):
+            self._preload(next_row)
+        if self.crossfade_ms and remaining <= self.crossfade_ms and self._standby_usable(next_row):
+            self._start_crossfade()
 
     def set_player_position(self, position):
         logging.debug(f"Setting player position to {position}")
-        self.player.setPosition(position)
+        if not self._reload_if_expired(position):
+            self.player.setPosition(position)
 
     def handle_media_status_changed(self, status):
         logging.debug(f"Media status changed: {status}")
+        MediaStatus = QMediaPlayer.MediaStatus
+        streaming = not self._is_local(self.current_stream_url)
+        if streaming and status in (MediaStatus.LoadingMedia, MediaStatus.BufferingMedia, MediaStatus.StalledMedia):
+            self.bandwidth.set_playback_active(True)
+        elif status in (MediaStatus.BufferedMedia, MediaStatus.EndOfMedia, MediaStatus.InvalidMedia, MediaStatus.NoMedia):
+            self.bandwidth.set_playback_active(False)
+        if status == QMediaPlayer.MediaStatus.BufferedMedia and self._play_requested:
+            started, stream = self._play_requested
+            self._play_requested = None
+            get_metrics().observe('play_start', time.perf_counter() - started, stream=stream)
+        if status in (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia) and self._resume_position:
+            logging.debug(f"Resuming reloaded track at {self._resume_position} ms")
+            self.player.setPosition(self._resume_position)
+            self._resume_position = None
         if status == QMediaPlayer.MediaStatus.EndOfMedia and self.current_track_row != -1:
             logging.info("Track finished, playing next")
+            started = time.perf_counter()
+            next_row = self.current_track_row + 1
+            mode = 'gapless' if self._standby_usable(next_row) else 'cold'
             self.play_next_track()
+            if self.current_track_row == next_row or self._pending_track:
+                self._transition = (started, mode)
 
     def play_next_track(self):
         next_row = self.current_track_row + 1
         logging.info(f"Attempting to play next track, row: {next_row}")
-        if 0 <= next_row < self.main_window.tracklist_table.rowCount():
+        if self._standby_usable(next_row):
+            self._play_standby()
+        elif 0 <= next_row < self.main_window.tracklist_table.rowCount():
             self.play_track(next_row)
         else:
             logging.info("End of playlist reached")
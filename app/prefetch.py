@@ -0,0 +1,147 @@
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+
+# Priorities, lowest first
+FOCUS_PRIORITY = 0
+VISIBLE_PRIORITY = 1
+
+def load_album(client, browse_id, on_refresh=None):
+    """Returns (album_details, cover bytes or None) through the metadata and image caches."""
+    import requests
+    from .cache import get_image_cache
+    album_details = client.get_album_details(browse_id, on_refresh=on_refresh)
+    image_content = None
+    if album_details and album_details.get('thumbnails'):
+        try:
+            image_content = get_image_cache().get(album_details['thumbnails'][-1]['url'])
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.warning(f"Failed to load album art for {browse_id}: {e}")
+    return album_details, image_content
+
+class AlbumPrefetcher:
+    """
+    Loads album details and covers ahead of selection, on `workers`
+    background threads.
+
+    `prefetch_visible` replaces the set of albums wanted because they are on
+    screen, in order; albums that scrolled away or belong to an earlier
+    search are dropped from the queue. `focus` puts a hovered or focused
+    album ahead of them. Loaded albums are kept in a small LRU, so `get`
+    can answer a selection without a request. Requests already running are
+    not interrupted; their results still land in the caches.
+    """
+    def __init__(self, client, workers=2, max_ready=32, loader=load_album):
+        self.client = client
+        self.workers = workers
+        self.max_ready = max_ready
+        self._loader = loader
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        # Bumped to drop queued entries of each priority
+        self._generations = {FOCUS_PRIORITY: 0, VISIBLE_PRIORITY: 0}
+        self._ready = OrderedDict()
+        # Bumped by clear() so loads already running are not kept
+        self._epoch = 0
+        self._in_flight = set()
+        self._threads = []
+        self._closed = False
+
+    def _start(self):
+        # Caller holds self._cond
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'prefetch-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _push(self, priority, position, browse_id):
+        # Caller holds self._cond
+        if not browse_id or browse_id in self._ready or browse_id in self._in_flight:
+            return False
+        self._seq += 1
+        heapq.heappush(self._heap, (priority, position, self._seq, self._generations[priority], browse_id))
+        return True
+
+    def prefetch_visible(self, browse_ids):
+        with self._cond:
+            if self._closed:
+                return
+            self._generations[VISIBLE_PRIORITY] += 1
+            queued = sum(self._push(VISIBLE_PRIORITY, i, b) for i, b in enumerate(browse_ids))
+            if queued:
+                self._start()
+                self._cond.notify_all()
+
+    def focus(self, browse_id):
+        with self._cond:
+            if self._closed:
+                return
+            self._generations[FOCUS_PRIORITY] += 1
+            if self._push(FOCUS_PRIORITY, 0, browse_id):
+                self._start()
+                self._cond.notify()
+
+    def cancel(self):
+        """Drops everything queued, e.g. when a new search starts."""
+        with self._cond:
+            for priority in self._generations:
+                self._generations[priority] += 1
+            self._heap.clear()
+
+    def clear(self):
+        """Drops the queue and every loaded album, e.g. after a language change."""
+        with self._cond:
+            self.cancel()
+            self._ready.clear()
+            self._epoch += 1
+
+    def get(self, browse_id):
+        """Returns (album_details, image_content) if the album is loaded, else None."""
+        with self._cond:
+            entry = self._ready.get(browse_id)
+            if entry is not None:
+                self._ready.move_to_end(browse_id)
+            return entry
+
+    def _next(self):
+        with self._cond:
+            while not self._closed:
+                while self._heap:
+                    priority, _, _, generation, browse_id = heapq.heappop(self._heap)
+                    if generation != self._generations[priority]:
+                        continue
+                    if browse_id in self._ready or browse_id in self._in_flight:
+                        continue
+                    self._in_flight.add(browse_id)
+                    return browse_id, self._epoch
+                self._cond.wait()
+            return None, None
+
+    def _run(self):
+        while True:
+            browse_id, epoch = self._next()
+            if browse_id is None:
+                return
+            try:
+                album_details, image_content = self._loader(self.client, browse_id)
+            except Exception as e:
+                logging.debug(f"Prefetch of {browse_id} failed: {e}")
+                album_details = None
+            with self._cond:
+                self._in_flight.discard(browse_id)
+                if album_details and epoch == self._epoch:
+                    self._ready[browse_id] = (album_details, image_content)
+                    while len(self._ready) > self.max_ready:
+                        self._ready.popitem(last=False)
+            if album_details:
+                logging.debug(f"Prefetched album {browse_id}")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._heap.clear()
+            self._cond.notify_all()
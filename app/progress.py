@@ -0,0 +1,124 @@
+import time
+import threading
+
+# Maximum rate at which coalesced progress reaches the GUI or stdout
+DEFAULT_PROGRESS_INTERVAL = 0.1
+
+# Fields copied from AlbumDownloader progress dicts into the per-track entry
+_TRACK_FIELDS = ('position', 'total', 'artist', 'track', 'fraction', 'downloaded_bytes', 'total_bytes', 'speed', 'eta')
+
+class ProgressAggregator:
+    """
+    Collects AlbumDownloader progress dicts from any number of threads and
+    albums, and hands out a coalesced snapshot at most every `interval`
+    seconds.
+
+    `update` and `set_track_state` only record the latest values, so
+    per-chunk progress hooks stay cheap. The consumer calls `take`, from a
+    timer or after each update, and gets None until something changed and
+    the interval has passed. A snapshot is a dict with:
+
+    percent          : Mean progress of the active albums
+    albums           : {album_id: percent}
+    tracks           : Active tracks, each a dict with 'album_id', 'index',
+                       'state', 'artist', 'track', 'fraction',
+                       'downloaded_bytes', 'total_bytes', 'speed' (bytes/s)
+                       and 'eta' (seconds)
+    downloaded_bytes : Bytes downloaded by the active tracks
+    speed            : Combined download speed in bytes/s
+    latest           : The most recent progress dict, for a status line
+
+    Tracks are dropped once they are done or failed and albums once
+    `remove_album` is called.
+    """
+    def __init__(self, interval=DEFAULT_PROGRESS_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._albums = {}
+        self._tracks = {}
+        self._latest = None
+        self._dirty = False
+        self._last_take = None
+
+    @property
+    def active(self):
+        with self._lock:
+            return bool(self._albums)
+
+    def update(self, album_id, d):
+        """
+        Records one progress dict. Returns True for the first change since
+        the last snapshot, so the caller knows to schedule a `take`.
+        """
+        with self._lock:
+            self._albums[album_id] = d['percent']
+            index = d.get('index')
+            if index is not None:
+                track = self._tracks.setdefault((album_id, index), {
+                    'album_id': album_id, 'index': index, 'state': 'downloading'
+                })
+                for field in _TRACK_FIELDS:
+                    if d.get(field) is not None:
+                        track[field] = d[field]
+                if d['status'] == 'processing':
+                    track['state'] = 'transcoding'
+                    track['fraction'] = 1.0
+                    track['speed'] = track['eta'] = 0
+                elif d.get('eta') is None and track.get('speed') and track.get('total_bytes'):
+                    remaining = track['total_bytes'] - track.get('downloaded_bytes', 0)
+                    track['eta'] = max(0, int(remaining / track['speed']))
+            self._latest = d
+            wake = not self._dirty
+            self._dirty = True
+        return wake
+
+    def set_track_state(self, album_id, index, state):
+        with self._lock:
+            if state in ('done', 'failed'):
+                self._tracks.pop((album_id, index), None)
+            elif (album_id, index) in self._tracks:
+                self._tracks[(album_id, index)]['state'] = state
+            else:
+                return False
+            wake = not self._dirty
+            self._dirty = True
+        return wake
+
+    def remove_album(self, album_id):
+        with self._lock:
+            self._albums.pop(album_id, None)
+            for key in [k for k in self._tracks if k[0] == album_id]:
+                del self._tracks[key]
+            if not self._albums:
+                self._latest = None
+            self._dirty = True
+
+    def take(self, force=False):
+        """Returns a snapshot if anything changed and `interval` has passed (or `force`), else None."""
+        now = self._clock()
+        with self._lock:
+            if not self._dirty:
+                return None
+            if not force and self._last_take is not None and now - self._last_take < self.interval:
+                return None
+            self._dirty = False
+            self._last_take = now
+            tracks = [dict(t) for t in self._tracks.values()]
+            albums = dict(self._albums)
+            latest = self._latest
+        return {
+            'percent': sum(albums.values()) // len(albums) if albums else 0,
+            'albums': albums,
+            'tracks': tracks,
+            'downloaded_bytes': sum(t.get('downloaded_bytes', 0) for t in tracks),
+            'speed': sum(t.get('speed') or 0 for t in tracks),
+            'latest': latest,
+        }
+
+def format_bytes(size):
+    """Human readable size, e.g. '4.2 MB'."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
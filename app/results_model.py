@@ -0,0 +1,105 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+
+# Rows kept per search; paging stops once this many are loaded
+MAX_RESULTS = 500
+
+class AlbumResultsModel(QAbstractTableModel):
+    """
+    Album search results, loaded a page at a time.
+
+    Rows are the dicts built by normalize_album_result on the search worker
+    thread, so the view only reads prepared strings. When the view scrolls
+    to the end, Qt calls fetchMore, which emits `fetch_more_requested(query,
+    continuation)`; the page comes back through `append_page`. Pages for
+    an older query are ignored, and at most `max_rows` rows are kept.
+    """
+    fetch_more_requested = Signal(str, str)
+
+    COLUMNS = ('title', 'artists', 'year', 'type')
+
+    def __init__(self, parent=None, max_rows=MAX_RESULTS):
+        super().__init__(parent)
+        self.max_rows = max_rows
+        self.headers = [self.tr("Title"), self.tr("Artist"), self.tr("Year"), self.tr("Type")]
+        self.query = None
+        self.pages = 0
+        self._rows = []
+        self._browse_ids = set()
+        self._continuation = None
+        self._fetching = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row[self.COLUMNS[index.column()]]
+        if role == Qt.ToolTipRole and index.column() == 0:
+            return row['title']
+        if role == Qt.UserRole:
+            return row['browse_id']
+        return None
+
+    def row(self, row):
+        return self._rows[row]
+
+    def _unique(self, rows):
+        unique = []
+        for row in rows:
+            # Later pages sometimes repeat an album from an earlier one
+            if row['browse_id'] and row['browse_id'] in self._browse_ids:
+                continue
+            self._browse_ids.add(row['browse_id'])
+            unique.append(row)
+        return unique[:max(0, self.max_rows - len(self._rows))]
+
+    def set_results(self, query, rows, continuation=None):
+        """Replaces the results with the first page of `query`."""
+        self.beginResetModel()
+        self.query = query
+        self.pages = 1 if query else 0
+        self._rows = []
+        self._browse_ids = set()
+        self._rows = self._unique(rows)
+        self._continuation = continuation
+        self._fetching = False
+        self.endResetModel()
+
+    def append_page(self, query, rows, continuation=None):
+        if query != self.query:
+            return
+        self._fetching = False
+        self._continuation = continuation
+        self.pages += 1
+        rows = self._unique(rows)
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def clear(self):
+        self.set_results(None, [])
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return bool(self._continuation) and not self._fetching and len(self._rows) < self.max_rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self.fetch_more_requested.emit(self.query, self._continuation)
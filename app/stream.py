@@ -0,0 +1,262 @@
+import time
+import logging
+import threading
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from .manifest import video_url, playlist_url
+from .metrics import span
+from .library import get_library
+
+# Used when a stream URL carries no `expire` parameter
+DEFAULT_STREAM_TTL = 60 * 60
+
+def url_expiry(url, default_ttl=DEFAULT_STREAM_TTL, now=None):
+    """Returns the epoch time at which a googlevideo stream URL expires."""
+    now = time.time() if now is None else now
+    try:
+        expire = parse_qs(urlparse(url).query).get('expire')
+        if expire:
+            return float(expire[0])
+    except ValueError:
+        pass
+    return now + default_ttl
+
+def extract_stream_url(key):
+    """
+    Resolves the direct audio stream URL for a stream key: either
+    ('video', video_id), or ('playlist', playlist_id, track_index) as a
+    fallback for tracks without a videoId.
+    """
+    # Imported on first use so the player can be created before yt-dlp loads
+    import yt_dlp
+    ydl_opts = {
+        'quiet': True,
+        'format': 'bestaudio[ext=m4a]/bestaudio/best',
+    }
+    if key[0] == 'video':
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(video_url(key[1]), download=False)['url']
+
+    _, playlist_id, track_index = key
+    ydl_opts['playlist_items'] = str(track_index)
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(playlist_url(playlist_id), download=False)
+
+    if 'entries' in info and info['entries']:
+        return info['entries'][0]['url']
+    raise yt_dlp.utils.DownloadError("Track not found in playlist.")
+
+class StreamUrlCache:
+    """
+    Thread-safe map of key -> stream URL that knows when each URL expires.
+
+    `get` only returns URLs that stay valid for at least `min_validity`
+    seconds, so a returned URL will not expire while the player buffers it.
+    """
+    def __init__(self, min_validity=30, clock=time.time):
+        self.min_validity = min_validity
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] - self._clock() > self.min_validity:
+            return entry[0]
+        return None
+
+    def set(self, key, url):
+        expires_at = url_expiry(url, now=self._clock())
+        with self._lock:
+            self._entries[key] = (url, expires_at)
+
+    def invalidate(self, key, url=None):
+        """
+        Drops the entry for `key`. If `url` is given, the entry is only
+        dropped while it still holds that URL, so a failure reported for an
+        old URL does not discard a fresh one that replaced it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (url is None or entry[0] == url):
+                del self._entries[key]
+
+    def is_expired(self, url):
+        return url_expiry(url, now=self._clock()) - self._clock() <= self.min_validity
+
+    def expires_within(self, key, seconds):
+        """True if `key` has a URL that expires within `seconds`; False if it has none."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry[1] - self._clock() <= seconds
+
+class StreamResolver(QObject):
+    """
+    Resolves stream URLs on background threads and caches the results.
+
+    Keys are the tuples accepted by extract_stream_url. `resolved` and `failed` are
+    emitted for every finished lookup, including prefetches, so listeners
+    should compare the key with the one they are waiting for.
+    """
+    resolved = Signal(object, str)
+    failed = Signal(object, str)
+
+    def __init__(self, parent=None, max_workers=2, refresh_margin=5 * 60, refresh_interval_ms=30 * 1000):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stream-resolver')
+        self._cache = StreamUrlCache()
+        self._in_flight = set()
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self.refresh_margin = refresh_margin
+
+        # Pinned URLs are re-resolved shortly before they expire so a seek or
+        # a resume after a long pause finds a valid URL in the cache.
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(refresh_interval_ms)
+        self._refresh_timer.timeout.connect(self._refresh_expiring)
+        self._refresh_timer.start()
+
+    def cached(self, key):
+        return self._cache.get(key)
+
+    def invalidate(self, key, url=None):
+        self._cache.invalidate(key, url)
+
+    def is_expired(self, url):
+        return self._cache.is_expired(url)
+
+    def pin(self, keys):
+        """
+        Sets the keys whose URLs are kept fresh in the background. Only URLs
+        already in the cache are refreshed; a pinned key is never resolved
+        for the first time here.
+        """
+        with self._lock:
+            self._pinned = {k for k in keys if k}
+
+    def _refresh_expiring(self):
+        with self._lock:
+            pinned = list(self._pinned)
+        for key in pinned:
+            if self._cache.expires_within(key, self.refresh_margin):
+                logging.debug(f"Stream URL for {key} is about to expire, refreshing")
+                self._submit(key, reason='Refreshing')
+
+    def resolve(self, key, prefetch=False):
+        """
+        Starts resolving `key` in the background unless it is cached or
+        already in flight. Returns the cached URL on a hit, otherwise None.
+        """
+        url = self._cache.get(key)
+        if url:
+            return url
+        self._submit(key, reason='Prefetching' if prefetch else 'Resolving')
+        return None
+
+    def _submit(self, key, reason):
+        with self._lock:
+            if key in self._in_flight:
+                return
+            self._in_flight.add(key)
+        logging.debug(f"{reason} stream URL for {key}")
+        self._executor.submit(self._resolve, key)
+
+    def _resolve(self, key):
+        try:
+            with span('stream_resolve', key=key[0]):
+                url = extract_stream_url(key)
+        except Exception as e:
+            logging.error(f"Error getting stream URL for {key}: {e}")
+            with self._lock:
+                self._in_flight.discard(key)
+            self.failed.emit(key, str(e))
+            return
+        self._cache.set(key, url)
+        with self._lock:
+            self._in_flight.discard(key)
+        self.resolved.emit(key, url)
+
+    def shutdown(self):
+        self._refresh_timer.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class LocalTrackFinder(QObject):
+    """
+    Looks up downloaded copies of tracks in the library index on a
+    background thread, so the player can play the file instead of
+    streaming it. Results are cached by stream key; `found` is emitted
+    with the key and the path, or '' if the track is not downloaded.
+
+    `find_downloaded` checks a whole album on the same thread and emits
+    `downloaded` with the caller's token and {video_id: path}.
+    """
+    found = Signal(object, str)
+    downloaded = Signal(object, dict)
+
+    def __init__(self, parent=None, library=None):
+        super().__init__(parent)
+        self._library = library
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='library-lookup')
+        self._paths = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def find(self, key, video_id=None, playlist_id=None, track_number=None):
+        """
+        Returns the cached path for `key`, '' if the track is known not to
+        be downloaded, or None while it is being looked up.
+        """
+        with self._lock:
+            if key in self._paths:
+                return self._paths[key]
+            if key in self._in_flight:
+                return None
+            self._in_flight.add(key)
+        self._executor.submit(self._find, key, video_id, playlist_id, track_number)
+        return None
+
+    def _find(self, key, video_id, playlist_id, track_number):
+        try:
+            library = self._library or get_library()
+            if video_id:
+                path = library.find_track(video_id=video_id)
+            else:
+                # Tracks without a videoId only match files downloaded from the same album
+                path = library.find_track(playlist_id=playlist_id, track_number=track_number)
+        except Exception as e:
+            logging.warning(f"Library lookup for {key} failed: {e}")
+            path = None
+        with self._lock:
+            self._in_flight.discard(key)
+            self._paths[key] = path or ''
+        self.found.emit(key, path or '')
+
+    def find_downloaded(self, token, video_ids, audio_format):
+        """Looks up which of `video_ids` are in the library as `audio_format`."""
+        self._executor.submit(self._find_downloaded, token, list(video_ids), audio_format)
+
+    def _find_downloaded(self, token, video_ids, audio_format):
+        try:
+            existing = (self._library or get_library()).find(video_ids, audio_format)
+        except Exception as e:
+            logging.warning(f"Library lookup for {len(video_ids)} track(s) failed: {e}")
+            existing = {}
+        self.downloaded.emit(token, existing)
+
+    def mark_missing(self, key):
+        """Streams `key` from now on, e.g. after its file failed to play."""
+        with self._lock:
+            self._paths[key] = ''
+
+    def clear(self):
+        """Forgets cached results, so newly downloaded tracks are found."""
+        with self._lock:
+            self._paths.clear()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
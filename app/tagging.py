@@ -1,22 +1,84 @@
 from pathlib import Path
 import base64, mutagen
-from mutagen.id3 import ID3, APIC, TALB, TPE1, TPE2, TIT2, TRCK, TDRC
+from mutagen.id3 import ID3, APIC, TALB, TPE1, TPE2, TIT2, TRCK, TDRC, TXXX
 from mutagen.flac import Picture
 from mutagen.mp4 import MP4Cover
 
+# Custom tag holding the YouTube videoId, used to rebuild the library index
+VIDEO_ID_TAG = "YTMUSIC_VIDEO_ID"
+_MP4_VIDEO_ID = "----:com.apple.iTunes:" + VIDEO_ID_TAG
+
+class CoverArt:
+    """
+    Cover image prepared once and shared by every file of an album.
+
+    The image is read once, and the FLAC picture block, base64 Ogg picture
+    and MP4 cover are built on first use and reused, so tagging N tracks
+    reads and encodes the image once instead of N times.
+    """
+    def __init__(self, data, mime="image/jpeg"):
+        self.data = data
+        self.mime = mime
+        self._flac_picture = None
+        self._ogg_picture = None
+        self._mp4_cover = None
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(Path(path).read_bytes(), _mime(path))
+
+    def apic(self):
+        # A new frame per file: update_to_v23() rewrites frames in place
+        return APIC(
+            encoding=3,                                   # UTF-8
+            mime=self.mime,                               # image/jpeg or image/png
+            type=3,                                       # 3 = front cover
+            desc="Cover",
+            data=self.data
+        )
+
+    @property
+    def flac_picture(self):
+        if self._flac_picture is None:
+            pic = Picture()
+            pic.type = 3                                  # Front cover
+            pic.mime = self.mime
+            pic.desc = "Cover"
+            pic.data = self.data
+            self._flac_picture = pic
+        return self._flac_picture
+
+    @property
+    def ogg_picture(self):
+        if self._ogg_picture is None:
+            self._ogg_picture = base64.b64encode(
+                self.flac_picture.write()
+            ).decode("ascii")
+        return self._ogg_picture
+
+    @property
+    def mp4_cover(self):
+        if self._mp4_cover is None:
+            imageformat = MP4Cover.FORMAT_PNG if self.mime == "image/png" else MP4Cover.FORMAT_JPEG
+            self._mp4_cover = MP4Cover(self.data, imageformat=imageformat)
+        return self._mp4_cover
+
 def tag_audio(
     file_path,
     tags=None,
     cover_path=None,   # JPEG or PNG
-    make_v23=False     # For MP3: write ID3 v2.3 + v1
+    make_v23=False,    # For MP3: write ID3 v2.3 + v1
+    cover=None         # Prepared CoverArt, takes precedence over cover_path
 ):
     """
     Generic tag-writer that works on MP3, FLAC, Ogg Vorbis/Opus, and MP4/M4A.
+    Each file is parsed once and written once.
 
     file_path  : Path to the audio file
     tags       : Dictionary of tags to apply (optional)
     cover_path : Path to cover image (str or Path, optional)
     make_v23   : Write MP3 tags as ID3 v2.3 + v1 if True
+    cover      : CoverArt to embed (optional)
     """
     audio = mutagen.File(file_path, easy=False)
     if audio is None:
@@ -24,6 +86,8 @@ def tag_audio(
 
     if tags is None:
         tags = {}
+    if cover is None and cover_path:
+        cover = CoverArt.from_path(cover_path)
 
     # ── MP3 ──────────────────────────────────────────────────────────────
     if audio.mime[0] in ("audio/mpeg", "audio/mp3"):                     # Safer than isinstance
@@ -31,7 +95,7 @@ def tag_audio(
             audio.add_tags()                              # Create ID3 if missing
 
         # Clear existing text tags before adding new ones
-        for key in ['TIT2', 'TPE1', 'TALB', 'TPE2', 'TRCK', 'TDRC']:
+        for key in ['TIT2', 'TPE1', 'TALB', 'TPE2', 'TRCK', 'TDRC', 'TXXX:' + VIDEO_ID_TAG]:
             audio.tags.delall(key)
 
         if tags.get('title'): audio.tags.add(TIT2(encoding=3, text=tags['title']))
@@ -42,18 +106,11 @@ def tag_audio(
             track_text = str(tags['track_number'])
             audio.tags.add(TRCK(encoding=3, text=track_text))
         if tags.get('year'): audio.tags.add(TDRC(encoding=3, text=str(tags['year'])))
+        if tags.get('video_id'): audio.tags.add(TXXX(encoding=3, desc=VIDEO_ID_TAG, text=tags['video_id']))
 
-        if cover_path:
+        if cover:
             audio.tags.delall("APIC")                     # Remove old artwork
-            audio.tags.add(
-                APIC(
-                    encoding=3,                           # UTF-8
-                    mime=_mime(cover_path),               # image/jpeg or image/png
-                    type=3,                               # 3 = front cover
-                    desc="Cover",
-                    data=Path(cover_path).read_bytes()
-                )
-            )
+            audio.tags.add(cover.apic())
 
         if make_v23:
             audio.update_to_v23()                         # Downgrade frames
@@ -64,40 +121,27 @@ def tag_audio(
     # ── FLAC ─────────────────────────────────────────────────────────────
     elif audio.mime[0] == "audio/flac":
         # For FLAC, it's easier to clear and rewrite Vorbis comments
-        audio.delete()
-        if tags.get('title'): audio['title'] = tags['title']
-        if tags.get('artist'): audio['artist'] = tags['artist']
-        if tags.get('album'): audio['album'] = tags['album']
-        if tags.get('album_artist'): audio['albumartist'] = tags['album_artist']
-        if tags.get('track_number'): audio['tracknumber'] = str(tags['track_number'])
-        if tags.get('year'): audio['date'] = str(tags['year'])
-
-        if cover_path:
+        _clear_tags(audio)
+        _set_vorbis_comments(audio, tags)
+
+        if cover:
             audio.clear_pictures()                        # Remove existing art
-            audio.add_picture(_flac_picture(cover_path))
+            audio.add_picture(cover.flac_picture)
         audio.save()
 
     # ── Ogg Vorbis / Opus ────────────────────────────────────────────────
     elif audio.mime[0] in ("audio/vorbis", "audio/opus", "audio/ogg"):
         # Also uses Vorbis comments
-        audio.delete()
-        if tags.get('title'): audio['title'] = tags['title']
-        if tags.get('artist'): audio['artist'] = tags['artist']
-        if tags.get('album'): audio['album'] = tags['album']
-        if tags.get('album_artist'): audio['albumartist'] = tags['album_artist']
-        if tags.get('track_number'): audio['tracknumber'] = str(tags['track_number'])
-        if tags.get('year'): audio['date'] = str(tags['year'])
-
-        if cover_path:
-            encoded = base64.b64encode(
-                _flac_picture(cover_path).write()
-            ).decode("ascii")
-            audio["metadata_block_picture"] = [encoded]   # Standard field
+        _clear_tags(audio)
+        _set_vorbis_comments(audio, tags)
+
+        if cover:
+            audio["metadata_block_picture"] = [cover.ogg_picture]   # Standard field
         audio.save()
 
     # ── MP4 / M4A ────────────────────────────────────────────────────────
     elif audio.mime[0] == "audio/mp4":
-        audio.delete() # Clear existing tags
+        _clear_tags(audio) # Clear existing tags
         if tags.get('title'): audio["\xa9nam"] = [tags['title']]
         if tags.get('artist'): audio["\xa9ART"] = [tags['artist']]
         if tags.get('album'): audio["\xa9alb"] = [tags['album']]
@@ -105,12 +149,10 @@ def tag_audio(
         if tags.get('track_number'):
             audio["trkn"] = [(int(tags['track_number']), 0)]
         if tags.get('year'): audio["\xa9day"] = [str(tags['year'])]
+        if tags.get('video_id'): audio[_MP4_VIDEO_ID] = [tags['video_id'].encode('utf-8')]
 
-        if cover_path:
-            img = Path(cover_path).read_bytes()
-            audio["covr"] = [
-                MP4Cover(img, imageformat=_mp4_format(cover_path))
-            ]
+        if cover:
+            audio["covr"] = [cover.mp4_cover]
         audio.save()
 
     else:
@@ -118,24 +160,66 @@ def tag_audio(
             f"MIME type {audio.mime[0]} is not handled."
         )
 
+def read_tags(audio):
+    """
+    Reads the tags written by tag_audio back from a file opened with
+    mutagen.File(easy=False). Missing tags are left out.
+    """
+    tags = {}
+    if audio is None or audio.tags is None:
+        return tags
+
+    def first(key):
+        try:
+            value = audio.tags[key]
+        except (KeyError, ValueError):
+            return None
+        if hasattr(value, 'text'):              # ID3 frame
+            value = value.text
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, tuple):            # MP4 track number
+            value = value[0]
+        if isinstance(value, bytes):            # MP4 freeform
+            value = value.decode('utf-8', 'replace')
+        return str(value) if value is not None else None
+
+    mime = audio.mime[0]
+    if mime in ("audio/mpeg", "audio/mp3"):
+        keys = {'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'album_artist': 'TPE2',
+                'track_number': 'TRCK', 'year': 'TDRC', 'video_id': 'TXXX:' + VIDEO_ID_TAG}
+    elif mime == "audio/mp4":
+        keys = {'title': '\xa9nam', 'artist': '\xa9ART', 'album': '\xa9alb', 'album_artist': 'aART',
+                'track_number': 'trkn', 'year': '\xa9day', 'video_id': _MP4_VIDEO_ID}
+    else:
+        keys = {'title': 'title', 'artist': 'artist', 'album': 'album', 'album_artist': 'albumartist',
+                'track_number': 'tracknumber', 'year': 'date', 'video_id': VIDEO_ID_TAG.lower()}
+    for name, key in keys.items():
+        value = first(key)
+        if value:
+            tags[name] = value
+    if 'track_number' in tags:
+        # ID3 and Vorbis allow "3/12"
+        tags['track_number'] = tags['track_number'].split('/')[0]
+    return tags
+
 # ── Helper functions ────────────────────────────────────────────────────
+def _clear_tags(audio):
+    """Clear tags in memory only; they are written by the single save()."""
+    if audio.tags is None:
+        audio.add_tags()
+    else:
+        audio.tags.clear()
+
+def _set_vorbis_comments(audio, tags):
+    if tags.get('title'): audio['title'] = tags['title']
+    if tags.get('artist'): audio['artist'] = tags['artist']
+    if tags.get('album'): audio['album'] = tags['album']
+    if tags.get('album_artist'): audio['albumartist'] = tags['album_artist']
+    if tags.get('track_number'): audio['tracknumber'] = str(tags['track_number'])
+    if tags.get('year'): audio['date'] = str(tags['year'])
+    if tags.get('video_id'): audio[VIDEO_ID_TAG.lower()] = tags['video_id']
+
 def _mime(path):
     """Return proper MIME for a given image path."""
     return "image/png" if str(path).lower().endswith(".png") else "image/jpeg"
-
-def _flac_picture(path):
-    """Build a mutagen.flac.Picture object from an image file."""
-    pic = Picture()
-    pic.type = 3                                  # Front cover
-    pic.mime = _mime(path)
-    pic.desc = "Cover"
-    pic.data = Path(path).read_bytes()
-    return pic
-
-def _mp4_format(path):
-    """Return MP4Cover format constant matching file extension."""
-    return (
-        MP4Cover.FORMAT_PNG
-        if str(path).lower().endswith(".png")
-        else MP4Cover.FORMAT_JPEG
-    )
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import logging
+import platform
+import threading
+
+from .pipeline import ConcurrencyLimit, default_transcode_workers, usable_cpus
+from .metrics import get_metrics
+
+TRANSCODE_PRIORITIES = ('normal', 'low', 'idle')
+DEFAULT_TRANSCODE_PRIORITY = 'low'
+
+# (nice increment, Linux I/O scheduling class, I/O priority level)
+_PRIORITY_SETTINGS = {
+    'normal': None,
+    'low': (10, 2, 7),   # Lowest best-effort I/O priority
+    'idle': (19, 3, 0),  # Idle I/O class: disk time only when nobody else wants it
+}
+
+# ioprio_set syscall numbers; Python has no wrapper for it
+_IOPRIO_SET = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'riscv64': 30, 'armv7l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+def _set_thread_io_priority(io_class, level):
+    import ctypes
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is None:
+        return False
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.syscall(number, _IOPRIO_WHO_PROCESS, threading.get_native_id(),
+                        (io_class << _IOPRIO_CLASS_SHIFT) | level) == 0
+
+def lower_thread_priority(priority):
+    """
+    Lowers the CPU and I/O priority of the calling thread. On Linux both
+    are per thread and inherited by child processes, so ffmpeg started
+    from this thread runs at the lower priority while the rest of the app
+    does not. Returns False where that is not possible.
+    """
+    settings = _PRIORITY_SETTINGS[priority]
+    if settings is None:
+        return True
+    if not sys.platform.startswith('linux'):
+        return False
+    nice, io_class, level = settings
+    tid = threading.get_native_id()
+    try:
+        current = os.getpriority(os.PRIO_PROCESS, tid)
+        os.setpriority(os.PRIO_PROCESS, tid, max(current, nice))
+        if not _set_thread_io_priority(io_class, level):
+            logging.debug("Could not lower the I/O priority of the transcode thread")
+    except (OSError, AttributeError) as e:
+        logging.debug(f"Could not lower the priority of the transcode thread: {e}")
+        return False
+    return True
+
+class TranscodeScheduler:
+    """
+    Shares ffmpeg capacity between every album being downloaded, in the
+    GUI's DownloadQueue and in the headless BatchRunner alike. Used as the
+    `transcode_slots` of AlbumDownloader.
+
+    At most `workers` ffmpeg processes run at once, one per physical core by
+    default. Each one may use `threads` threads if given; otherwise a job
+    gets the CPUs not held by running jobs, split with the jobs waiting to
+    fill the other free slots, so a lone transcode uses the whole machine
+    and a full pool does not oversubscribe it. Call `ffmpeg_args` inside
+    the slot for the calling job's thread cap. With a 'low' or 'idle' `priority`, threads entering the
+    scheduler are reniced (and ioniced) before they start ffmpeg; this
+    takes effect on Linux, elsewhere only the process and thread limits
+    apply.
+
+    Queue depth, running processes and the time spent waiting for a slot
+    are published to the process-wide Metrics.
+    """
+    def __init__(self, workers=None, threads=None, priority=DEFAULT_TRANSCODE_PRIORITY, metrics=None):
+        if priority not in _PRIORITY_SETTINGS:
+            raise ValueError(f"Unknown transcode priority: {priority}")
+        self._slots = ConcurrencyLimit(workers or default_transcode_workers())
+        self._threads = threads
+        self.priority = priority
+        self.metrics = metrics or get_metrics()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # ffmpeg threads handed to the jobs currently holding a slot
+        self._allocated = 0
+        self._peak_waiting = 0
+        self._completed = 0
+        self._publish()
+
+    @property
+    def limit(self):
+        return self._slots.limit
+
+    @property
+    def in_use(self):
+        return self._slots.in_use
+
+    @property
+    def threads(self):
+        """ffmpeg threads per process when every slot is busy."""
+        if self._threads:
+            return max(1, int(self._threads))
+        return max(1, usable_cpus() // self.limit)
+
+    def _claim_threads(self):
+        # Caller holds a slot
+        if self._threads:
+            return max(1, int(self._threads))
+        with self._lock:
+            free = usable_cpus() - self._allocated
+            others = min(self._slots.waiting, self._slots.limit - self._slots.in_use)
+            threads = max(1, free // (1 + others))
+            self._allocated += threads
+        return threads
+
+    def set_limit(self, workers):
+        self._slots.set_limit(workers)
+        self._publish()
+
+    def ffmpeg_args(self):
+        """
+        Output options that cap the threads of an ffmpeg process: the share
+        of the calling thread's slot, or the full-pool share outside one.
+        """
+        threads = getattr(self._local, 'threads', None) or self.threads
+        return ['-threads', str(threads)]
+
+    def _publish(self):
+        waiting = self._slots.waiting
+        with self._lock:
+            self._peak_waiting = max(self._peak_waiting, waiting)
+        self.metrics.set_gauge('transcode_queue_depth', waiting)
+        self.metrics.set_gauge('transcode_running', self._slots.in_use)
+        self.metrics.set_gauge('transcode_workers', self._slots.limit)
+
+    def __enter__(self):
+        if not getattr(self._local, 'prioritized', False):
+            self._local.prioritized = True
+            lower_thread_priority(self.priority)
+        started = time.perf_counter()
+        if self._slots.in_use >= self._slots.limit:
+            # Publish the deeper queue before blocking
+            with self._lock:
+                self._peak_waiting = max(self._peak_waiting, self._slots.waiting + 1)
+            self.metrics.set_gauge('transcode_queue_depth', self._slots.waiting + 1)
+        self._slots.__enter__()
+        self._local.threads = self._claim_threads()
+        self.metrics.observe('transcode_wait', time.perf_counter() - started)
+        self._publish()
+        return self
+
+    def __exit__(self, *exc_info):
+        threads, self._local.threads = self._local.threads, None
+        with self._lock:
+            if not self._threads:
+                self._allocated -= threads
+            self._completed += 1
+        self._slots.__exit__(*exc_info)
+        self._publish()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self._slots.limit,
+                'threads': self.threads,
+                'priority': self.priority,
+                'running': self._slots.in_use,
+                'waiting': self._slots.waiting,
+                'peak_waiting': self._peak_waiting,
+                'completed': self._completed,
+            }
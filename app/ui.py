@@ -1,30 +1,56 @@
-import re
+import time
 import logging
+import threading
 
 from PySide6.QtWidgets import (
     QMainWindow, QWidget,
     QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QLabel,
-    QComboBox, QFileDialog, QStatusBar, QCheckBox, QDialog, QTextEdit, QProgressDialog
+    QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QLabel,
+    QComboBox, QFileDialog, QStatusBar, QCheckBox, QDialog, QTextEdit, QProgressBar, QSpinBox, QStyle
 )
-from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt, QThread
+from PySide6.QtGui import QPixmap, QIcon
+from PySide6.QtCore import Qt, QThread, QTimer
 
-from .worker import DownloadWorker, SearchWorker, AlbumDetailsWorker
+from .worker import DownloadWorker, SearchWorker, AlbumDetailsWorker, DEFAULT_CONCURRENT_DOWNLOADS
 from .youtube_api import YouTubeMusicClient, get_ytmusicapi_lang, supported_lang
 from .utils import get_system_locale
+from .manifest import build_track_manifest
+from .library import get_library
+from .progress import format_bytes
+from .results_model import AlbumResultsModel
+from .cache import QueryResultCache
+from .prefetch import AlbumPrefetcher
+from .metrics import get_metrics
+from .bandwidth import get_bandwidth_manager
 from .player import MusicPlayer
 
-class ProgressDialog(QProgressDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle(self.tr("Downloading..."))
-        self.setLabelText(self.tr("Download in progress, please wait..."))
-        self.setCancelButtonText(self.tr("Cancel"))
-        self.setMinimumSize(400, 100)
-        self.setModal(True)
-        self.setMinimumDuration(0)
-        self.setValue(0)
+# Search-as-you-type waits for a pause in typing and a minimum query length
+SEARCH_DEBOUNCE_MS = 300
+MIN_INCREMENTAL_QUERY = 2
+
+# Albums prefetched from the top of the visible results
+PREFETCH_VISIBLE = 8
+
+# Tracklist checkbox items hold the library path of tracks already downloaded
+LIBRARY_PATH_ROLE = Qt.UserRole + 1
+
+def _preload(client):
+    """Builds the YTMusic client and imports the download stack ahead of first use."""
+    started = time.perf_counter()
+    try:
+        client.ytmusic
+        from . import downloader, cache
+    except Exception as e:
+        logging.warning(f"Background preload failed: {e}")
+        return
+    logging.info(f"Preloaded API client and download modules in {time.perf_counter() - started:.2f}s")
+    # Pick up files added, changed or deleted outside the app since the last run
+    library = get_library()
+    for directory in library.directories():
+        try:
+            library.scan(directory, recursive=False)
+        except Exception as e:
+            logging.warning(f"Library scan of {directory} failed: {e}")
 
 class ErrorDialog(QDialog):
     def __init__(self, summary, details, parent=None):
@@ -95,17 +121,23 @@ class MainWindow(QMainWindow):
         search_layout.addWidget(self.search_button)
         left_layout.addLayout(search_layout)
 
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(4)
-        self.results_table.setHorizontalHeaderLabels([self.tr("Title"), self.tr("Artist"), self.tr("Year"), self.tr("Type")])
-        header = self.results_table.horizontalHeader()
+        self.results_model = AlbumResultsModel(self)
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+        header = self.results_view.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.Stretch)
         header.setSectionResizeMode(1, QHeaderView.Stretch)
         header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        self.results_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.results_table.setSelectionBehavior(QTableWidget.SelectRows)
-        left_layout.addWidget(self.results_table)
+        # Size the short columns from the visible rows, not every loaded page
+        header.setResizeContentsPrecision(50)
+        self.results_view.setEditTriggers(QTableView.NoEditTriggers)
+        self.results_view.setSelectionBehavior(QTableView.SelectRows)
+        self.results_view.setSelectionMode(QTableView.SingleSelection)
+        self.results_view.verticalHeader().setVisible(False)
+        # Report hovered rows for prefetching
+        self.results_view.setMouseTracking(True)
+        left_layout.addWidget(self.results_view)
 
         # --- Right Panel ---
         right_panel = QWidget()
@@ -151,9 +183,24 @@ class MainWindow(QMainWindow):
         download_controls_layout = QHBoxLayout()
         self.format_selector = QComboBox()
         self.format_selector.addItems(['mp3', 'flac', 'wav', 'm4a', 'opus'])
+        self.concurrency_selector = QSpinBox()
+        self.concurrency_selector.setRange(1, 16)
+        self.concurrency_selector.setValue(DEFAULT_CONCURRENT_DOWNLOADS)
+        self.concurrency_selector.setToolTip(self.tr("Number of tracks to download at once"))
+        self.bandwidth_selector = QSpinBox()
+        self.bandwidth_selector.setRange(0, 100000)
+        self.bandwidth_selector.setSingleStep(100)
+        self.bandwidth_selector.setSuffix(" KB/s")
+        self.bandwidth_selector.setSpecialValueText(self.tr("No limit"))
+        self.bandwidth_selector.setToolTip(self.tr("Total bandwidth for downloads and cover art; playback always goes first"))
+        self.bandwidth_selector.valueChanged.connect(lambda value: get_bandwidth_manager().set_rate(value * 1024))
         self.download_button = QPushButton(self.tr("Download"))
         download_controls_layout.addWidget(QLabel(self.tr("Format:")))
         download_controls_layout.addWidget(self.format_selector)
+        download_controls_layout.addWidget(QLabel(self.tr("Parallel:")))
+        download_controls_layout.addWidget(self.concurrency_selector)
+        download_controls_layout.addWidget(QLabel(self.tr("Limit:")))
+        download_controls_layout.addWidget(self.bandwidth_selector)
         download_controls_layout.addWidget(self.download_button)
         right_layout.addLayout(download_controls_layout)
 
@@ -169,22 +216,60 @@ class MainWindow(QMainWindow):
         root_layout.setStretchFactor(main_content_widget, 1)
         
         self.setStatusBar(QStatusBar(self))
+        self.download_progress_label = QLabel()
+        self.download_progress = QProgressBar()
+        self.download_progress.setMaximumWidth(200)
+        self.cancel_downloads_button = QPushButton(self.tr("Cancel Downloads"))
+        for widget in (self.download_progress_label, self.download_progress, self.cancel_downloads_button):
+            widget.hide()
+            self.statusBar().addPermanentWidget(widget)
 
         # --- Connections & State ---
         self.search_button.clicked.connect(lambda: self.search_albums())
         self.search_input.returnPressed.connect(lambda: self.search_albums())
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         self.search_language.currentTextChanged.connect(self.on_search_language_changed)
-        self.results_table.itemSelectionChanged.connect(self.display_album_details)
+        self.results_view.selectionModel().selectionChanged.connect(self.display_album_details)
         self.tracklist_table.itemChanged.connect(self.on_track_check_changed)
         self.tracklist_table.itemDoubleClicked.connect(self.player_widget.play_track_from_table)
         self.select_all_checkbox.stateChanged.connect(self.toggle_all_tracks)
         self.download_button.clicked.connect(self.initiate_download)
+        self.format_selector.currentTextChanged.connect(self.on_format_changed)
         
         self.ytmusic_client = YouTubeMusicClient()
-        self.download_thread = None
-        self.download_worker = None
+        self.album_prefetcher = AlbumPrefetcher(self.ytmusic_client)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(150)
+        self.prefetch_timer.timeout.connect(self._prefetch_visible_results)
+        self.results_model.modelReset.connect(self.prefetch_timer.start)
+        self.results_model.rowsInserted.connect(lambda *args: self.prefetch_timer.start())
+        self.results_view.verticalScrollBar().valueChanged.connect(lambda *args: self.prefetch_timer.start())
+        self.results_view.entered.connect(self.on_result_hovered)
+        self.results_view.selectionModel().currentChanged.connect(self.on_result_current_changed)
         self.current_album_playlist_id = None
         self.current_album_details = None
+        self.current_track_manifest = []
+        self.current_album_browse_id = None
+        self.current_album_image = None
+        # Token of the latest library lookup started by _update_library_marks
+        self._library_marks_request = 0
+        self.player_widget.local_tracks.downloaded.connect(self._apply_library_marks)
+        self.requested_browse_id = None
+        self.last_search_query = None
+        self.search_generation = 0
+        self.search_cache = QueryResultCache()
+        # Searches up to this generation ran in a previous language
+        self._search_cache_generation = 0
+        self._search_progress_shown = False
+
+        self.search_debounce = QTimer(self)
+        self.search_debounce.setSingleShot(True)
+        self.search_debounce.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_debounce.timeout.connect(lambda: self.search_albums(show_progress=False))
+
+        # Heavy modules and the API client load once the window is up
+        QTimer.singleShot(0, self._start_preload)
 
         self.processing_dialog = ProcessingDialog(self)
 
@@ -192,62 +277,109 @@ class MainWindow(QMainWindow):
         self.search_worker = SearchWorker()
         self.search_worker.moveToThread(self.search_thread)
         self.search_worker.finished.connect(self.on_search_finished)
-        self.search_worker.error.connect(self.on_worker_error)
+        self.search_worker.refreshed.connect(self.on_search_refreshed)
+        self.search_worker.page_loaded.connect(self.results_model.append_page)
+        self.results_model.fetch_more_requested.connect(
+            lambda query, continuation: self.search_worker.start_fetch_more.emit(self.ytmusic_client, query, continuation)
+        )
+        self.search_worker.error.connect(self.on_search_error)
         self.search_thread.start()
 
         self.album_details_thread = QThread()
         self.album_details_worker = AlbumDetailsWorker()
         self.album_details_worker.moveToThread(self.album_details_thread)
         self.album_details_worker.finished.connect(self.on_get_details_finished)
+        self.album_details_worker.refreshed.connect(self.on_album_details_refreshed)
         self.album_details_worker.error.connect(self.on_worker_error)
         self.album_details_thread.start()
 
+        # The download queue runs on its own threads and outlives each album
+        self.download_worker = DownloadWorker(max_concurrent_downloads=self.concurrency_selector.value())
+        self.download_worker.progress.connect(self.download_progress.setValue)
+        self.download_worker.progress_label.connect(self.download_progress_label.setText)
+        self.download_worker.progress_changed.connect(self.on_download_progress_changed)
+        self.download_worker.finished.connect(self.on_download_finished)
+        self.download_worker.error.connect(self.on_download_error)
+        self.download_worker.queue_changed.connect(self.on_download_queue_changed)
+        self.download_worker.track_state_changed.connect(self.on_download_track_state_changed)
+        self.concurrency_selector.valueChanged.connect(self.download_worker.set_max_concurrent_downloads)
+        self.cancel_downloads_button.clicked.connect(self.cancel_download)
+        QTimer.singleShot(0, self._resume_downloads)
+
         self.clear_details() # Set initial state
 
-    def search_albums(self, query=None, preserve_details=False):
+    def on_search_text_changed(self, text):
+        if len(text.strip()) >= MIN_INCREMENTAL_QUERY:
+            self.search_debounce.start()
+        else:
+            self.search_debounce.stop()
+
+    def search_albums(self, query=None, preserve_details=False, show_progress=True):
+        self.search_debounce.stop()
         if query is None:
             query = self.search_input.text()
+        query = query.strip()
         if not query: return
+        if query == self.last_search_query and query == self.results_model.query:
+            # Already shown, or being searched with provisional results
+            return
 
         logging.info(f"Initiating search for query: '{query}'")
-        self.processing_dialog.setWindowTitle(self.tr("Searching..."))
-        self.processing_dialog.set_text(self.tr("Searching for albums..."))
-        self.processing_dialog.show()
-        self.search_worker.start_search.emit(self.ytmusic_client, query)
-
-    def on_search_finished(self, search_results):
-        logging.info(f"Found {len(search_results)} results")
+        self.last_search_query = query
+        self.album_prefetcher.cancel()
+        # Results of any search still queued or running are dropped
+        self.search_generation += 1
+        self.search_worker.latest_generation = self.search_generation
+
+        cached = self.search_cache.get(query)
+        if cached is not None:
+            logging.debug(f"Search results for '{query}' served from memory")
+            self._show_search_results(query, *cached)
+            return
+        provisional = self.search_cache.prefix_results(query)
+        if provisional:
+            self.results_model.set_results(query, provisional)
+
+        self._search_progress_shown = show_progress
+        if show_progress:
+            self.processing_dialog.setWindowTitle(self.tr("Searching..."))
+            self.processing_dialog.set_text(self.tr("Searching for albums..."))
+            self.processing_dialog.show()
+        self.search_worker.start_search.emit(self.ytmusic_client, query, self.search_generation)
+
+    def on_search_finished(self, generation, query, rows, continuation):
+        if generation > self._search_cache_generation:
+            self.search_cache.put(query, rows, continuation)
+        if generation != self.search_generation:
+            logging.debug(f"Dropping stale results for '{query}'")
+            return
+        logging.info(f"Found {len(rows)} results")
+        self._show_search_results(query, rows, continuation)
+
+    def _show_search_results(self, query, rows, continuation):
         self.processing_dialog.hide()
-        self.results_table.setRowCount(0)
         self.clear_details()
+        self.results_model.set_results(query, rows, continuation)
 
-        for album in search_results:
-            row = self.results_table.rowCount()
-
-            artists_list = album.get('artists', [])
-            year = album.get('year')
-            album_type = album.get('type')
-
-            if not year and artists_list:
-                last_artist_name = artists_list[-1]['name']
-                if re.match(r'^\d{4}[년年]?', last_artist_name):
-                    year = last_artist_name.replace('년', '').replace('年', '')
-                    artists_list = artists_list[:-1]
-            
-            if artists_list and artists_list[0]['name'] == album_type:
-                artists_list = artists_list[1:]
-
-            artists = ', '.join([a['name'] for a in artists_list]) or 'N/A'
-            year = str(year) if year else 'N/A'
-
-            self.results_table.insertRow(row)
-            title_item = QTableWidgetItem(album.get('title', 'N/A'))
-            title_item.setToolTip(album.get('title', 'N/A'))
-            title_item.setData(Qt.UserRole, album.get('browseId'))
-            self.results_table.setItem(row, 0, title_item)
-            self.results_table.setItem(row, 1, QTableWidgetItem(artists))
-            self.results_table.setItem(row, 2, QTableWidgetItem(year))
-            self.results_table.setItem(row, 3, QTableWidgetItem(album_type))
+    def on_search_error(self, summary, details):
+        if self._search_progress_shown:
+            self.on_worker_error(summary, details)
+        else:
+            # Searches started while typing fail quietly
+            logging.warning(f"Search failed: {summary}")
+            self.statusBar().showMessage(summary, 5000)
+
+    def on_search_refreshed(self, query, rows, continuation):
+        # Only replace the results if the user is still looking at them, has
+        # not picked an album and has not scrolled into later pages, so a
+        # refresh never yanks the selection or the scroll position.
+        if query == self.last_search_query:
+            self.search_cache.put(query, rows, continuation)
+        if (query != self.last_search_query or self.results_view.selectionModel().hasSelection()
+                or self.results_model.pages > 1):
+            return
+        logging.info(f"Search results refreshed for query: '{query}'")
+        self._show_search_results(query, rows, continuation)
 
     def on_worker_error(self, summary, details):
         logging.error(f"A worker failed: {summary} - {details}")
@@ -257,28 +389,68 @@ class MainWindow(QMainWindow):
         error_dialog.exec()
 
     def display_album_details(self):
-        selected = self.results_table.selectedItems()
+        selected = self.results_view.selectionModel().selectedRows()
         if not selected: return
         browse_id = selected[0].data(Qt.UserRole)
         logging.info(f"Displaying album details for browse_id: {browse_id}")
         if not browse_id: self.clear_details(); return
+
+        prefetched = self.album_prefetcher.get(browse_id)
+        if prefetched:
+            logging.debug(f"Album {browse_id} was prefetched")
+            self.requested_browse_id = browse_id
+            self.on_get_details_finished(*prefetched)
+            return
         
         self.processing_dialog.setWindowTitle(self.tr("Loading..."))
         self.processing_dialog.set_text(self.tr("Loading album details..."))
+        self.requested_browse_id = browse_id
         self.processing_dialog.show()
         self.album_details_worker.start_get_details.emit(self.ytmusic_client, browse_id)
 
+    def _prefetch_visible_results(self):
+        count = self.results_model.rowCount()
+        if not count:
+            return
+        first = max(self.results_view.rowAt(0), 0)
+        last = self.results_view.rowAt(self.results_view.viewport().height() - 1)
+        if last < 0:
+            last = count - 1
+        last = min(last, first + PREFETCH_VISIBLE - 1)
+        self.album_prefetcher.prefetch_visible(
+            [self.results_model.row(row)['browse_id'] for row in range(first, last + 1)]
+        )
+
+    def on_result_hovered(self, index):
+        self.album_prefetcher.focus(index.data(Qt.UserRole))
+
+    def on_result_current_changed(self, current, previous):
+        # Keyboard navigation is likely to continue in the same direction
+        step = 1 if current.row() >= previous.row() else -1
+        row = current.row() + step
+        if 0 <= row < self.results_model.rowCount():
+            self.album_prefetcher.focus(self.results_model.row(row)['browse_id'])
+
     def on_get_details_finished(self, album_details, image_content):
         self.processing_dialog.hide()
         if album_details:
+            self.current_album_browse_id = self.requested_browse_id
             self._update_album_details_ui(album_details, image_content)
         else:
             self.statusBar().showMessage(self.tr("Failed to fetch album details."), 5000)
             self.clear_details()
 
+    def on_album_details_refreshed(self, browse_id, album_details):
+        if not album_details or browse_id != self.current_album_browse_id:
+            return
+        logging.info(f"Album details refreshed for browse_id: {browse_id}")
+        self._update_album_details_ui(album_details, self.current_album_image)
+
     def _update_album_details_ui(self, album_details, image_content):
         logging.info(f"Updating album details UI for album: {album_details.get('title')}")
         self.current_album_details = album_details
+        self.current_track_manifest = build_track_manifest(album_details)
+        self.current_album_image = image_content
         self.current_album_playlist_id = album_details.get('audioPlaylistId')
 
         self.album_title_label.setText(f"<b>{album_details['title']}</b>")
@@ -318,12 +490,64 @@ class MainWindow(QMainWindow):
                 self.tracklist_table.setItem(row, 2, title_item)
                 self.tracklist_table.setItem(row, 3, duration_item)
         self.tracklist_table.blockSignals(False)
+        self._update_library_marks()
+        self._update_download_controls_state()
+
+    def _update_library_marks(self):
+        """Looks up the tracks already downloaded in the selected format on the library thread."""
+        if not self.current_album_playlist_id or not self.current_track_manifest:
+            return
+        self._library_marks_request += 1
+        self.player_widget.local_tracks.find_downloaded(
+            self._library_marks_request,
+            [entry['video_id'] for entry in self.current_track_manifest],
+            self.format_selector.currentText()
+        )
+
+    def _apply_library_marks(self, token, existing):
+        """Marks the tracks found by _update_library_marks and unchecks them."""
+        # Only the latest lookup matches the album and format on screen
+        if token != self._library_marks_request:
+            return
+        video_ids = {entry['index']: entry['video_id'] for entry in self.current_track_manifest}
+        done_icon = self.style().standardIcon(QStyle.SP_DialogApplyButton)
+        self.tracklist_table.blockSignals(True)
+        for row in range(self.tracklist_table.rowCount()):
+            check_item = self.tracklist_table.item(row, 0)
+            path = existing.get(video_ids.get(check_item.data(Qt.UserRole)))
+            check_item.setData(LIBRARY_PATH_ROLE, path)
+            if path:
+                check_item.setIcon(done_icon)
+                check_item.setToolTip(self.tr("Already downloaded: {0}").format(path))
+                check_item.setCheckState(Qt.Unchecked)
+            else:
+                check_item.setIcon(QIcon())
+                check_item.setToolTip("")
+        self.tracklist_table.blockSignals(False)
+        self._update_download_controls_state()
+
+    def on_download_track_state_changed(self, album_id, index, state):
+        if state == 'done':
+            # Play the new file instead of streaming it
+            self.player_widget.local_tracks.clear()
+            self._update_library_marks()
+            self._update_download_controls_state()
+
+    def on_format_changed(self):
+        self._update_library_marks()
         self._update_download_controls_state()
 
+    def _start_preload(self):
+        threading.Thread(target=_preload, args=(self.ytmusic_client,), name='preload', daemon=True).start()
+
     def on_search_language_changed(self):
         new_lang = self.search_language.currentText()
         logging.info(f"Search language changed to: {new_lang}")
         self.ytmusic_client.set_language(new_lang)
+        self.search_cache.clear()
+        self.album_prefetcher.clear()
+        self._search_cache_generation = self.search_generation
+        self.last_search_query = None
 
     def _get_checkable_rows(self):
         return [r for r in range(self.tracklist_table.rowCount()) if self.tracklist_table.item(r, 0).flags() & Qt.ItemIsUserCheckable]
@@ -373,46 +597,71 @@ class MainWindow(QMainWindow):
         if not self.current_album_playlist_id:
             self.statusBar().showMessage(self.tr("This album is not available for download."), 3000); return
 
-        track_indices = []
+        track_indices, skipped = [], 0
         for row in range(self.tracklist_table.rowCount()):
-            if self.tracklist_table.item(row, 0).checkState() == Qt.Checked:
-                track_indices.append(self.tracklist_table.item(row, 0).data(Qt.UserRole))
+            check_item = self.tracklist_table.item(row, 0)
+            if check_item.checkState() == Qt.Checked:
+                if check_item.data(LIBRARY_PATH_ROLE):
+                    skipped += 1
+                else:
+                    track_indices.append(check_item.data(Qt.UserRole))
         
-        if not track_indices: self.statusBar().showMessage(self.tr("No tracks checked for download."), 3000); return
+        if not track_indices:
+            if skipped:
+                self.statusBar().showMessage(self.tr("All checked tracks are already in your library."), 3000)
+            else:
+                self.statusBar().showMessage(self.tr("No tracks checked for download."), 3000)
+            return
         
         save_path = QFileDialog.getExistingDirectory(self, self.tr("Select Download Folder"))
         if not save_path: return
         
         audio_format = self.format_selector.currentText()
-        language = self.search_language.currentText()
-        logging.info(f"Initiating download of {len(track_indices)} tracks to '{save_path}' in format '{audio_format}'")
-        self.download_button.setEnabled(False)
-        self.select_all_checkbox.setEnabled(False)
-        self.statusBar().showMessage(self.tr("Preparing download for {0} track(s)...").format(len(track_indices)))
-
-        self.progress_dialog = ProgressDialog(self)
-        self.progress_dialog.canceled.connect(self.cancel_download)
-        self.progress_dialog.show()
-
-        self.download_thread = QThread()
-        self.download_worker = DownloadWorker()
-        self.download_worker.moveToThread(self.download_thread)
-        
-        self.download_worker.progress.connect(self.progress_dialog.setValue)
-        self.download_worker.progress_label.connect(self.progress_dialog.setLabelText)
-        
-        self.download_worker.finished.connect(self.progress_dialog.accept)
-        self.download_worker.error.connect(self.progress_dialog.reject)
+        logging.info(f"Queueing download of {len(track_indices)} tracks to '{save_path}' in format '{audio_format}'")
+        self.download_worker.enqueue(
+            self.current_album_playlist_id, track_indices, save_path, audio_format,
+            self.current_album_details, self.current_album_browse_id
+        )
+        message = self.tr("Added {0} track(s) to the download queue.").format(len(track_indices))
+        if skipped:
+            message += " " + self.tr("Skipping {0} track(s) already in your library.").format(skipped)
+        self.statusBar().showMessage(message, 5000)
 
-        self.download_worker.finished.connect(self.on_download_finished)
-        self.download_worker.error.connect(self.on_download_error)
-        
-        self.download_thread.started.connect(lambda: self.download_worker.start_download.emit(self.current_album_playlist_id, track_indices, save_path, audio_format, self.current_album_details))
-        self.download_worker.finished.connect(self.download_thread.quit)
-        self.download_worker.error.connect(self.download_thread.quit)
-        self.download_thread.finished.connect(self.download_thread.deleteLater)
-        self.download_thread.finished.connect(self._clear_download_worker)
-        self.download_thread.start()
+    def _resume_downloads(self):
+        remaining = self.download_worker.resume()
+        if remaining:
+            self.statusBar().showMessage(self.tr("Resuming {0} track(s) from the download queue.").format(remaining), 5000)
+
+    def on_download_queue_changed(self, remaining):
+        active = remaining > 0
+        for widget in (self.download_progress_label, self.download_progress, self.cancel_downloads_button):
+            widget.setVisible(active)
+        if active:
+            self.download_progress.setToolTip(self.tr("{0} track(s) left in the download queue").format(remaining))
+        else:
+            self.download_progress.reset()
+            self.download_progress.setFormat("%p%")
+            self.download_progress_label.clear()
+            self.download_progress_label.setToolTip("")
+
+    def on_download_progress_changed(self, snapshot):
+        if snapshot['speed']:
+            self.download_progress.setFormat(f"%p% - {format_bytes(snapshot['speed'])}/s")
+        else:
+            self.download_progress.setFormat("%p%")
+        lines = []
+        for track in snapshot['tracks']:
+            name = ' - '.join(filter(None, (track.get('artist'), track.get('track')))) or str(track['index'])
+            if track['state'] != 'downloading':
+                lines.append(self.tr("{0}: processing").format(name))
+            elif track.get('total_bytes') and track.get('speed'):
+                lines.append(self.tr("{0}: {1:.0%} of {2}, {3}/s, {4}:{5:02d} left").format(
+                    name, track.get('fraction', 0), format_bytes(track['total_bytes']),
+                    format_bytes(track['speed']), *divmod(int(track.get('eta') or 0), 60)
+                ))
+            else:
+                lines.append(self.tr("{0}: {1:.0%}").format(name, track.get('fraction', 0)))
+        self.download_progress_label.setToolTip('\n'.join(lines))
 
     def on_download_finished(self, message):
         logging.info(f"Download finished: {message}")
@@ -428,13 +677,15 @@ class MainWindow(QMainWindow):
 
     def cancel_download(self):
         logging.info("Download cancellation requested by user.")
-        if self.download_worker:
-            self.download_worker.cancel()
+        self.download_worker.cancel()
 
-    def _clear_download_worker(self):
-        logging.debug("Clearing download worker and thread references.")
-        self.download_worker = None
-        self.download_thread = None
+    def closeEvent(self, event):
+        # Interrupted tracks stay in the queue and resume on the next start
+        self.download_worker.shutdown()
+        self.player_widget.shutdown()
+        self.album_prefetcher.close()
+        get_metrics().close()
+        super().closeEvent(event)
 
     def clear_details(self):
         logging.info("Clearing album details")
@@ -449,4 +700,7 @@ class MainWindow(QMainWindow):
         self.select_all_checkbox.setEnabled(False)
         self.current_album_playlist_id = None
         self.current_album_details = None
+        self.current_track_manifest = []
+        self.current_album_browse_id = None
+        self.current_album_image = None
         self.player_widget.stop_playback()
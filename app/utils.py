@@ -1,7 +1,6 @@
 import os
 import sys
 import locale
-import logging
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -27,19 +26,31 @@ def get_system_locale():
     
     return sys_locale
 
-def setup_logging():
+def get_cache_dir():
     """
-    Configures logging. Logs to stdout if not running in a PyInstaller bundle.
+    Returns the per-user cache directory for the app, creating it if needed.
     """
-    # PyInstaller sets sys.frozen to True
-    is_frozen = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
-    if not is_frozen:
-        logger = logging.getLogger()
-        logger.setLevel(logging.DEBUG)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.DEBUG)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
\ No newline at end of file
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    path = os.path.join(base, 'yt-music-downloader')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_data_dir():
+    """
+    Returns the per-user data directory for the app, creating it if needed.
+    Unlike the cache directory, its contents are not safe to delete.
+    """
+    if sys.platform.startswith('win'):
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    path = os.path.join(base, 'yt-music-downloader')
+    os.makedirs(path, exist_ok=True)
+    return path
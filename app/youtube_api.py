@@ -1,8 +1,11 @@
+import re
 import logging
-from ytmusicapi import YTMusic
-from ytmusicapi.exceptions import YTMusicUserError
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from .utils import get_system_locale
+from .cache import MetadataCache
+from .metrics import span
 
 supported_lang = ['zh_TW', 'tr', 'hi', 'es', 'ar', 'de', 'fr', 'it', 'nl', 'ja', 'ur', 'ko', 'zh_CN', 'pt', 'en', 'ru']
 
@@ -10,38 +13,225 @@ def get_ytmusicapi_lang(language: str) -> str:
 
     if language in supported_lang:
         return language
-    elif language.split('_')[0] in supported_lang:
+    elif language and language.split('_')[0] in supported_lang:
         return language.split('_')[0]
     else:
-        raise YTMusicUserError("Unsupported Language")
+        raise ValueError("Unsupported Language")
+
+def _default_ytmusic_factory(language):
+    # ytmusicapi takes a few hundred ms to import; load it on first use
+    from ytmusicapi import YTMusic
+    return YTMusic(language=language)
+
+SEARCH_TTL = 60 * 60            # 1 hour
+ALBUM_TTL = 24 * 60 * 60        # 1 day
+
+# Results returned by the single-request fallback when paging is unavailable
+SEARCH_FALLBACK_LIMIT = 50
+
+_YEAR_AS_ARTIST = re.compile(r'^\d{4}[년年]?')
+
+def normalize_album_result(album):
+    """
+    Flattens an album search result into the strings shown in the results
+    list, plus its browseId. YouTube Music sometimes lists the release year
+    as the last artist and the album type as the first one; both are moved
+    to their own fields.
+    """
+    artists_list = album.get('artists') or []
+    year = album.get('year')
+    album_type = album.get('type')
+
+    if not year and artists_list:
+        last_artist_name = artists_list[-1]['name']
+        if _YEAR_AS_ARTIST.match(last_artist_name):
+            year = last_artist_name.replace('년', '').replace('年', '')
+            artists_list = artists_list[:-1]
+
+    if artists_list and artists_list[0]['name'] == album_type:
+        artists_list = artists_list[1:]
+
+    return {
+        'title': album.get('title') or 'N/A',
+        'artists': ', '.join([a['name'] for a in artists_list]) or 'N/A',
+        'year': str(year) if year else 'N/A',
+        'type': album_type or '',
+        'browse_id': album.get('browseId'),
+    }
+
+def _search_album_page(ytmusic, query, continuation=None):
+    # YTMusic.search only returns whole result lists, fetching every page up
+    # to `limit` in one call, so pages are requested with its own helpers.
+    from ytmusicapi.navigation import nav, SECTION_LIST
+    from ytmusicapi.parsers.search import get_search_params, parse_search_results
+    from ytmusicapi.continuations import get_continuation_params
+
+    body = {'query': query, 'params': get_search_params('albums', None, False)}
+    if continuation:
+        response = ytmusic._send_request('search', body, continuation)
+        shelf = response.get('continuationContents', {}).get('musicShelfContinuation')
+    else:
+        response = ytmusic._send_request('search', body)
+        contents = response.get('contents')
+        if not contents:
+            return {'results': [], 'continuation': None}
+        if 'tabbedSearchResultsRenderer' in contents:
+            contents = contents['tabbedSearchResultsRenderer']['tabs'][0]['tabRenderer']['content']
+        shelves = [s['musicShelfRenderer'] for s in nav(contents, SECTION_LIST) if 'musicShelfRenderer' in s]
+        shelf = shelves[0] if shelves else None
+    if not shelf:
+        return {'results': [], 'continuation': None}
+    return {
+        'results': parse_search_results(shelf.get('contents', []), 'album'),
+        'continuation': get_continuation_params(shelf) if shelf.get('continuations') else None,
+    }
 
 class YouTubeMusicClient:
-    def __init__(self):
-        try:
-            language = get_ytmusicapi_lang(get_system_locale())
-        except YTMusicUserError:
-            language = 'en'
+    """
+    Thin wrapper around YTMusic with a persistent metadata cache.
+
+    With `stale_while_revalidate` enabled, expired entries are returned
+    immediately and refreshed on a background thread. `on_refresh` callbacks
+    passed to the lookup methods are called from that thread with the new
+    value when it differs from what was returned.
+
+    The YTMusic instance is built on first use, normally on a worker thread,
+    so constructing the client is cheap.
+    """
+    def __init__(self, cache=None, ytmusic_factory=None, stale_while_revalidate=True, language=None):
+        if language is None:
+            try:
+                language = get_ytmusicapi_lang(get_system_locale())
+            except ValueError:
+                language = 'en'
         logging.debug(f"Initializing YouTubeMusicClient with language: {language}")
-        self.ytmusic = YTMusic(language=language)
+        self._ytmusic_factory = ytmusic_factory or _default_ytmusic_factory
+        self.language = language
+        self._ytmusic = None
+        self._ytmusic_lock = threading.Lock()
+        self.cache = cache if cache is not None else MetadataCache()
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='metadata-refresh')
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ytmusic(self):
+        with self._ytmusic_lock:
+            if self._ytmusic is None:
+                with span('metadata_client_init'):
+                    self._ytmusic = self._ytmusic_factory(language=self.language)
+            return self._ytmusic
 
     def set_language(self, language):
         logging.debug(f"Setting language to: {language}")
-        self.ytmusic = YTMusic(language=language)
+        with self._ytmusic_lock:
+            self.language = language
+            self._ytmusic = None
+
+    def _cached(self, key, fetch, ttl, on_refresh=None, stage='metadata'):
+        with span(stage) as s:
+            cached = self.cache.get(key, allow_stale=self.stale_while_revalidate)
+            if cached is not None:
+                value, is_fresh = cached
+                s.labels['cache'] = 'hit' if is_fresh else 'stale'
+                if not is_fresh:
+                    self._schedule_refresh(key, fetch, ttl, value, on_refresh, stage)
+                return value
 
-    def search_albums(self, query):
-        """Searches for albums with the given query."""
+            s.labels['cache'] = 'miss'
+            value = fetch()
+            if value is not None:
+                self.cache.set(key, value, ttl)
+            return value
+
+    def _schedule_refresh(self, key, fetch, ttl, stale_value, on_refresh, stage='metadata'):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                with span(stage, cache='refresh'):
+                    value = fetch()
+                if value is None:
+                    return
+                self.cache.set(key, value, ttl)
+                if on_refresh and value != stale_value:
+                    on_refresh(value)
+            except Exception as e:
+                logging.warning(f"Background refresh failed for {key}: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        logging.debug(f"Serving stale cache entry, refreshing in background: {key}")
+        self._refresh_executor.submit(refresh)
+
+    def search_albums(self, query, on_refresh=None):
+        """Searches for albums with the given query. Returns the first page of results."""
+        if on_refresh:
+            page = self.search_albums_page(query, on_refresh=lambda page: on_refresh(page['results']))
+        else:
+            page = self.search_albums_page(query)
+        return page['results']
+
+    def _fetch_album_page(self, ytmusic, query, continuation=None):
+        try:
+            return _search_album_page(ytmusic, query, continuation)
+        except (ImportError, AttributeError, LookupError, TypeError) as e:
+            # ytmusicapi internals changed; fall back to one larger page
+            if continuation:
+                raise
+            logging.warning(f"Paged album search unavailable, falling back to a single request: {e!r}")
+            return {
+                'results': ytmusic.search(query, filter="albums", limit=SEARCH_FALLBACK_LIMIT),
+                'continuation': None
+            }
+
+    def search_albums_page(self, query, continuation=None, on_refresh=None):
+        """
+        Returns one page of album results as {'results': [...],
+        'continuation': token}. Pass a page's continuation to get the next
+        page; it is None after the last one. Only first pages are cached,
+        since continuation tokens are tied to the response they came from.
+        """
         if not query:
-            return []
+            return {'results': [], 'continuation': None}
+        ytmusic = self.ytmusic
+        if continuation:
+            logging.debug(f"Fetching next page of album results for query: {query}")
+            with span('metadata_search', cache='next_page'):
+                return self._fetch_album_page(ytmusic, query, continuation)
         logging.debug(f"Searching for albums with query: {query}")
-        return self.ytmusic.search(query, filter="albums", limit=50)
+        key = MetadataCache.make_key('search_albums_page', self.language, query)
+        return self._cached(
+            key,
+            lambda: self._fetch_album_page(ytmusic, query),
+            SEARCH_TTL,
+            on_refresh,
+            'metadata_search'
+        )
 
-    def get_album_details(self, browse_id):
-        """Gets the details of an album by its browseId."""
-        if not browse_id:
-            return None
-        logging.debug(f"Getting album details for browse_id: {browse_id}")
+    def _fetch_album(self, ytmusic, browse_id):
         try:
-            return self.ytmusic.get_album(browseId=browse_id)
+            return ytmusic.get_album(browseId=browse_id)
         except Exception as e:
             logging.error(f"Error getting album details: {e}")
             return None
+
+    def get_album_details(self, browse_id, on_refresh=None):
+        """Gets the details of an album by its browseId."""
+        if not browse_id:
+            return None
+        logging.debug(f"Getting album details for browse_id: {browse_id}")
+        ytmusic = self.ytmusic
+        key = MetadataCache.make_key('get_album', self.language, browse_id)
+        return self._cached(
+            key,
+            lambda: self._fetch_album(ytmusic, browse_id),
+            ALBUM_TTL,
+            on_refresh,
+            'metadata_album'
+        )
@@ -0,0 +1,223 @@
+"""
+Checks app.bandwidth.BandwidthManager against a local throttled HTTP server.
+
+Readers stream from the server the way AlbumDownloader's progress hook and
+ImageCache do, reporting each chunk through `consume` inside a `host_slot`,
+and the script verifies that:
+
+- the total rate of BULK readers stays within --tolerance of --rate
+- BULK readers stop while playback priority is held, resume when it is
+  released, and resume on their own once the hold times out
+- no more than --host-connections requests to one host are open at once
+- ImageCache cover fetches are metered as INTERACTIVE traffic
+
+    python benchmarks/bench_bandwidth.py --rate 2M --readers 4 --seconds 3
+
+The server's own per-connection cap (--server-bandwidth) stands in for a
+slow link. Exits with status 1 if a check fails.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from yt_dlp.utils import parse_bytes
+
+from app.bandwidth import BandwidthManager, BULK, INTERACTIVE
+from app.cache import ImageCache
+
+CHUNK = 16 * 1024
+BLOB_SIZE = 256 * 1024 * 1024
+COVER = b'\xff\xd8\xff\xe0' + bytes(60 * 1024)
+
+class ThrottledHandler(BaseHTTPRequestHandler):
+    """Serves /blob/<n> (endless zeros) and /cover/<n>.jpg, counting open connections."""
+    bandwidth = 0   # bytes/s per connection, 0 for unlimited
+    open_connections = 0
+    peak_connections = 0
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        with cls._lock:
+            cls.open_connections += 1
+            cls.peak_connections = max(cls.peak_connections, cls.open_connections)
+        try:
+            self._send()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with cls._lock:
+                cls.open_connections -= 1
+
+    def _send(self):
+        if self.path.startswith('/cover/'):
+            body, size = COVER, len(COVER)
+        else:
+            body, size = None, BLOB_SIZE
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg' if body else 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        zeros = bytes(CHUNK)
+        started = time.perf_counter()
+        sent = 0
+        while sent < size:
+            chunk = body[sent:sent + CHUNK] if body else zeros[:min(CHUNK, size - sent)]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if self.bandwidth:
+                ahead = sent / self.bandwidth - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    @classmethod
+    def reset(cls, timeout=5):
+        # Handlers of closed connections may still be finishing a write
+        deadline = time.perf_counter() + timeout
+        while cls.open_connections and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        with cls._lock:
+            cls.peak_connections = cls.open_connections
+
+def start_server(bandwidth):
+    ThrottledHandler.bandwidth = bandwidth
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottledHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+class Reader(threading.Thread):
+    """Streams one URL as BULK traffic until stopped, like a track download."""
+    def __init__(self, manager, url):
+        super().__init__(daemon=True)
+        self.manager = manager
+        self.url = url
+        self.received = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        with requests.Session() as session, self.manager.host_slot(self.url):
+            with session.get(self.url, stream=True, timeout=30) as response:
+                for chunk in response.iter_content(CHUNK):
+                    self.received += len(chunk)
+                    self.manager.consume(len(chunk), BULK, cancelled=self.stopped.is_set)
+                    if self.stopped.is_set():
+                        break
+
+    def stop(self):
+        self.stopped.set()
+
+def run_readers(manager, base_url, count):
+    readers = [Reader(manager, f'{base_url}/blob/{i}') for i in range(count)]
+    for reader in readers:
+        reader.start()
+    return readers
+
+def stop_readers(readers):
+    for reader in readers:
+        reader.stop()
+    for reader in readers:
+        reader.join(10)
+
+def total(readers):
+    return sum(reader.received for reader in readers)
+
+def check_rate(args, base_url):
+    manager = BandwidthManager(args.rate)
+    readers = run_readers(manager, base_url, args.readers)
+    # Let the connections open before measuring
+    time.sleep(0.5)
+    started, before = time.perf_counter(), total(readers)
+    time.sleep(args.seconds)
+    rate = (total(readers) - before) / (time.perf_counter() - started)
+    stop_readers(readers)
+    error = rate / args.rate - 1
+    return abs(error) <= args.tolerance, f"{args.readers} readers at {rate / 1024:.0f} KB/s for a {args.rate / 1024:.0f} KB/s cap ({error:+.1%})"
+
+def check_priority(args, base_url):
+    manager = BandwidthManager(args.rate)
+    readers = run_readers(manager, base_url, args.readers)
+    time.sleep(0.5)
+    manager.set_playback_active(True)
+    # Chunks already paid for may still arrive
+    time.sleep(0.2)
+    held = total(readers)
+    time.sleep(1.0)
+    during = total(readers) - held
+    manager.set_playback_active(False)
+    released = total(readers)
+    time.sleep(0.5)
+    after = total(readers) - released
+
+    manager.set_playback_active(True, timeout=0.5)
+    time.sleep(1.0)
+    lapsed = total(readers)
+    time.sleep(0.5)
+    after_timeout = total(readers) - lapsed
+    stop_readers(readers)
+
+    allowed = args.readers * CHUNK
+    ok = during <= allowed and after > allowed and after_timeout > allowed
+    return ok, (f"{during / 1024:.0f} KB read while playback held, {after / 1024:.0f} KB in 0.5 s after release, "
+                f"{after_timeout / 1024:.0f} KB in 0.5 s after a lapsed hold")
+
+def check_host_cap(args, base_url):
+    manager = BandwidthManager(args.rate, host_connections=args.host_connections)
+    ThrottledHandler.reset()
+    readers = run_readers(manager, base_url, args.host_connections * 3)
+    time.sleep(1.0)
+    # Read before stopping: queued readers connect as the first ones close
+    peak = ThrottledHandler.peak_connections
+    stop_readers(readers)
+    return peak == args.host_connections, f"{peak} connections open at most with a cap of {args.host_connections}"
+
+def check_covers(args, base_url):
+    manager = BandwidthManager(args.rate)
+    covers = max(1, int(args.rate / len(COVER)))
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ImageCache(directory, bandwidth=manager)
+        started = time.perf_counter()
+        for i in range(covers):
+            cache.get(f'{base_url}/cover/{i}.jpg')
+        elapsed = time.perf_counter() - started
+        cache._db.close()
+    metered = manager.stats()['bytes'][INTERACTIVE]
+    expected = covers * len(COVER)
+    # The bucket starts empty, so a second of covers takes about a second
+    ok = metered == expected and elapsed >= (1 - args.tolerance) * (expected - len(COVER)) / args.rate
+    return ok, f"{covers} covers, {metered / 1024:.0f} KB metered of {expected / 1024:.0f} KB in {elapsed:.2f}s"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=parse_bytes, default=parse_bytes('2M'), help="Global cap, e.g. 500K or 2M")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3.0, help="Measurement window of the rate check")
+    parser.add_argument('--host-connections', type=int, default=2)
+    parser.add_argument('--server-bandwidth', type=parse_bytes, default=parse_bytes('8M'), help="Per-connection cap of the server")
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.server_bandwidth)
+    failed = 0
+    try:
+        for name, check in (('rate', check_rate), ('priority', check_priority),
+                            ('host cap', check_host_cap), ('covers', check_covers)):
+            ok, detail = check(args, base_url)
+            failed += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:9} {detail}")
+    finally:
+        server.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+"""
+Offline end-to-end download benchmark.
+
+Runs the real download path (yt-dlp's HTTP downloader, ffmpeg, TagAudioPP,
+finalize and the library index) against local stand-ins instead of YouTube:
+
+- a fake YTMusic answering album search and get_album from a synthetic
+  catalogue, used through YouTubeMusicClient
+- a local HTTP server serving synthetic Opus/WebM and AAC/M4A audio and
+  cover art, with an optional per-connection bandwidth cap and latency
+- a yt-dlp extractor for music.youtube.com/watch URLs pointing at that
+  server, registered ahead of the built-in ones through `ydl_factory`
+
+Albums are queued through DownloadWorker (or the Qt-free DownloadQueue
+with --headless), and the script reports tracks/min, CPU seconds of this
+process and of its ffmpeg children, and peak RSS:
+
+    python benchmarks/bench_e2e.py --albums 2 --tracks 8 --seconds 120 --format mp3 --concurrency 4
+    python benchmarks/bench_e2e.py --format opus --bandwidth 2000000 --latency 0.05 --runs 3 --json
+
+ffmpeg and ffprobe must be on PATH; ffmpeg also generates the synthetic
+media. Everything is written to a temporary directory, so the real caches,
+download queue and library are left alone.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+import app.cache
+from app.cache import MetadataCache, ImageCache
+from app.cli import peak_rss_bytes
+from app.library import LibraryIndex
+from app.download_queue import DownloadQueue, DownloadJournal
+from app.transcode import TranscodeScheduler, TRANSCODE_PRIORITIES, DEFAULT_TRANSCODE_PRIORITY
+from app.youtube_api import YouTubeMusicClient
+
+COVER_SIZE = 544
+CHUNK = 64 * 1024
+
+class Catalogue:
+    """Synthetic albums, tracks and the media served for them."""
+    def __init__(self, albums, tracks, seconds):
+        self.base_url = None
+        self.seconds = seconds
+        self.albums = {}
+        self.tracks = {}
+        for a in range(1, albums + 1):
+            browse_id = f"MPREb_bench{a:03d}"
+            album_tracks = []
+            for t in range(1, tracks + 1):
+                video_id = f"bench{a:03d}t{t:02d}"
+                track = {
+                    'videoId': video_id,
+                    'title': f"Track {t}",
+                    'artists': [{'name': f"Bench Artist {a}", 'id': f"UCbench{a:03d}"}],
+                    'album': f"Bench Album {a}",
+                    'trackNumber': t,
+                    'duration': f"{seconds // 60}:{seconds % 60:02d}",
+                    'duration_seconds': seconds,
+                    'isAvailable': True,
+                }
+                album_tracks.append(track)
+                self.tracks[video_id] = track
+            self.albums[browse_id] = {
+                'browseId': browse_id,
+                'title': f"Bench Album {a}",
+                'type': "Album",
+                'year': "2024",
+                'artists': [{'name': f"Bench Artist {a}", 'id': f"UCbench{a:03d}"}],
+                'audioPlaylistId': f"OLAK5uy_bench{a:03d}",
+                'trackCount': tracks,
+                'tracks': album_tracks,
+            }
+
+    def thumbnails(self, name):
+        return [{'url': f"{self.base_url}/cover/{name}.jpg", 'width': COVER_SIZE, 'height': COVER_SIZE}]
+
+class FakeYTMusic:
+    """The part of ytmusicapi.YTMusic the app uses, answered from a Catalogue."""
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+
+    def search(self, query, filter=None, limit=20, **kwargs):
+        words = query.casefold().split()
+        results = []
+        for album in self.catalogue.albums.values():
+            if all(w in album['title'].casefold() for w in words):
+                results.append({
+                    'category': "Albums", 'resultType': 'album', 'type': album['type'],
+                    'title': album['title'], 'browseId': album['browseId'], 'year': album['year'],
+                    'artists': album['artists'], 'isExplicit': False,
+                    'thumbnails': self.catalogue.thumbnails(album['browseId']),
+                })
+        return results[:limit]
+
+    def get_album(self, browseId):
+        album = self.catalogue.albums[browseId]
+        return dict(album, thumbnails=self.catalogue.thumbnails(browseId), tracks=[dict(t) for t in album['tracks']])
+
+    def get_album_browse_id(self, audioPlaylistId):
+        for album in self.catalogue.albums.values():
+            if album['audioPlaylistId'] == audioPlaylistId:
+                return album['browseId']
+        return None
+
+class LocalMusicIE(InfoExtractor):
+    """Resolves music.youtube.com/watch URLs to the local media server."""
+    IE_NAME = 'localmusic'
+    _VALID_URL = r'https?://music\.youtube\.com/watch\?v=(?P<id>[\w-]+)'
+    catalogue = None
+    media_sizes = {}
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        track = self.catalogue.tracks[video_id]
+        base = self.catalogue.base_url
+        return {
+            'id': video_id,
+            'title': track['title'],
+            'track': track['title'],
+            'artist': track['artists'][0]['name'],
+            'album': track['album'],
+            'duration': track['duration_seconds'],
+            'thumbnails': self.catalogue.thumbnails(video_id),
+            'formats': [
+                {'format_id': '251', 'url': f"{base}/media/{video_id}.webm", 'ext': 'webm',
+                 'acodec': 'opus', 'vcodec': 'none', 'abr': 128, 'filesize': self.media_sizes.get('webm')},
+                {'format_id': '140', 'url': f"{base}/media/{video_id}.m4a", 'ext': 'm4a',
+                 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 128, 'filesize': self.media_sizes.get('m4a')},
+            ],
+        }
+
+def local_ydl(params=None):
+    """YoutubeDL with LocalMusicIE tried before the built-in extractors."""
+    ydl = yt_dlp.YoutubeDL(params, auto_init=False)
+    ydl.add_info_extractor(LocalMusicIE())
+    ydl.add_default_info_extractors()
+    return ydl
+
+def make_media(directory, seconds):
+    """Generates one Opus/WebM and one AAC/M4A stream and a cover with ffmpeg. Returns {ext: bytes}."""
+    def ffmpeg(*args):
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', *args], check=True)
+    sine = ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}:sample_rate=48000', '-ac', '2']
+    paths = {
+        'webm': os.path.join(directory, 'source.webm'),
+        'm4a': os.path.join(directory, 'source.m4a'),
+        'jpg': os.path.join(directory, 'cover.jpg'),
+    }
+    ffmpeg(*sine, '-c:a', 'libopus', '-b:a', '128k', paths['webm'])
+    ffmpeg(*sine, '-c:a', 'aac', '-b:a', '128k', paths['m4a'])
+    ffmpeg('-f', 'lavfi', '-i', f'color=c=0x3366aa:s={COVER_SIZE}x{COVER_SIZE}', '-frames:v', '1', paths['jpg'])
+    media = {}
+    for ext, path in paths.items():
+        with open(path, 'rb') as f:
+            media[ext] = f.read()
+    return media
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves /media/<id>.<ext> and /cover/<name>.jpg, honouring Range requests."""
+    media = {}
+    bandwidth = 0   # bytes/s per connection, 0 for unlimited
+    latency = 0.0
+    bytes_served = 0
+    _lock = threading.Lock()
+
+    CONTENT_TYPES = {'webm': 'audio/webm', 'm4a': 'audio/mp4', 'jpg': 'image/jpeg'}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        match = re.fullmatch(r'/(media|cover)/[\w-]+\.(webm|m4a|jpg)', self.path.split('?')[0])
+        if not match:
+            return None, None
+        return self.media.get(match.group(2)), match.group(2)
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        data, ext = self._resolve()
+        if data is None:
+            self.send_error(404)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        start, end = 0, len(data) - 1
+        range_header = self.headers.get('Range')
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header or '')
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+            else:
+                start = max(0, len(data) - int(match.group(2)))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', self.CONTENT_TYPES[ext])
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        started = time.perf_counter()
+        sent = 0
+        view = memoryview(data)[start:end + 1]
+        try:
+            while sent < len(view):
+                chunk = view[sent:sent + CHUNK]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.perf_counter() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        with MediaHandler._lock:
+            MediaHandler.bytes_served += sent
+
+def start_server(media, bandwidth, latency):
+    MediaHandler.media = media
+    MediaHandler.bandwidth = bandwidth
+    MediaHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='media-server', daemon=True).start()
+    return server
+
+def cpu_times():
+    """(process CPU seconds, CPU seconds of finished children or None)."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time(), None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+def children_peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def resolve_albums(client, catalogue):
+    """Searches and loads every album like the GUI does. Returns [(browse_id, album_details)]."""
+    albums = []
+    for album in catalogue.albums.values():
+        results = client.search_albums(album['title'])
+        browse_id = results[0]['browseId']
+        albums.append((browse_id, client.get_album_details(browse_id)))
+    return albums
+
+def run_queue(args, albums, queue, wait):
+    for browse_id, details in albums:
+        queue.add_album(
+            details['audioPlaylistId'], list(range(1, len(details['tracks']) + 1)),
+            args.output, args.format, details, browse_id
+        )
+    wait()
+
+def run_headless(args, albums, queue_kwargs):
+    finished = []
+    done = threading.Event()
+
+    def on_album(album_id, status, counts, error):
+        finished.append((status, counts))
+        if len(finished) == len(albums):
+            done.set()
+
+    queue = DownloadQueue(album_callback=on_album, **queue_kwargs)
+    queue.start()
+    try:
+        run_queue(args, albums, queue, lambda: done.wait(args.timeout))
+    finally:
+        queue.stop()
+    return finished
+
+def run_worker(args, albums, queue_kwargs):
+    from PySide6.QtCore import QCoreApplication, QTimer
+    from app.worker import DownloadWorker
+
+    qt_app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    finished = []
+    worker = DownloadWorker(queue=DownloadQueue(**queue_kwargs))
+
+    def on_album(message, *details):
+        finished.append(('finished' if not details else 'failed', message))
+        if len(finished) == len(albums):
+            qt_app.quit()
+
+    worker.finished.connect(on_album)
+    worker.error.connect(on_album)
+    worker.resume()
+
+    def wait():
+        QTimer.singleShot(int(args.timeout * 1000), qt_app.quit)
+        qt_app.exec()
+
+    try:
+        run_queue(args, albums, worker.queue, wait)
+    finally:
+        worker.shutdown()
+    return finished
+
+def run_once(args, catalogue, workdir):
+    args.output = os.path.join(workdir, 'output')
+    os.makedirs(args.output)
+    # Fresh caches, queue and library per run so nothing is skipped
+    app.cache._image_cache = ImageCache(directory=os.path.join(workdir, 'images'))
+    client = YouTubeMusicClient(
+        cache=MetadataCache(':memory:'),
+        ytmusic_factory=lambda language: FakeYTMusic(catalogue),
+        stale_while_revalidate=False,
+        language='en'
+    )
+    library = LibraryIndex(os.path.join(workdir, 'library.sqlite3'))
+    scheduler = TranscodeScheduler(args.transcode_workers, args.ffmpeg_threads, args.transcode_priority)
+    queue_kwargs = dict(
+        journal=DownloadJournal(os.path.join(workdir, 'queue.sqlite3')),
+        max_concurrent_downloads=args.concurrency,
+        transcode_scheduler=scheduler,
+        max_albums=args.max_albums,
+        library=library,
+        ydl_factory=local_ydl,
+    )
+
+    bytes_before = MediaHandler.bytes_served
+    cpu_before, children_before = cpu_times()
+    started = time.perf_counter()
+    albums = resolve_albums(client, catalogue)
+    resolved = time.perf_counter()
+    finished = (run_headless if args.headless else run_worker)(args, albums, queue_kwargs)
+    elapsed = time.perf_counter() - started
+    cpu_after, children_after = cpu_times()
+
+    files = [f for f in os.listdir(args.output) if not f.startswith('.')]
+    expected = args.albums * args.tracks
+    return {
+        'tracks': len(files),
+        'expected': expected,
+        'albums_finished': len(finished),
+        'seconds': elapsed,
+        'resolve_seconds': resolved - started,
+        'tracks_per_min': len(files) / elapsed * 60 if elapsed else 0,
+        'cpu_seconds': cpu_after - cpu_before,
+        'children_cpu_seconds': children_after - children_before if children_after is not None else None,
+        'peak_rss_mb': (peak_rss_bytes() or 0) / 1024 / 1024,
+        'children_peak_rss_mb': (children_peak_rss_bytes() or 0) / 1024 / 1024,
+        'mb_served': (MediaHandler.bytes_served - bytes_before) / 1024 / 1024,
+        'indexed': len(library),
+        'transcode_peak_queue': scheduler.stats()['peak_waiting'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--albums', type=int, default=2)
+    parser.add_argument('--tracks', type=int, default=8, help="Tracks per album")
+    parser.add_argument('--seconds', type=int, default=120, help="Length of each synthetic track")
+    parser.add_argument('--format', default='mp3', choices=['mp3', 'flac', 'wav', 'm4a', 'opus'])
+    parser.add_argument('--concurrency', type=int, default=4, help="Parallel track downloads")
+    parser.add_argument('--transcode-workers', type=int, default=None, help="Parallel ffmpeg processes (default: physical cores)")
+    parser.add_argument('--ffmpeg-threads', type=int, default=None, help="Threads per ffmpeg process")
+    parser.add_argument('--transcode-priority', choices=TRANSCODE_PRIORITIES, default=DEFAULT_TRANSCODE_PRIORITY)
+    parser.add_argument('--max-albums', type=int, default=2, help="Albums downloaded at once")
+    parser.add_argument('--bandwidth', type=float, default=0, help="Bytes/s per connection, 0 for unlimited")
+    parser.add_argument('--latency', type=float, default=0, help="Seconds before each response")
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=600, help="Give up on a run after this many seconds")
+    parser.add_argument('--headless', action='store_true', help="Use DownloadQueue directly instead of DownloadWorker")
+    parser.add_argument('--json', action='store_true', help="Print one JSON object per run")
+    args = parser.parse_args()
+
+    missing = [tool for tool in ('ffmpeg', 'ffprobe') if not shutil.which(tool)]
+    if missing:
+        sys.exit(f"{' and '.join(missing)} not found on PATH")
+
+    with tempfile.TemporaryDirectory(prefix='bench-e2e-') as tmp:
+        media = make_media(tmp, args.seconds)
+        LocalMusicIE.media_sizes = {ext: len(data) for ext, data in media.items()}
+        server = start_server(media, args.bandwidth, args.latency)
+        catalogue = Catalogue(args.albums, args.tracks, args.seconds)
+        catalogue.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        LocalMusicIE.catalogue = catalogue
+
+        results = []
+        try:
+            for run in range(args.runs):
+                workdir = os.path.join(tmp, f"run{run}")
+                os.makedirs(workdir)
+                result = run_once(args, catalogue, workdir)
+                results.append(result)
+                if args.json:
+                    print(json.dumps({'run': run + 1, **{k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}}))
+        finally:
+            server.shutdown()
+
+    if not args.json:
+        print(f"{args.albums} album(s) x {args.tracks} track(s) of {args.seconds}s, {args.format}, "
+              f"{args.concurrency} download(s), {'DownloadQueue' if args.headless else 'DownloadWorker'}")
+        print(f"{'metric':<28} {'median':>10} {'min':>10} {'max':>10}")
+        for key in ('tracks_per_min', 'seconds', 'resolve_seconds', 'cpu_seconds', 'children_cpu_seconds',
+                    'peak_rss_mb', 'children_peak_rss_mb', 'mb_served', 'transcode_peak_queue'):
+            values = [r[key] for r in results if r[key] is not None]
+            if values:
+                print(f"{key:<28} {statistics.median(values):10.2f} {min(values):10.2f} {max(values):10.2f}")
+    incomplete = [r for r in results if r['tracks'] != r['expected']]
+    if incomplete:
+        print(f"FAIL: {len(incomplete)} run(s) did not produce every track "
+              f"({', '.join(str(r['tracks']) for r in incomplete)} of {results[0]['expected']})")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
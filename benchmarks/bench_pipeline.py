@@ -0,0 +1,77 @@
+"""
+Compares the old sequential download -> transcode -> tag loop with
+app.pipeline.StagedPipeline.
+
+Network time is simulated with sleeps and transcoding with a CPU-bound child
+process per track (the same shape as an ffmpeg invocation), so the numbers
+reflect scheduling only and the script runs without network or ffmpeg.
+
+    python benchmarks/bench_pipeline.py --tracks 20 --download 0.5 --transcode 0.3
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.pipeline import StagedPipeline, Stage, default_transcode_workers
+
+BURN = "import time\nend = time.perf_counter() + {0}\nwhile time.perf_counter() < end: pass\n"
+
+def download(seconds):
+    def run(item):
+        time.sleep(seconds)
+        return item
+    return run
+
+def transcode(seconds):
+    def run(item):
+        subprocess.run([sys.executable, '-c', BURN.format(seconds)], check=True)
+        return item
+    return run
+
+def tag(seconds):
+    def run(item):
+        time.sleep(seconds)
+        return item
+    return run
+
+def bench_sequential(args):
+    stages = [download(args.download), transcode(args.transcode), tag(args.tag)]
+    start = time.perf_counter()
+    for item in range(args.tracks):
+        for func in stages:
+            item = func(item)
+    return time.perf_counter() - start
+
+def bench_pipelined(args):
+    pipeline = StagedPipeline([
+        Stage('download', download(args.download), args.download_workers),
+        Stage('transcode', transcode(args.transcode), args.transcode_workers),
+        Stage('tag', tag(args.tag), 1),
+    ])
+    start = time.perf_counter()
+    pipeline.run(range(args.tracks))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=20)
+    parser.add_argument('--download', type=float, default=0.5, help="Simulated download seconds per track")
+    parser.add_argument('--transcode', type=float, default=0.3, help="CPU seconds per track")
+    parser.add_argument('--tag', type=float, default=0.01, help="Tagging seconds per track")
+    parser.add_argument('--download-workers', type=int, default=4)
+    parser.add_argument('--transcode-workers', type=int, default=default_transcode_workers())
+    args = parser.parse_args()
+
+    sequential = bench_sequential(args)
+    pipelined = bench_pipelined(args)
+    print(f"tracks={args.tracks} download_workers={args.download_workers} transcode_workers={args.transcode_workers}")
+    print(f"sequential: {sequential:7.2f}s  {args.tracks / sequential * 60:8.1f} tracks/min")
+    print(f"pipelined:  {pipelined:7.2f}s  {args.tracks / pipelined * 60:8.1f} tracks/min")
+    print(f"speedup:    {sequential / pipelined:7.2f}x")
+
+if __name__ == '__main__':
+    main()
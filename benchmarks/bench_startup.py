@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark for the GUI.
+
+Every measurement runs in a fresh interpreter:
+
+- import time per module, from `python -X importtime -c "import app.ui"`
+- time from process launch to the first paint of MainWindow, with the
+  import and window construction times along the way
+
+It fails (exit status 1) when yt-dlp, ytmusicapi, requests or mutagen are
+imported before the window is built, or when a budget is exceeded, so it
+can guard against startup regressions:
+
+    python benchmarks/bench_startup.py --runs 5 --max-first-paint-ms 1500 --max-import-ms 400
+
+Uses the offscreen Qt platform by default; pass --platform '' to use the
+native one.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must load in the background, not before the window shows
+HEAVY_MODULES = ('yt_dlp', 'ytmusicapi', 'requests', 'mutagen')
+
+CHILD = r'''
+import os, sys, time, json
+launched = float(sys.argv[1])
+marks = {'interpreter': time.time()}
+sys.path.insert(0, sys.argv[2])
+
+from app.ui import MainWindow
+marks['ui_imported'] = time.time()
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QObject, QEvent, QTimer
+app = QApplication(sys.argv[:1])
+window = MainWindow()
+marks['window_built'] = time.time()
+heavy = [m for m in sys.argv[3].split(',') if m in sys.modules]
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and 'first_paint' not in marks:
+            marks['first_paint'] = time.time()
+            result = {k: (v - launched) * 1000 for k, v in marks.items()}
+            result['heavy_modules'] = heavy
+            print(json.dumps(result), flush=True)
+            # Skip interpreter teardown, which is irrelevant here
+            os._exit(0)
+        return False
+
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+QTimer.singleShot(30000, lambda: os._exit(1))
+app.exec()
+'''
+
+def child_env(platform):
+    env = dict(os.environ)
+    if platform:
+        env['QT_QPA_PLATFORM'] = platform
+    return env
+
+def measure_first_paint(platform):
+    launched = time.time()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, repr(launched), ROOT, ','.join(HEAVY_MODULES)],
+        capture_output=True, text=True, env=child_env(platform), cwd=ROOT
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"Startup run failed (exit {result.returncode}):\n{result.stderr[-2000:]}")
+
+def measure_imports(platform):
+    """Returns {module: (self_us, cumulative_us)} for one cold import of app.ui."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app.ui'],
+        capture_output=True, text=True, env=child_env(platform), cwd=ROOT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing app.ui failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--platform', default='offscreen', help="QT_QPA_PLATFORM for the child processes")
+    parser.add_argument('--top', type=int, default=15, help="Modules listed in the import table")
+    parser.add_argument('--max-first-paint-ms', type=float, default=None)
+    parser.add_argument('--max-import-ms', type=float, default=None, help="Budget for importing app.ui")
+    args = parser.parse_args()
+
+    failures = []
+
+    imports = measure_imports(args.platform)
+    ui_import_ms = imports['app.ui'][1] / 1000
+    print(f"{'module':<40} {'self ms':>9} {'cumul. ms':>10}")
+    interesting = [
+        (name, t) for name, t in imports.items()
+        if '.' not in name or name.startswith(('app.', 'PySide6.'))
+    ]
+    for name, (self_us, cumulative_us) in sorted(interesting, key=lambda x: -x[1][1])[:args.top]:
+        print(f"{name:<40} {self_us / 1000:9.1f} {cumulative_us / 1000:10.1f}")
+    loaded_heavy = [m for m in HEAVY_MODULES if m in imports]
+    if loaded_heavy:
+        failures.append(f"app.ui imports {', '.join(loaded_heavy)}")
+    if args.max_import_ms is not None and ui_import_ms > args.max_import_ms:
+        failures.append(f"import app.ui took {ui_import_ms:.0f} ms (budget {args.max_import_ms:.0f} ms)")
+
+    runs = [measure_first_paint(args.platform) for _ in range(args.runs)]
+    print()
+    print(f"{'milestone (ms since launch)':<40} {'median':>9} {'min':>9} {'max':>9}")
+    for mark in ('interpreter', 'ui_imported', 'window_built', 'first_paint'):
+        values = [r[mark] for r in runs]
+        print(f"{mark:<40} {statistics.median(values):9.1f} {min(values):9.1f} {max(values):9.1f}")
+    heavy_at_build = sorted({m for r in runs for m in r['heavy_modules']})
+    if heavy_at_build:
+        failures.append(f"{', '.join(heavy_at_build)} loaded before the window was built")
+    first_paint = statistics.median(r['first_paint'] for r in runs)
+    if args.max_first_paint_ms is not None and first_paint > args.max_first_paint_ms:
+        failures.append(f"first paint after {first_paint:.0f} ms (budget {args.max_first_paint_ms:.0f} ms)")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
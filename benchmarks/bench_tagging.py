@@ -0,0 +1,131 @@
+"""
+Micro-benchmark for app.tagging over synthetic MP3, FLAC, Opus and M4A files.
+
+Compares the per-track pattern (tag_audio with cover_path, which reads the
+cover for every file) with the pipeline's tag stage: one TagAudioPP that
+prepares the cover once, run on one thread and on the stage's TAG_WORKERS.
+
+    python benchmarks/bench_tagging.py --tracks 50 --cover-kb 300
+"""
+import os
+import sys
+import time
+import struct
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mutagen.ogg import OggPage
+
+from app.tagging import tag_audio
+from app.downloader import TagAudioPP, TAG_WORKERS
+
+def write_mp3(path, frames=200):
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames
+    frame = b'\xff\xfb\x90\x00' + b'\x00' * 413
+    with open(path, 'wb') as f:
+        f.write(frame * frames)
+
+def write_flac(path, samples=44100 * 5):
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bps - 1, 36 bits total samples
+    packed = (44100 << 44) | (1 << 41) | (15 << 36) | samples
+    streaminfo += packed.to_bytes(8, 'big') + b'\x00' * 16
+    with open(path, 'wb') as f:
+        f.write(b'fLaC')
+        f.write(bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo)
+        f.write(b'\x00' * 64 * 1024)
+
+def write_opus(path):
+    head = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)
+    tags = b'OpusTags' + struct.pack('<I', 5) + b'bench' + struct.pack('<I', 0)
+    pages = []
+    for sequence, packet in enumerate([head, tags, b'\x00' * 4000]):
+        page = OggPage()
+        page.serial = 1
+        page.sequence = sequence
+        page.first = sequence == 0
+        page.last = sequence == 2
+        page.position = 0 if sequence < 2 else 48000 * 5
+        page.packets = [packet]
+        pages.append(page.write())
+    with open(path, 'wb') as f:
+        f.write(b''.join(pages))
+
+def _atom(name, payload):
+    return struct.pack('>I', 8 + len(payload)) + name + payload
+
+def write_m4a(path):
+    ftyp = _atom(b'ftyp', b'M4A ' + struct.pack('>I', 0) + b'M4A mp42isom')
+    # version/flags, creation, modification, timescale, duration, then defaults
+    mvhd = _atom(b'mvhd', struct.pack('>IIIII', 0, 0, 0, 1000, 5000) + b'\x00' * 80)
+    moov = _atom(b'moov', mvhd)
+    mdat = _atom(b'mdat', b'\x00' * 64 * 1024)
+    with open(path, 'wb') as f:
+        f.write(ftyp + moov + mdat)
+
+WRITERS = {'mp3': write_mp3, 'flac': write_flac, 'opus': write_opus, 'm4a': write_m4a}
+
+def make_album(directory, ext, tracks):
+    """Writes the files and returns them with a manifest as build_track_manifest would."""
+    jobs, manifest = [], []
+    for i in range(1, tracks + 1):
+        path = os.path.join(directory, f"{i:03d}.{ext}")
+        WRITERS[ext](path)
+        tags = {
+            'title': f"Track {i}", 'artist': "Bench Artist", 'album': "Bench Album",
+            'album_artist': "Bench Artist", 'track_number': i, 'year': 2024,
+            'video_id': f"video{i:03d}",
+        }
+        jobs.append((path, tags))
+        manifest.append({'index': i, 'video_id': tags['video_id'], 'title': tags['title'], 'tags': tags})
+    return jobs, manifest
+
+def run_stage(jobs, manifest, cover_path, workers):
+    # The tag stage builds one TagAudioPP per album and calls it for every file
+    pp = TagAudioPP(None, {'tracks': manifest}, cover_path, manifest)
+    infos = [{'filepath': path, 'id': tags['video_id']} for path, tags in jobs]
+    if workers <= 1:
+        for info in infos:
+            pp.run(info)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(pp.run, infos))
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=50)
+    parser.add_argument('--cover-kb', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=TAG_WORKERS)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        cover_path = os.path.join(tmp, 'cover.jpg')
+        with open(cover_path, 'wb') as f:
+            f.write(b'\xff\xd8\xff\xe0' + os.urandom(args.cover_kb * 1024))
+
+        print(f"{'format':<6} {'per-track':>12} {'stage x1':>12} {f'stage x{args.workers}':>12}   (ms per track)")
+        for ext in WRITERS:
+            rows = []
+            for mode in ('per-track', 'stage', 'parallel'):
+                directory = os.path.join(tmp, f"{ext}-{mode}")
+                os.makedirs(directory)
+                jobs, manifest = make_album(directory, ext, args.tracks)
+                if mode == 'per-track':
+                    elapsed = timed(lambda: [tag_audio(p, t, cover_path) for p, t in jobs])
+                elif mode == 'stage':
+                    elapsed = timed(lambda: run_stage(jobs, manifest, cover_path, 1))
+                else:
+                    elapsed = timed(lambda: run_stage(jobs, manifest, cover_path, args.workers))
+                rows.append(elapsed / args.tracks * 1000)
+            print(f"{ext:<6} {rows[0]:12.2f} {rows[1]:12.2f} {rows[2]:12.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,9 @@ from PySide6.QtGui import QFont
 from PySide6.QtCore import QCoreApplication, QTranslator, QLocale
 
 from app.ui import MainWindow
-from app.utils import get_system_locale, resource_path, setup_logging
+from app.utils import get_system_locale, resource_path
+from app.logs import setup_logging
+from app.metrics import configure_from_env
 
 def load_translation(app):
     sys_locale = QLocale(get_system_locale())
@@ -17,6 +19,7 @@ def load_translation(app):
 
 if __name__ == "__main__":  
     setup_logging()
+    configure_from_env()
     app = QApplication(sys.argv)
     load_translation(app)
     app.setFont(QFont("Segoe UI", 9))
@@ -0,0 +1,80 @@
+import threading
+
+from app.bandwidth import TokenBucket, BandwidthManager, BULK, INTERACTIVE
+
+class FakeClock:
+    """Monotonic clock that only moves when the code under test sleeps."""
+    def __init__(self, now=100.0):
+        self.now = now
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+def test_bucket_paces_to_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(1000, burst=1000, clock=clock)
+    # The bucket starts empty, so every byte is paid for at the rate
+    assert bucket.reserve(500) == 0.5
+    clock.sleep(0.5)
+    assert bucket.reserve(0) == 0
+    clock.sleep(10)
+    # Idle time refills it only up to the burst
+    assert bucket.reserve(1500) == 0.5
+
+def test_unlimited_bucket_never_waits():
+    assert TokenBucket(0, clock=FakeClock()).reserve(10 ** 9) == 0
+
+def test_consumers_share_the_global_rate():
+    clock = FakeClock()
+    manager = BandwidthManager(100 * 1024, clock=clock, sleep=clock.sleep)
+    started = clock()
+    for _ in range(10):
+        manager.consume(64 * 1024, BULK)
+        manager.consume(36 * 1024, INTERACTIVE)
+    assert abs((clock() - started) - 10) < 0.01
+    assert manager.stats()['bytes'] == {INTERACTIVE: 360 * 1024, BULK: 640 * 1024}
+
+def run_consumer(manager, priority):
+    done = threading.Event()
+    threading.Thread(target=lambda: (manager.consume(1024, priority), done.set()), daemon=True).start()
+    return done
+
+def test_bulk_waits_for_playback_but_interactive_does_not():
+    clock = FakeClock()
+    manager = BandwidthManager(clock=clock, sleep=clock.sleep)
+    manager.set_playback_active(True)
+    bulk = run_consumer(manager, BULK)
+    assert run_consumer(manager, INTERACTIVE).wait(2)
+    assert not bulk.wait(0.3)
+    manager.set_playback_active(False)
+    assert bulk.wait(2)
+
+def test_playback_priority_lapses_after_its_timeout():
+    clock = FakeClock()
+    manager = BandwidthManager(clock=clock, sleep=clock.sleep)
+    manager.set_playback_active(True, timeout=15)
+    bulk = run_consumer(manager, BULK)
+    assert not bulk.wait(0.3)
+    assert manager.playback_active
+    clock.sleep(16)
+    assert bulk.wait(2)
+    assert not manager.playback_active
+
+def test_cancelled_consumer_stops_waiting():
+    clock = FakeClock()
+    manager = BandwidthManager(clock=clock, sleep=clock.sleep)
+    manager.set_playback_active(True)
+    cancelled = threading.Event()
+    done = threading.Event()
+    threading.Thread(
+        target=lambda: (manager.consume(1024, BULK, cancelled=cancelled.is_set), done.set()), daemon=True
+    ).start()
+    assert not done.wait(0.3)
+    cancelled.set()
+    assert done.wait(2)
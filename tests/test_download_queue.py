@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+
+import yt_dlp
+
+import app.downloader
+from app.download_queue import DownloadQueue, DownloadJournal
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: enough frames for mutagen to tag
+MP3 = (b'\xff\xfb\x90\x00' + b'\x00' * 413) * 20
+
+ALBUM = {
+    'title': "Album",
+    'artists': [{'name': "Artist"}],
+    'tracks': [{'videoId': 'video1', 'title': "Song", 'artists': [{'name': "Artist"}]}],
+}
+
+class FakeYDL(yt_dlp.YoutubeDL):
+    """'Downloads' a watch URL by writing a file, without extracting anything."""
+    def download(self, urls):
+        for url in urls:
+            video_id = url.rsplit('=', 1)[1]
+            info = {'id': video_id, 'url': url, 'artist': "Artist", 'track': "Song", 'acodec': 'opus'}
+            for pp in self._pps['before_dl']:
+                pp.run(info)
+            path = self.params['outtmpl']['default'].replace('%(artist)s', "Artist") \
+                .replace('%(track)s', "Song").replace('%(ext)s', 'webm')
+            with open(path, 'wb') as f:
+                f.write(MP3)
+            for hook in self.params.get('progress_hooks', []):
+                hook({'status': 'finished', 'info_dict': info})
+            for pp in self._pps['post_process']:
+                pp.run(dict(info, filepath=path))
+
+class SlowExtractAudioPP:
+    """Renames to the target format after `delay`, in place of the ffmpeg conversion."""
+    started = None
+    delay = 0
+
+    def __init__(self, ydl, preferredcodec, **kwargs):
+        self.codec = preferredcodec
+
+    def run(self, info):
+        type(self).started.set()
+        time.sleep(self.delay)
+        path = os.path.splitext(info['filepath'])[0] + '.' + self.codec
+        os.replace(info['filepath'], path)
+        return [], dict(info, filepath=path)
+
+def run_queue(journal, album_callback, stop_when=None):
+    queue = DownloadQueue(journal=journal, ydl_factory=FakeYDL, album_callback=album_callback)
+    queue.start()
+    if stop_when is not None:
+        assert stop_when.wait(5)
+        queue.stop(timeout=10)
+    return queue
+
+def test_stop_during_transcode_resumes_the_track(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.downloader, 'ExtractAudioPP', SlowExtractAudioPP)
+    monkeypatch.setattr(SlowExtractAudioPP, 'started', threading.Event())
+    monkeypatch.setattr(SlowExtractAudioPP, 'delay', 0.5)
+    journal = DownloadJournal(':memory:')
+    album_id = journal.add_album('OLAK5uy_test', [1], str(tmp_path), 'mp3', ALBUM)
+
+    statuses = []
+    finished = threading.Event()
+
+    def on_album(album_id, status, counts, error):
+        statuses.append(status)
+        if status == 'finished':
+            finished.set()
+
+    run_queue(journal, on_album, stop_when=SlowExtractAudioPP.started)
+    assert statuses == ['cancelled']
+    assert journal.pending_tracks(album_id) == [1]
+    assert not list(tmp_path.glob('*.mp3'))
+
+    SlowExtractAudioPP.delay = 0
+    queue = run_queue(journal, on_album)
+    assert finished.wait(10)
+    queue.stop(timeout=10)
+    assert statuses == ['cancelled', 'finished']
+    track = journal.tracks(album_id)[0]
+    assert track['state'] == 'done'
+    assert os.path.basename(track['path']) == "Artist - Song.mp3"
+    assert os.path.exists(track['path'])
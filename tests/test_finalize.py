@@ -0,0 +1,51 @@
+import os
+import time
+
+from app.finalize import (
+    STAGING_PREFIX, STALE_STAGING_AGE, staging_directory, sweep_stale_staging,
+    finalize_files, list_taken_names
+)
+
+def make_dir(parent, name, age, files=('track.webm.part',)):
+    path = parent / name
+    path.mkdir()
+    for f in files:
+        (path / f).write_bytes(b'partial')
+    stamp = time.time() - age
+    for p in [path / f for f in files] + [path]:
+        os.utime(p, (stamp, stamp))
+    return path
+
+def test_sweep_removes_only_stale_staging_directories(tmp_path):
+    stale = make_dir(tmp_path, STAGING_PREFIX + 'old', STALE_STAGING_AGE + 60)
+    active = make_dir(tmp_path, STAGING_PREFIX + 'new', 60)
+    album = make_dir(tmp_path, 'Artist - Album', STALE_STAGING_AGE + 60)
+    assert sweep_stale_staging(str(tmp_path)) == 1
+    assert not stale.exists()
+    assert active.exists() and album.exists()
+
+def test_recent_file_keeps_staging_directory(tmp_path):
+    staging = make_dir(tmp_path, STAGING_PREFIX + 'busy', STALE_STAGING_AGE + 60)
+    (staging / 'fresh.part').write_bytes(b'x')
+    assert sweep_stale_staging(str(tmp_path)) == 0
+
+def test_staging_directory_sweeps_before_staging(tmp_path):
+    make_dir(tmp_path, STAGING_PREFIX + 'old', STALE_STAGING_AGE + 60)
+    with staging_directory(str(tmp_path)) as path:
+        assert os.path.basename(path).startswith(STAGING_PREFIX)
+        assert [p.name for p in tmp_path.iterdir()] == [os.path.basename(path)]
+    assert list(tmp_path.iterdir()) == []
+
+def test_shared_taken_names_rename_collisions(tmp_path):
+    dest = tmp_path / 'album'
+    dest.mkdir()
+    (dest / 'Song.mp3').write_bytes(b'old')
+    taken = list_taken_names(dest)
+    moved = []
+    for i in range(2):
+        track_dir = tmp_path / f'{i:04d}'
+        track_dir.mkdir()
+        (track_dir / 'Song.mp3').write_bytes(b'new')
+        moved += finalize_files([track_dir / 'Song.mp3'], dest, taken)
+    assert [p.name for p in moved] == ['Song (1).mp3', 'Song (2).mp3']
+    assert taken == list_taken_names(dest)
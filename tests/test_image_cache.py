@@ -0,0 +1,64 @@
+import time
+import threading
+
+from app.cache import ImageCache
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        return [self.content[i:i + size] for i in range(0, len(self.content), size)]
+
+class FakeSession:
+    """Serves a PNG named after the URL; `gate` holds every response until it is set."""
+    def __init__(self):
+        self.requested = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None, stream=False):
+        with self._lock:
+            self.requested.append(url)
+        self.gate.wait(5)
+        # Two URLs of the same image share one stored copy
+        return FakeResponse(b'\x89PNG' + url.rsplit('/', 1)[-1].split('?')[0].encode() * 50)
+
+def make_cache(tmp_path, **kwargs):
+    return ImageCache(str(tmp_path), session=FakeSession(), **kwargs)
+
+def test_image_is_fetched_once_and_deduplicated(tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.get('http://a/cover1?s=1')
+    assert cache.get('http://a/cover1?s=1') == first
+    assert cache.get('http://b/cover1?s=2') == first
+    assert cache.session.requested == ['http://a/cover1?s=1', 'http://b/cover1?s=2']
+    assert len([p for p in tmp_path.iterdir() if p.suffix == '.png']) == 1
+
+def test_concurrent_requests_for_one_url_fetch_once(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.session.gate.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('http://a/cover'))) for _ in range(20)]
+    for t in threads:
+        t.start()
+    # Let every thread reach the fetch before the first response arrives
+    while not cache.session.requested:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    cache.session.gate.set()
+    for t in threads:
+        t.join(5)
+    assert cache.session.requested == ['http://a/cover']
+    assert len(results) == 20 and len(set(results)) == 1
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,32 @@
+from app.library import LibraryIndex
+from app.tagging import tag_audio
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: enough frames for mutagen to tag
+MP3 = (b'\xff\xfb\x90\x00' + b'\x00' * 413) * 20
+
+def write_track(directory, name, **tags):
+    path = directory / name
+    path.write_bytes(MP3)
+    if tags:
+        tag_audio(path, tags)
+    return path
+
+def test_track_without_video_id_only_matches_its_album(tmp_path):
+    library = LibraryIndex(':memory:')
+    # Two albums with the same title, each with a track 1
+    first = write_track(tmp_path, 'first.mp3', album="Greatest Hits", track_number=1)
+    second = write_track(tmp_path, 'second.mp3', album="Greatest Hits", track_number=1)
+    library.add_file(first, playlist_id='OLAK5uy_first')
+    library.add_file(second, playlist_id='OLAK5uy_second')
+
+    assert library.find_track(playlist_id='OLAK5uy_second', track_number=1) == str(second)
+    assert library.find_track(playlist_id='OLAK5uy_first', track_number=2) is None
+    assert library.find_track(playlist_id='OLAK5uy_other', track_number=1) is None
+
+def test_rescan_keeps_the_download_playlist(tmp_path):
+    library = LibraryIndex(':memory:')
+    path = write_track(tmp_path, 'track.mp3', track_number=3)
+    library.add_file(path, playlist_id='OLAK5uy_album')
+    tag_audio(path, {'track_number': 3, 'title': "Retagged"})
+    assert library.scan(tmp_path) == (1, 0)
+    assert library.find_track(playlist_id='OLAK5uy_album', track_number=3) == str(path)
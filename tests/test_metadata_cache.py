@@ -0,0 +1,105 @@
+import threading
+
+from app.cache import MetadataCache
+from app.youtube_api import YouTubeMusicClient, ALBUM_TTL, SEARCH_TTL
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeYTMusic:
+    """Answers search and get_album with numbered responses, counting calls."""
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls.append(name)
+            return self.calls.count(name)
+
+    def search(self, query, filter=None, limit=None):
+        n = self._count('search')
+        return [{'browseId': f'MPREb_{query}', 'title': f'{query} {n}', 'artists': [], 'type': 'Album'}]
+
+    def get_album(self, browseId):
+        n = self._count('get_album')
+        return {'title': f'Album {n}', 'browseId': browseId, 'tracks': []}
+
+def make_client(clock, stale_while_revalidate=True):
+    ytmusic = FakeYTMusic()
+    cache = MetadataCache(':memory:', clock=clock)
+    client = YouTubeMusicClient(
+        cache=cache,
+        ytmusic_factory=lambda language: ytmusic,
+        stale_while_revalidate=stale_while_revalidate,
+        language='en'
+    )
+    return client, ytmusic, cache
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = MetadataCache(':memory:', ttl=10, clock=clock)
+    cache.set('k', {'v': 1})
+    assert cache.get('k') == ({'v': 1}, True)
+    clock.now += 11
+    assert cache.get('k') is None
+    assert cache.get('k', allow_stale=True) == ({'v': 1}, False)
+
+def test_expired_album_is_fetched_again_without_stale_while_revalidate():
+    clock = FakeClock()
+    client, ytmusic, _ = make_client(clock, stale_while_revalidate=False)
+    assert client.get_album_details('MPREb_a')['title'] == 'Album 1'
+    assert client.get_album_details('MPREb_a')['title'] == 'Album 1'
+    assert ytmusic.calls == ['get_album']
+    clock.now += ALBUM_TTL + 1
+    assert client.get_album_details('MPREb_a')['title'] == 'Album 2'
+    assert ytmusic.calls == ['get_album', 'get_album']
+
+def test_least_recently_used_entry_is_evicted():
+    clock = FakeClock()
+    cache = MetadataCache(':memory:', max_entries=2, clock=clock)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    cache.get('a')
+    clock.now += 1
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == (1, True)
+    assert cache.get('c') == (3, True)
+
+def test_stale_value_is_returned_then_refreshed():
+    clock = FakeClock()
+    client, ytmusic, cache = make_client(clock)
+    assert client.search_albums('abba')[0]['title'] == 'abba 1'
+    clock.now += SEARCH_TTL + 1
+
+    refreshed = threading.Event()
+    updates = []
+
+    def on_refresh(results):
+        updates.append(results)
+        refreshed.set()
+
+    # The stale page comes back at once and the refresh runs in the background
+    assert client.search_albums('abba', on_refresh=on_refresh)[0]['title'] == 'abba 1'
+    assert refreshed.wait(5)
+    assert updates[0][0]['title'] == 'abba 2'
+    assert client.search_albums('abba')[0]['title'] == 'abba 2'
+    assert ytmusic.calls == ['search', 'search']
+    assert cache.stats()['stale_hits'] == 1
+
+def test_hit_and_miss_counters():
+    clock = FakeClock()
+    client, _, cache = make_client(clock)
+    client.get_album_details('MPREb_a')
+    client.get_album_details('MPREb_a')
+    client.get_album_details('MPREb_b')
+    cache.get('unknown')
+    assert cache.stats() == {'hits': 1, 'stale_hits': 0, 'misses': 3, 'entries': 2}
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from app.pipeline import StagedPipeline, Stage, CancelledError
+
+def test_run_returns_every_item():
+    pipeline = StagedPipeline([Stage('double', lambda x: x * 2, 2), Stage('inc', lambda x: x + 1)])
+    assert sorted(pipeline.run(range(5))) == [1, 3, 5, 7, 9]
+
+def test_stage_error_is_reraised():
+    def fail(x):
+        raise ValueError(x)
+    with pytest.raises(ValueError):
+        StagedPipeline([Stage('fail', fail)]).run([1])
+
+def test_cancel_after_first_stage_raises():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(x):
+        started.set()
+        release.wait(5)
+        return x
+
+    pipeline = StagedPipeline([Stage('slow', slow), Stage('last', lambda x: x)])
+    result = {}
+
+    def run():
+        try:
+            result['value'] = pipeline.run([1, 2])
+        except CancelledError as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    pipeline.cancel()
+    release.set()
+    thread.join(5)
+    # The item finished by the first stage is drained, not returned
+    assert 'value' not in result
+    assert isinstance(result['error'], CancelledError)
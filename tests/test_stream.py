@@ -0,0 +1,28 @@
+from app.stream import StreamUrlCache, StreamResolver
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_only_cached_urls_expire():
+    clock = FakeClock()
+    cache = StreamUrlCache(clock=clock)
+    assert not cache.expires_within(('video', 'a'), 300)
+    cache.set(('video', 'a'), 'https://example.com/a?expire=2000')
+    assert not cache.expires_within(('video', 'a'), 300)
+    clock.now = 1800
+    assert cache.expires_within(('video', 'a'), 300)
+
+def test_refresh_skips_pinned_keys_without_a_url():
+    resolver = StreamResolver()
+    submitted = []
+    resolver._submit = lambda key, reason: submitted.append(key)
+    resolver._cache = StreamUrlCache(clock=FakeClock(1900))
+    resolver._cache.set(('video', 'a'), 'https://example.com/a?expire=2000')
+    resolver.pin([('video', 'a'), ('video', 'b')])
+    resolver._refresh_expiring()
+    assert submitted == [('video', 'a')]
+    resolver.shutdown()
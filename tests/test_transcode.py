@@ -0,0 +1,45 @@
+import threading
+
+import app.transcode
+from app.metrics import Metrics
+from app.transcode import TranscodeScheduler
+
+def make_scheduler(monkeypatch, cpus=8, **kwargs):
+    monkeypatch.setattr(app.transcode, 'usable_cpus', lambda: cpus)
+    return TranscodeScheduler(priority='normal', metrics=Metrics(), **kwargs)
+
+def test_lone_transcode_uses_every_cpu(monkeypatch):
+    scheduler = make_scheduler(monkeypatch, workers=4)
+    with scheduler as slot:
+        assert slot.ffmpeg_args() == ['-threads', '8']
+    # Outside a slot the full-pool share is reported
+    assert scheduler.ffmpeg_args() == ['-threads', '2']
+
+def test_threads_follow_the_running_load(monkeypatch):
+    scheduler = make_scheduler(monkeypatch, workers=2)
+    entered, release = threading.Event(), threading.Event()
+    args = {}
+
+    def job(name):
+        with scheduler as slot:
+            args[name] = slot.ffmpeg_args()
+            entered.set()
+            release.wait(5)
+
+    first = threading.Thread(target=job, args=('first',))
+    first.start()
+    assert entered.wait(5)
+    entered.clear()
+    with scheduler as slot:
+        # A job started next to a running one gets the CPUs left over
+        assert slot.ffmpeg_args() == ['-threads', '1']
+    release.set()
+    first.join(5)
+    with scheduler as slot:
+        assert slot.ffmpeg_args() == ['-threads', '8']
+    assert args['first'] == ['-threads', '8']
+
+def test_fixed_thread_count(monkeypatch):
+    scheduler = make_scheduler(monkeypatch, workers=4, threads=3)
+    with scheduler as slot:
+        assert slot.ffmpeg_args() == ['-threads', '3']
@@ -1,6 +1,29 @@
 <?xml version="1.0" encoding="utf-8"?>
 <!DOCTYPE TS>
 <TS version="2.1" language="ko_KR">
+<context>
+    <name>AlbumResultsModel</name>
+    <message>
+        <location filename="../app/results_model.py" line="23"/>
+        <source>Title</source>
+        <translation>제목</translation>
+    </message>
+    <message>
+        <location filename="../app/results_model.py" line="23"/>
+        <source>Artist</source>
+        <translation>아티스트</translation>
+    </message>
+    <message>
+        <location filename="../app/results_model.py" line="23"/>
+        <source>Year</source>
+        <translation>연도</translation>
+    </message>
+    <message>
+        <location filename="../app/results_model.py" line="23"/>
+        <source>Type</source>
+        <translation>구분</translation>
+    </message>
+</context>
 <context>
     <name>DownloadWorker</name>
     <message>
@@ -16,37 +39,41 @@
         <translation type="vanished">{len(track_indices)}개 트랙 다운로드 성공!</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="170"/>
+        <location filename="../app/worker.py" line="181"/>
         <source>Downloading {0}/{1}: {2} - {3} ({4:.0%})</source>
         <translation>{0}/{1} 다운로드 중: {2} - {3} ({4:.0%})</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="180"/>
+        <location filename="../app/worker.py" line="191"/>
         <source>Downloading track {0}/{1} ({2:.0%})</source>
         <translation>{0}/{1} 다운로드 중 ({2:.0%})</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="195"/>
+        <location filename="../app/worker.py" line="199"/>
         <source>Processing {0}/{1}: {2} - {3}</source>
         <translation>{0}/{1} 처리 중: {2} - {3}</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="245"/>
+        <location filename="../app/worker.py" line="177"/>
         <source>Preparing to download...</source>
         <translation>다운로드 준비 중...</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="253"/>
         <source>Moving files...</source>
-        <translation>파일 이동 중...</translation>
+        <translation type="vanished">파일 이동 중...</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="271"/>
+        <location filename="../app/worker.py" line="221"/>
         <source>Download cancelled.</source>
         <translation>다운로드 취소.</translation>
     </message>
     <message>
-        <location filename="../app/worker.py" line="279"/>
+        <location filename="../app/worker.py" line="226"/>
+        <source>Downloaded {0} track(s), {1} failed.</source>
+        <translation>{0}개 트랙 다운로드 완료, {1}개 실패.</translation>
+    </message>
+    <message>
+        <location filename="../app/worker.py" line="229"/>
         <source>Successfully downloaded {0} track(s)!</source>
         <translation>{0} 트랙 다운로드 성공!</translation>
     </message>
@@ -54,12 +81,12 @@
 <context>
     <name>ErrorDialog</name>
     <message>
-        <location filename="../app/ui.py" line="33"/>
+        <location filename="../app/ui.py" line="58"/>
         <source>Error</source>
         <translation>오류</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="47"/>
+        <location filename="../app/ui.py" line="72"/>
         <source>Close</source>
         <translation>닫기</translation>
     </message>
@@ -67,83 +94,144 @@
 <context>
     <name>MainWindow</name>
     <message>
-        <location filename="../app/ui.py" line="86"/>
+        <location filename="../app/ui.py" line="111"/>
         <source>Enter album name to search...</source>
         <translation>검색어 입력 (앨범·제목·아티스트 등)...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="87"/>
+        <location filename="../app/ui.py" line="112"/>
         <source>Search</source>
         <translation>검색</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="101"/>
-        <location filename="../app/ui.py" line="134"/>
+        <location filename="../app/ui.py" line="165"/>
         <source>Title</source>
         <translation>제목</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="101"/>
         <source>Artist</source>
-        <translation>아티스트</translation>
+        <translation type="vanished">아티스트</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="101"/>
         <source>Year</source>
-        <translation>연도</translation>
+        <translation type="vanished">연도</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="101"/>
         <source>Type</source>
-        <translation>구분</translation>
+        <translation type="vanished">구분</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="117"/>
-        <location filename="../app/ui.py" line="443"/>
+        <location filename="../app/ui.py" line="148"/>
+        <location filename="../app/ui.py" line="693"/>
         <source>Select an album to see details</source>
         <translation>앨범을 선택하여 세부사항 확인</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="214"/>
+        <location filename="../app/ui.py" line="189"/>
+        <source>Number of tracks to download at once</source>
+        <translation>동시에 다운로드할 트랙 수</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="194"/>
+        <source>No limit</source>
+        <translation>제한 없음</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="195"/>
+        <source>Total bandwidth for downloads and cover art; playback always goes first</source>
+        <translation>다운로드와 커버 이미지에 쓰는 전체 대역폭입니다. 재생이 항상 우선합니다.</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="200"/>
+        <source>Parallel:</source>
+        <translation>동시 다운로드:</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="202"/>
+        <source>Limit:</source>
+        <translation>속도 제한:</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="222"/>
+        <source>Cancel Downloads</source>
+        <translation>다운로드 취소</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="345"/>
         <source>Searching...</source>
         <translation>검색 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="215"/>
+        <location filename="../app/ui.py" line="346"/>
         <source>Searching for albums...</source>
         <translation>앨범 검색 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="267"/>
+        <location filename="../app/ui.py" line="405"/>
         <source>Loading...</source>
         <translation>불러오는 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="268"/>
+        <location filename="../app/ui.py" line="406"/>
         <source>Loading album details...</source>
         <translation>앨범 정보 불러오는 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="277"/>
+        <location filename="../app/ui.py" line="440"/>
         <source>Failed to fetch album details.</source>
         <translation>앨범 정보 가져오기에 실패했습니다.</translation>
     </message>
+    <message>
+        <location filename="../app/ui.py" line="625"/>
+        <source>Added {0} track(s) to the download queue.</source>
+        <translation>다운로드 대기열에 {0}개 트랙을 추가했습니다.</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="627"/>
+        <source>Skipping {0} track(s) already in your library.</source>
+        <translation>라이브러리에 이미 있는 {0}개 트랙은 건너뜁니다.</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="633"/>
+        <source>Resuming {0} track(s) from the download queue.</source>
+        <translation>다운로드 대기열의 {0}개 트랙을 이어서 다운로드합니다.</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="640"/>
+        <source>{0} track(s) left in the download queue</source>
+        <translation>다운로드 대기열에 {0}개 트랙 남음</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="656"/>
+        <source>{0}: processing</source>
+        <translation>{0}: 처리 중</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="658"/>
+        <source>{0}: {1:.0%} of {2}, {3}/s, {4}:{5:02d} left</source>
+        <translation>{0}: {2} 중 {1:.0%}, {3}/s, {4}:{5:02d} 남음</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="663"/>
+        <source>{0}: {1:.0%}</source>
+        <translation>{0}: {1:.0%}</translation>
+    </message>
     <message>
         <source>#</source>
         <translation type="vanished">#</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="134"/>
+        <location filename="../app/ui.py" line="165"/>
         <source>Duration</source>
         <translation>길이</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="155"/>
+        <location filename="../app/ui.py" line="197"/>
         <source>Download</source>
         <translation>다운로드</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="156"/>
+        <location filename="../app/ui.py" line="198"/>
         <source>Format:</source>
         <translation>파일 형식:</translation>
     </message>
@@ -152,30 +240,39 @@
         <translation type="vanished">선택된 음악 없음</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="294"/>
+        <location filename="../app/ui.py" line="465"/>
         <source>Image not available</source>
         <translation>이미지 없음</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="312"/>
-        <location filename="../app/ui.py" line="375"/>
+        <location filename="../app/ui.py" line="483"/>
+        <location filename="../app/ui.py" line="598"/>
         <source>This album is not available for download.</source>
         <translation>이 앨범은 다운로드할 수 없습니다.</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="382"/>
+        <location filename="../app/ui.py" line="521"/>
+        <source>Already downloaded: {0}</source>
+        <translation>이미 다운로드됨: {0}</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="611"/>
+        <source>All checked tracks are already in your library.</source>
+        <translation>선택한 트랙이 모두 라이브러리에 있습니다.</translation>
+    </message>
+    <message>
+        <location filename="../app/ui.py" line="613"/>
         <source>No tracks checked for download.</source>
         <translation>선택된 트랙이 없습니다.</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="384"/>
+        <location filename="../app/ui.py" line="616"/>
         <source>Select Download Folder</source>
         <translation>다운로드 경로 선택</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="392"/>
         <source>Preparing download for {0} track(s)...</source>
-        <translation>{0}개 트랙 다운로드 준비 중...</translation>
+        <translation type="vanished">{0}개 트랙 다운로드 준비 중...</translation>
     </message>
     <message>
         <source>Playback failed. Retrying... ({0}/3)</source>
@@ -217,42 +314,52 @@
 <context>
     <name>MusicPlayer</name>
     <message>
-        <location filename="../app/player.py" line="135"/>
+        <location filename="../app/player.py" line="117"/>
+        <source>Gapless</source>
+        <translation>끊김 없이</translation>
+    </message>
+    <message>
+        <location filename="../app/player.py" line="118"/>
+        <source>Crossfade between tracks</source>
+        <translation>트랙 사이 크로스페이드</translation>
+    </message>
+    <message>
+        <location filename="../app/player.py" line="219"/>
         <source>Preparing to play track...</source>
         <translation>재생 준비 중...</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="154"/>
+        <location filename="../app/player.py" line="243"/>
         <source>No music selected</source>
         <translation>선택된 음악 없음</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="173"/>
+        <location filename="../app/player.py" line="285"/>
         <source>Cannot play track - no album playlist ID found.</source>
         <translation>트랙을 재생할 수 없습니다 - album playlist ID를 찾을 수 없습니다.</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="179"/>
+        <location filename="../app/player.py" line="291"/>
         <source>Could not find track info.</source>
         <translation>트랙 정보를 찾을 수 없습니다.</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="184"/>
+        <location filename="../app/player.py" line="347"/>
         <source>Fetching stream URL...</source>
         <translation>스트림 URL 가져오는 중...</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="214"/>
+        <location filename="../app/player.py" line="379"/>
         <source>Playing...</source>
         <translation>재생 중...</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="221"/>
+        <location filename="../app/player.py" line="574"/>
         <source>Playback failed. Retrying... ({0}/3)</source>
         <translation>재생 실패. 다시 시도 중...  ({0}/3)</translation>
     </message>
     <message>
-        <location filename="../app/player.py" line="225"/>
+        <location filename="../app/player.py" line="578"/>
         <source>Playback failed. Please try another track.</source>
         <translation>재생에 실패했습니다. 다른 트랙으로 시도해 보세요.</translation>
     </message>
@@ -260,12 +367,12 @@
 <context>
     <name>ProcessingDialog</name>
     <message>
-        <location filename="../app/ui.py" line="54"/>
+        <location filename="../app/ui.py" line="79"/>
         <source>Processing...</source>
         <translation>처리 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="56"/>
+        <location filename="../app/ui.py" line="81"/>
         <source>Please wait...</source>
         <translation>잠시만 기다려 주세요...</translation>
     </message>
@@ -273,19 +380,16 @@
 <context>
     <name>ProgressDialog</name>
     <message>
-        <location filename="../app/ui.py" line="22"/>
         <source>Downloading...</source>
-        <translation>다운로드 중...</translation>
+        <translation type="vanished">다운로드 중...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="23"/>
         <source>Download in progress, please wait...</source>
-        <translation>다운로드 중. 잠시만 기다려 주세요...</translation>
+        <translation type="vanished">다운로드 중. 잠시만 기다려 주세요...</translation>
     </message>
     <message>
-        <location filename="../app/ui.py" line="24"/>
         <source>Cancel</source>
-        <translation>취소</translation>
+        <translation type="vanished">취소</translation>
     </message>
 </context>
 </TS>
@@ -3,7 +3,7 @@ set VENV_PATH=%~dp0.venv
 set LUPDATE=%VENV_PATH%\Scripts\pyside6-lupdate.exe
 set LINGUIST=%VENV_PATH%\Scripts\pyside6-linguist.exe
 set LRELEASE=%VENV_PATH%\Scripts\pyside6-lrelease.exe
-set SOURCES=%~dp0main.py %~dp0app\__init__.py %~dp0app\player.py %~dp0app\tagging.py %~dp0app\ui.py %~dp0app\utils.py %~dp0app\worker.py %~dp0app\youtube_api.py
+set SOURCES=%~dp0main.py %~dp0app\__init__.py %~dp0app\player.py %~dp0app\results_model.py %~dp0app\tagging.py %~dp0app\ui.py %~dp0app\utils.py %~dp0app\worker.py %~dp0app\youtube_api.py
 set TS_KO=%~dp0translations/ko_KR.ts
 set QM_KO=%~dp0translations/ko_KR.qm
 